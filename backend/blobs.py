@@ -0,0 +1,200 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import gridfs
+from gridfs.errors import FileExists
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content-addressed blob store on GridFS. A blob's id is the SHA-256 of its uncompressed content, so storing the
+# same content twice stores it once, and documents only keep the id. Blobs are never modified, which makes them
+# safe to cache in every process.
+BUCKET = "blobs"
+# Blobs at least this large are compressed with zstd when the zstandard package is installed
+COMPRESSION_THRESHOLD = 1024
+COMPRESSION_LEVEL = 3
+# An upload that left chunks but no files document this long ago is considered dead, see put
+ABANDONED_UPLOAD_AGE = timedelta(minutes=10)
+# How long put waits for another process's upload of the same content to complete, and how often it checks
+UPLOAD_WAIT = 30  # seconds
+UPLOAD_POLL_INTERVAL = 0.1  # seconds
+CACHE_SIZE = 64 * 1024 * 1024  # bytes of blob content cached per process
+
+_database = None
+_bucket = None
+_cache = OrderedDict()
+_cache_bytes = 0
+_lock = threading.Lock()
+
+
+class MissingBlob(KeyError):
+    pass
+
+
+def init_store(database):
+    global _database, _bucket
+    _database = database
+    _bucket = gridfs.GridFSBucket(database, bucket_name=BUCKET)
+
+
+def blob_id(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _encode(data):
+    return data.encode() if isinstance(data, str) else data
+
+
+def _cache_put(key, data):
+    global _cache_bytes
+    if len(data) > CACHE_SIZE // 4:
+        return
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return
+        _cache[key] = data
+        _cache_bytes += len(data)
+        while _cache_bytes > CACHE_SIZE:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+
+def _cache_get(key):
+    with _lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+        return data
+
+
+def _compress(data):
+    if zstandard is None or len(data) < COMPRESSION_THRESHOLD:
+        return data, None
+    compressed = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(data)
+    return (compressed, "zstd") if len(compressed) < len(data) else (data, None)
+
+
+def _decompress(data, compression):
+    if compression is None:
+        return data
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read compressed blobs")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise RuntimeError(f"Unknown blob compression {compression}")
+
+
+def _is_abandoned(key):
+    # Chunk ids are ObjectIds, so the newest chunk tells when the upload last wrote. Their time is in UTC
+    newest_chunk = _database[f"{BUCKET}.chunks"].find_one({"files_id": key}, {"_id": 1}, sort=[("_id", -1)])
+    return newest_chunk is None or newest_chunk["_id"].generation_time < (
+        datetime.now(tz=timezone.utc) - ABANDONED_UPLOAD_AGE
+    )
+
+
+def _wait_for_upload(key):
+    # The files document is written once every chunk is stored, so the blob is readable as soon as it exists
+    deadline = time.monotonic() + UPLOAD_WAIT
+    while time.monotonic() < deadline:
+        if _database[f"{BUCKET}.files"].find_one({"_id": key}, {"_id": 1}):
+            return True
+        if _is_abandoned(key):
+            return False
+        time.sleep(UPLOAD_POLL_INTERVAL)
+    return False
+
+
+def put(data):
+    """Store content and return its blob id, content that is already stored is not uploaded again."""
+    data = _encode(data)
+    key = blob_id(data)
+    # Marking the blob as referenced keeps collect_garbage from deleting it before the caller's document is written
+    if _database[f"{BUCKET}.files"].find_one_and_update(
+        {"_id": key}, {"$set": {"metadata.referenced_at": datetime.now()}}, projection={"_id": 1}
+    ):
+        return key
+    stored, compression = _compress(data)
+    for _ in range(2):
+        try:
+            _bucket.upload_from_stream_with_id(
+                key,
+                key,
+                stored,
+                metadata={"compression": compression, "length": len(data), "referenced_at": datetime.now()},
+            )
+            break
+        except FileExists:
+            # The chunks are there but not the files document: either another process is uploading the same
+            # content right now, or an upload died half way. The key is only returned once the blob can be read,
+            # and only the leftovers of a dead upload are removed
+            if _wait_for_upload(key):
+                break
+            if not _is_abandoned(key):
+                raise RuntimeError(f"Blob {key} is still being uploaded by another process")
+            _database[f"{BUCKET}.chunks"].delete_many({"files_id": key})
+    else:
+        raise RuntimeError(f"Failed to upload blob {key}")
+    _cache_put(key, data)
+    return key
+
+
+def get_many(keys):
+    """Content of many blobs by id, in two queries whatever their number. Raises MissingBlob."""
+    keys = set(keys)
+    found = {}
+    for key in keys:
+        data = _cache_get(key)
+        if data is not None:
+            found[key] = data
+    missing = [key for key in keys if key not in found]
+    if not missing:
+        return found
+
+    files = {
+        file["_id"]: file
+        for file in _database[f"{BUCKET}.files"].find({"_id": {"$in": missing}}, {"_id": 1, "length": 1, "metadata": 1})
+    }
+    chunks = {key: [] for key in files}
+    for chunk in _database[f"{BUCKET}.chunks"].find({"files_id": {"$in": list(files)}}, {"_id": 0}).sort(
+        [("files_id", 1), ("n", 1)]
+    ):
+        chunks[chunk["files_id"]].append(chunk["data"])
+    for key in missing:
+        if key not in files:
+            raise MissingBlob(key)
+        stored = b"".join(chunks[key])
+        if len(stored) != files[key]["length"]:
+            raise MissingBlob(key)
+        data = _decompress(stored, (files[key].get("metadata") or {}).get("compression"))
+        _cache_put(key, data)
+        found[key] = data
+    return found
+
+
+def get(key):
+    return get_many([key])[key]
+
+
+def get_text(key):
+    return get(key).decode()
+
+
+def collect_garbage(referenced, older_than=timedelta(hours=1)):
+    """Delete blobs no document refers to. Blobs stored or deduplicated in the last hour are kept, the document
+    referring to them may not be written yet. Returns the number of blobs deleted."""
+    referenced = set(referenced)
+    deleted = 0
+    for file in _database[f"{BUCKET}.files"].find(
+        {"metadata.referenced_at": {"$lt": datetime.now() - older_than}}, {"_id": 1}
+    ):
+        if file["_id"] not in referenced:
+            _bucket.delete(file["_id"])
+            deleted += 1
+    return deleted
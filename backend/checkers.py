@@ -0,0 +1,315 @@
+import itertools
+import math
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Output checkers. Outputs are read in chunks and compared one line or token at a time, so memory use is bounded by
+# the longest line or token instead of the output size. Every source is either bytes or the path of a file.
+CHUNK_SIZE = 1024 * 1024
+# A line or token longer than this is reported as a mismatch instead of being held in memory
+MAX_UNIT_LENGTH = 16 * 1024 * 1024
+# Characters of the differing line or token quoted in messages. Only the submission's output is quoted, messages
+# are shown to the submitter and the expected output is hidden test data
+MESSAGE_PREVIEW = 32
+DEFAULT_ABS_TOLERANCE = 1e-6
+DEFAULT_REL_TOLERANCE = 1e-6
+CHECKER_MODES = ("lines", "exact", "whitespace", "float", "custom")
+
+
+class CheckResult:
+    __slots__ = ("accepted", "message")
+
+    def __init__(self, accepted, message=""):
+        self.accepted = accepted
+        self.message = message
+
+    def __bool__(self):
+        return self.accepted
+
+    def __repr__(self):
+        return f"CheckResult({self.accepted!r}, {self.message!r})"
+
+
+class CheckerError(Exception):
+    """The checker itself failed, the verdict is an internal error rather than a wrong answer."""
+
+
+class UnitTooLong(Exception):
+    pass
+
+
+def iter_chunks(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield bytes(view[start:start + CHUNK_SIZE])
+        return
+    with open(source, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+def iter_lines(source):
+    # Lines without their line ending, "\r\n" counts as "\n". A final line ending does not start another line
+    pending = b""
+    for chunk in iter_chunks(source):
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > MAX_UNIT_LENGTH:
+            raise UnitTooLong()
+        for line in lines:
+            yield line[:-1] if line.endswith(b"\r") else line
+    if pending:
+        yield pending[:-1] if pending.endswith(b"\r") else pending
+
+
+def iter_tokens(source):
+    # Whitespace separated tokens, a token split across two chunks is joined
+    pending = b""
+    for chunk in iter_chunks(source):
+        tokens = chunk.split()
+        if not tokens:
+            if pending:
+                yield pending
+                pending = b""
+            continue
+        if pending:
+            if chunk[:1].isspace():
+                yield pending
+            else:
+                tokens[0] = pending + tokens[0]
+            pending = b""
+        if not chunk[-1:].isspace():
+            pending = tokens.pop()
+            if len(pending) > MAX_UNIT_LENGTH:
+                raise UnitTooLong()
+        yield from tokens
+    if pending:
+        yield pending
+
+
+def sources_equal(actual, expected):
+    # Byte for byte comparison, accepted outputs are usually identical to the expected output
+    if isinstance(actual, str) and isinstance(expected, str) and os.path.getsize(actual) != os.path.getsize(expected):
+        return False
+    actual_chunks = iter_chunks(actual)
+    expected_chunks = iter_chunks(expected)
+    actual_buffer = expected_buffer = b""
+    while True:
+        if not actual_buffer:
+            actual_buffer = next(actual_chunks, b"")
+        if not expected_buffer:
+            expected_buffer = next(expected_chunks, b"")
+        if not actual_buffer or not expected_buffer:
+            return not actual_buffer and not expected_buffer
+        length = min(len(actual_buffer), len(expected_buffer))
+        if actual_buffer[:length] != expected_buffer[:length]:
+            return False
+        actual_buffer = actual_buffer[length:]
+        expected_buffer = expected_buffer[length:]
+
+
+def _preview(unit):
+    text = unit.decode("utf-8", errors="replace")
+    return text if len(text) <= MESSAGE_PREVIEW else text[:MESSAGE_PREVIEW] + "..."
+
+
+class StreamChecker:
+    """Compares outputs unit by unit, subclasses choose the units and when two units match."""
+
+    unit = "line"
+    # Whether blank units after the end of the other output are ignored
+    ignore_trailing_blank = False
+
+    def units(self, source):
+        return iter_lines(source)
+
+    def normalize(self, unit):
+        return unit
+
+    def units_match(self, actual, expected):
+        return actual == expected
+
+    def check(self, actual, expected, stdin=None):
+        if sources_equal(actual, expected):
+            return CheckResult(True)
+        try:
+            return self._compare(actual, expected)
+        except UnitTooLong:
+            return CheckResult(False, f"A {self.unit} is longer than {MAX_UNIT_LENGTH} bytes")
+
+    def _rest_is_blank(self, units):
+        # Consumes the rest of an output, which must be empty or only blank units where those are ignored
+        for unit in units:
+            if not self.ignore_trailing_blank or self.normalize(unit):
+                return False
+        return True
+
+    def _compare(self, actual, expected):
+        actual_units = self.units(actual)
+        expected_units = self.units(expected)
+        position = 0
+        for position, expected_unit in enumerate(expected_units, start=1):
+            actual_unit = next(actual_units, None)
+            if actual_unit is None:
+                if self._rest_is_blank(itertools.chain([expected_unit], expected_units)):
+                    return CheckResult(True)
+                return CheckResult(False, f"Output ended early, expected more output at {self.unit} {position}")
+            if not self.units_match(self.normalize(actual_unit), self.normalize(expected_unit)):
+                return CheckResult(
+                    False,
+                    f"Difference at {self.unit} {position}, found '{_preview(actual_unit)}'",
+                )
+        if not self._rest_is_blank(actual_units):
+            return CheckResult(False, f"Extra output after {self.unit} {position}")
+        return CheckResult(True)
+
+
+class ExactChecker(StreamChecker):
+    # Lines must match exactly, only the line ending style and a final line ending are ignored
+    pass
+
+
+class LineChecker(StreamChecker):
+    # Leading and trailing whitespace of every line and trailing blank lines are ignored, the default
+    ignore_trailing_blank = True
+
+    def normalize(self, unit):
+        return unit.strip()
+
+
+class WhitespaceChecker(StreamChecker):
+    # Tokens must match, any amount and kind of whitespace separates them
+    unit = "token"
+
+    def units(self, source):
+        return iter_tokens(source)
+
+
+class FloatChecker(WhitespaceChecker):
+    # Numeric tokens match within an absolute or relative tolerance, other tokens must be equal
+    def __init__(self, abs_tolerance=DEFAULT_ABS_TOLERANCE, rel_tolerance=DEFAULT_REL_TOLERANCE):
+        self.abs_tolerance = abs_tolerance
+        self.rel_tolerance = rel_tolerance
+
+    def units_match(self, actual, expected):
+        if actual == expected:
+            return True
+        try:
+            actual_value, expected_value = float(actual), float(expected)
+        except ValueError:
+            return False
+        if math.isnan(actual_value) or math.isnan(expected_value):
+            return math.isnan(actual_value) and math.isnan(expected_value)
+        return math.isclose(actual_value, expected_value, rel_tol=self.rel_tolerance, abs_tol=self.abs_tolerance)
+
+
+class CustomChecker:
+    """Runs a checker program as `checker <input> <expected> <output>` in the local executor's sandbox.
+
+    Exit code 0 accepts the output, 1 and 2 (testlib's wrong answer and presentation error) reject it and anything
+    else is a CheckerError. The first line the checker writes is used as the message.
+    """
+
+    def __init__(self, executor, language_id, source_code):
+        self.executor = executor
+        self.language_id = language_id
+        self.source_code = source_code
+
+    def check(self, actual, expected, stdin=None):
+        program = self.executor.compile(self.language_id, self.source_code)
+        if not program.compiled:
+            raise CheckerError("The checker does not compile")
+        with tempfile.TemporaryDirectory(prefix="astar-check-") as directory:
+            paths = []
+            for name, source in (("input", stdin or b""), ("expected", expected), ("output", actual)):
+                if isinstance(source, str):
+                    paths.append(os.path.abspath(source))
+                    continue
+                path = os.path.join(directory, name)
+                with open(path, "wb") as file:
+                    file.write(source)
+                paths.append(path)
+            try:
+                result = self.executor.run_program(program, paths)
+            finally:
+                self.executor.release(program)
+        message = (result["stdout"] or result["stderr"]).decode("utf-8", errors="replace").strip().split("\n")[0]
+        if result["timed_out"] or result["returncode"] not in (0, 1, 2):
+            raise CheckerError(f"The checker failed with exit code {result['returncode']}: {message}")
+        return CheckResult(result["returncode"] == 0, message)
+
+
+def get_checker(config=None, executor=None):
+    """Checker for a problem's checker setting: {"mode": ..., plus "abs_tolerance"/"rel_tolerance" for float and
+    "language_id"/"source_code" (base64) for custom}. Custom checkers need a LocalExecutor to run in."""
+    config = config or {}
+    mode = config.get("mode", "lines")
+    if mode == "lines":
+        return LineChecker()
+    if mode == "exact":
+        return ExactChecker()
+    if mode == "whitespace":
+        return WhitespaceChecker()
+    if mode == "float":
+        return FloatChecker(
+            config.get("abs_tolerance", DEFAULT_ABS_TOLERANCE), config.get("rel_tolerance", DEFAULT_REL_TOLERANCE)
+        )
+    if mode == "custom":
+        if executor is None:
+            raise CheckerError("Custom checkers need a local executor")
+        return CustomChecker(executor, config["language_id"], config["source_code"])
+    raise CheckerError(f"Unknown checker mode {mode}")
+
+
+
+def _rss_kilobytes():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def _legacy_check(actual, expected):
+    # The comparison used before checkers, both outputs split into lists of stripped lines
+    with open(actual) as actual_file, open(expected) as expected_file:
+        actual_lines = list(map(str.strip, actual_file.read().split("\n")))
+        expected_lines = list(map(str.strip, expected_file.read().split("\n")))
+    return actual_lines[:len(expected_lines)] == expected_lines
+
+
+def _run_benchmark(mode, actual, expected):
+    # Runs in a fresh process, the memory reported is how far the peak RSS grew above the RSS at the start
+    rss_before = _rss_kilobytes()
+    started_at = time.perf_counter()
+    accepted = _legacy_check(actual, expected) if mode == "legacy" else get_checker({"mode": mode}).check(actual, expected).accepted
+    elapsed = time.perf_counter() - started_at
+    return accepted, elapsed, max(0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before)
+
+
+def benchmark(size_mb=100, directory=None):
+    """Time every built-in mode on generated outputs of about size_mb megabytes.
+
+    The output differs from the expected output in line endings and trailing spaces, so no mode takes the byte for
+    byte fast path, except exact which is given an identical copy. Returns (mode, accepted, seconds, peak RSS growth
+    in kilobytes) tuples, "legacy" is the comparison used before checkers.
+    """
+    with tempfile.TemporaryDirectory(prefix="astar-checker-benchmark-", dir=directory) as directory:
+        expected_path = os.path.join(directory, "expected")
+        actual_path = os.path.join(directory, "actual")
+        with open(expected_path, "w") as expected, open(actual_path, "w", newline="") as actual:
+            index = 0
+            while expected.tell() < size_mb * 1024 * 1024:
+                lines = [f"{line} {line * 0.5:.6f} {line / 7:.6f}" for line in range(index, index + 10000)]
+                expected.write("\n".join(lines) + "\n")
+                actual.write(" \r\n".join(lines) + " \r\n")
+                index += 10000
+        results = []
+        context = multiprocessing.get_context("fork")
+        for mode in ("exact", "lines", "whitespace", "float", "legacy"):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                actual = expected_path if mode == "exact" else actual_path
+                results.append((mode, *pool.submit(_run_benchmark, mode, actual, expected_path).result()))
+        return results
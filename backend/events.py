@@ -0,0 +1,33 @@
+import json
+import time
+
+# Server-Sent Events are fanned out through Redis pub/sub channels. Every open stream holds a connection, so the app
+# is served by gevent workers (see the Dockerfile), where a waiting stream costs a greenlet and not a worker thread
+STREAM_DURATION = 300  # seconds before the client is asked to reconnect
+HEARTBEAT = 15  # seconds
+RECONNECT_DELAY = 3000  # milliseconds the browser waits before reconnecting
+POLL_INTERVAL = 1  # seconds
+
+
+def stream(pubsub, channels, duration=STREAM_DURATION, heartbeat=HEARTBEAT, clock=time.monotonic):
+    """Yield the frames of the events published on channels until duration has passed.
+
+    The stream then ends and the browser's EventSource reconnects after RECONNECT_DELAY. Heartbeat comments keep
+    proxies from closing an idle stream. The pub/sub connection is closed when the stream ends or the client leaves.
+    """
+    pubsub.subscribe(*channels)
+    try:
+        yield f"retry: {RECONNECT_DELAY}\n\n"
+        last_sent_at = clock()
+        closes_at = last_sent_at + duration
+        while clock() < closes_at:
+            message = pubsub.get_message(timeout=POLL_INTERVAL)
+            if message is not None:
+                event = json.loads(message["data"])
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                last_sent_at = clock()
+            elif clock() - last_sent_at >= heartbeat:
+                yield ": heartbeat\n\n"
+                last_sent_at = clock()
+    finally:
+        pubsub.close()
@@ -0,0 +1,507 @@
+import base64
+import glob
+import hashlib
+import json
+import math
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import checkers
+
+# Local replacement for Judge0: takes the same base64 encoded payload and returns a result shaped like Judge0's,
+# so finalize_submission handles both. Programs run in a sandbox (see sandbox.py): fresh mount, PID, network, IPC
+# and UTS namespaces, a read-only root with only the toolchain and their own directories, a dedicated uid and
+# rlimits. There is no fallback, without namespaces the executor refuses to run anything.
+CPU_TIME_LIMIT = float(os.getenv("EXECUTOR_CPU_TIME_LIMIT", 5))  # seconds
+WALL_TIME_LIMIT = float(os.getenv("EXECUTOR_WALL_TIME_LIMIT", 10))  # seconds
+MEMORY_LIMIT = int(os.getenv("EXECUTOR_MEMORY_LIMIT", 256))  # megabytes
+OUTPUT_LIMIT = int(os.getenv("EXECUTOR_OUTPUT_LIMIT", 256)) * 1024 * 1024  # bytes a program may write to stdout or stderr
+RESULT_OUTPUT_LIMIT = 64 * 1024  # bytes of stdout and stderr returned in a result, the checker reads the whole file
+COMPILE_CPU_TIME_LIMIT = 20
+COMPILE_WALL_TIME_LIMIT = 30
+COMPILE_CACHE_ENTRIES = 500
+
+# Judge0 status ids
+ACCEPTED = {"id": 3, "description": "Accepted"}
+WRONG_ANSWER = {"id": 4, "description": "Wrong Answer"}
+TIME_LIMIT_EXCEEDED = {"id": 5, "description": "Time Limit Exceeded"}
+COMPILATION_ERROR = {"id": 6, "description": "Compilation Error"}
+SIGNAL_STATUSES = {
+    signal.SIGSEGV: {"id": 7, "description": "Runtime Error (SIGSEGV)"},
+    signal.SIGXFSZ: {"id": 8, "description": "Runtime Error (SIGXFSZ)"},
+    signal.SIGFPE: {"id": 9, "description": "Runtime Error (SIGFPE)"},
+    signal.SIGABRT: {"id": 10, "description": "Runtime Error (SIGABRT)"},
+}
+RUNTIME_ERROR = {"id": 11, "description": "Runtime Error (NZEC)"}
+OTHER_RUNTIME_ERROR = {"id": 12, "description": "Runtime Error (Other)"}
+INTERNAL_ERROR = {"id": 13, "description": "Internal Error"}
+# Not a Judge0 status, cases left unjudged after a failure in fail fast mode
+SKIPPED = {"id": None, "description": "Skipped"}
+
+# Judge0 language id -> source file, compile command (None for interpreted languages) and run command.
+# Commands are relative to the build directory, "{build}" is replaced by its path and "{memory}" by the memory limit
+# in megabytes when running.
+# The JVM and V8 reserve far more address space than they use, so their heap is capped by flags instead of RLIMIT_AS.
+LANGUAGES = {
+    71: {"source": "main.py", "compile": None, "run": ["python3", "{build}/main.py"], "address_space_limit": True},
+    63: {"source": "main.js", "compile": None, "run": ["node", "--max-old-space-size={memory}", "{build}/main.js"], "address_space_limit": False},
+    62: {"source": "Main.java", "compile": ["javac", "-encoding", "UTF-8", "Main.java"], "run": ["java", "-Xmx{memory}m", "-Xss64m", "-XX:+UseSerialGC", "-cp", "{build}", "Main"], "address_space_limit": False},
+    54: {"source": "main.cpp", "compile": ["g++", "-O2", "-std=c++17", "-pipe", "-o", "main", "main.cpp"], "run": ["{build}/main"], "address_space_limit": True},
+    50: {"source": "main.c", "compile": ["gcc", "-O2", "-std=c11", "-pipe", "-o", "main", "main.c", "-lm"], "run": ["{build}/main"], "address_space_limit": True},
+    74: {"source": "main.ts", "compile": ["tsc", "--target", "es2020", "--module", "commonjs", "main.ts"], "run": ["node", "--max-old-space-size={memory}", "{build}/main.js"], "address_space_limit": False},
+}
+LANGUAGES[34] = LANGUAGES[71]  # get_language_id falls back to Judge0's Python 3 id
+
+SANDBOX_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox.py")
+UNSHARE_OPTIONS = ["--mount", "--pid", "--net", "--ipc", "--uts", "--fork", "--kill-child"]
+# Host paths mounted read-only in the sandbox, programs see nothing else of the host
+SANDBOX_PATHS = [
+    "/usr", "/bin", "/sbin", "/lib", "/lib32", "/lib64", "/libx32", "/etc/alternatives", "/etc/ld.so.cache",
+    *glob.glob("/etc/java-*"),
+    *filter(None, os.getenv("EXECUTOR_SANDBOX_PATHS", "").split(":")),
+]
+# PATH inside the sandbox, tools are looked up here and must live under SANDBOX_PATHS
+SANDBOX_PATH = os.getenv("EXECUTOR_PATH", "/usr/local/bin:/usr/bin:/bin")
+# Programs run as this uid and gid, preferably used by nothing else on the host
+SANDBOX_UID = int(os.getenv("EXECUTOR_UID", 65534))
+SANDBOX_GID = int(os.getenv("EXECUTOR_GID", 65534))
+# Processes and threads of SANDBOX_UID across every running program, only enforced when the worker runs as root
+PROCESS_LIMIT = 512
+# Time the sandbox may take to set up and tear down before the worker kills it
+SANDBOX_SETUP_TIME = 5
+
+
+class SandboxError(OSError):
+    pass
+
+
+class SandboxUnavailable(SandboxError):
+    pass
+
+
+class Program:
+    __slots__ = ("language", "build_dir", "compile_output", "cleanup")
+
+    def __init__(self, language, build_dir, compile_output=None, cleanup=False):
+        self.language = language
+        self.build_dir = build_dir
+        self.compile_output = compile_output
+        self.cleanup = cleanup
+
+    @property
+    def compiled(self):
+        return self.compile_output is None
+
+
+def _encode(data):
+    return base64.b64encode(data).decode() if data else None
+
+
+class LocalExecutor:
+    """Runs Judge0 payloads on this machine, see LANGUAGES for the supported languages."""
+
+    def __init__(self, cache_dir=None, max_workers=None):
+        self.cache_dir = cache_dir or os.getenv("EXECUTOR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "astar-executor-cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Programs running at once, more than the number of cores would skew CPU times
+        self.workers = max_workers or os.cpu_count() or 1
+        self.slots = threading.BoundedSemaphore(self.workers)
+        # As root the sandbox switches to SANDBOX_UID, otherwise a user namespace maps the worker's uid to it
+        self.user_namespace = os.geteuid() != 0
+        self._isolation_error = None
+        self._isolation_checked = False
+
+    def check_isolation(self):
+        """Raise SandboxUnavailable unless programs can run in the sandbox. Checked once, by running `true`."""
+        if not self._isolation_checked:
+            try:
+                run_dir = tempfile.mkdtemp(prefix="astar-run-")
+                try:
+                    stdin_path = os.path.join(run_dir, ".stdin")
+                    open(stdin_path, "wb").close()
+                    result = self._sandboxed(["true"], run_dir, stdin_path, 5, 10, 64, False)
+                finally:
+                    shutil.rmtree(run_dir, ignore_errors=True)
+                if result["returncode"] != 0:
+                    raise SandboxError(f"`true` exited with {result['returncode']}")
+            except OSError as e:
+                self._isolation_error = f"The local executor's sandbox is unavailable: {e}"
+            self._isolation_checked = True
+        if self._isolation_error:
+            raise SandboxUnavailable(self._isolation_error)
+
+    def _spawn(self, command, cwd, stdin_path, cpu_time, wall_time, memory, address_space_limit, readonly_paths=()):
+        self.check_isolation()
+        return self._sandboxed(command, cwd, stdin_path, cpu_time, wall_time, memory, address_space_limit, readonly_paths)
+
+    def _sandboxed(self, command, cwd, stdin_path, cpu_time, wall_time, memory, address_space_limit, readonly_paths=()):
+        # Output goes to files so RLIMIT_FSIZE caps it. cwd is the only writable host directory in the sandbox,
+        # readonly_paths (the build directory, a checker's files) are visible read-only at the same paths
+        executable = command[0] if os.path.isabs(command[0]) else shutil.which(command[0], path=SANDBOX_PATH)
+        if executable is None:
+            # Checked here, inside the sandbox a missing tool would look like a failure of the program
+            raise FileNotFoundError(f"{command[0]} is not installed on the judge host")
+        unshare = shutil.which("unshare")
+        if unshare is None:
+            raise SandboxUnavailable("unshare (util-linux) is not installed")
+        cwd = os.path.abspath(cwd)
+        readonly_paths = [os.path.abspath(path) for path in readonly_paths]
+        if not self.user_namespace:
+            # The sandbox uid writes to cwd and reads the rest, mkdtemp creates directories only the worker can open
+            os.chown(cwd, SANDBOX_UID, SANDBOX_GID)
+            for path in readonly_paths:
+                if os.path.isdir(path):
+                    os.chmod(path, 0o755)
+        # The sandbox builds its root in an empty directory, unmounted again when its namespace goes away
+        root = tempfile.mkdtemp(prefix="astar-root-")
+        config = {
+            "root": root,
+            "toolchain_paths": SANDBOX_PATHS,
+            "readonly_paths": readonly_paths,
+            "writable_paths": [cwd],
+            "cwd": cwd,
+            "command": [executable, *command[1:]],
+            "env": {"PATH": SANDBOX_PATH, "HOME": cwd, "LANG": "C.UTF-8"},
+            "uid": SANDBOX_UID,
+            "gid": SANDBOX_GID,
+            "user_namespace": self.user_namespace,
+            "cpu_time": cpu_time,
+            "wall_time": wall_time,
+            "memory": memory,
+            "address_space_limit": address_space_limit,
+            "output_limit": OUTPUT_LIMIT,
+            "process_limit": None if self.user_namespace else PROCESS_LIMIT,
+        }
+        options = ["--user", "--map-root-user", *UNSHARE_OPTIONS] if self.user_namespace else UNSHARE_OPTIONS
+        report_read, report_write = os.pipe()
+        stdout_path = os.path.join(cwd, ".stdout")
+        stderr_path = os.path.join(cwd, ".stderr")
+        try:
+            # No preexec_fn: forking Python code from the worker's threads can deadlock, limits are set by the
+            # sandbox in its own single threaded process
+            with open(stdin_path, "rb") as stdin, open(stdout_path, "wb") as stdout, open(stderr_path, "wb") as stderr:
+                process = subprocess.Popen(
+                    [unshare, *options, sys.executable, "-I", "-S", SANDBOX_SCRIPT, str(report_write), json.dumps(config)],
+                    cwd=cwd,
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=stderr,
+                    env={"PATH": SANDBOX_PATH, "LANG": "C.UTF-8"},
+                    pass_fds=(report_write,),
+                    # A new session lets the fallback timeout below kill the whole sandbox
+                    start_new_session=True,
+                )
+            os.close(report_write)
+            report_write = None
+            killed = threading.Event()
+
+            def kill():
+                killed.set()
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            # The sandbox enforces wall_time itself, this only catches a sandbox that hangs
+            timer = threading.Timer(wall_time + SANDBOX_SETUP_TIME, kill)
+            timer.start()
+            try:
+                process.wait()
+            finally:
+                timer.cancel()
+            with os.fdopen(report_read, "rb") as report_file:
+                report_read = None
+                report = report_file.read()
+        finally:
+            for fd in (report_read, report_write):
+                if fd is not None:
+                    os.close(fd)
+            os.rmdir(root)
+
+        # Only the start of the output is loaded, the files stay in cwd for the checker
+        with open(stdout_path, "rb") as stdout, open(stderr_path, "rb") as stderr:
+            result = {
+                "stdout": stdout.read(RESULT_OUTPUT_LIMIT),
+                "stderr": stderr.read(RESULT_OUTPUT_LIMIT),
+                "stdout_path": stdout_path,
+            }
+        if killed.is_set():
+            return {**result, "returncode": -signal.SIGKILL, "cpu_time": 0.0, "wall_time": wall_time, "memory": None, "timed_out": True}
+        if not report:
+            raise SandboxError(f"The sandbox exited with {process.returncode}: {result['stderr'][:512].decode(errors='replace').strip()}")
+        report = json.loads(report)
+        if "error" in report:
+            raise SandboxError(report["error"])
+        return {
+            **result,
+            "returncode": report["returncode"],
+            "cpu_time": report["cpu_time"],
+            "wall_time": report["wall_time"],
+            # Kilobytes on Linux, the unit Judge0 reports. The program is forked from the sandbox's small Python
+            # process, so small programs report about its size
+            "memory": report["memory"],
+            "timed_out": report["timed_out"],
+        }
+
+    def compile(self, language_id, source_code):
+        """Build a Program from base64 encoded source, compiled artifacts are cached by a hash of the source."""
+        language = LANGUAGES.get(language_id)
+        if language is None:
+            raise ValueError(f"Unsupported language id {language_id}")
+        source = base64.b64decode(source_code or "")
+
+        if language["compile"] is None:
+            build_dir = tempfile.mkdtemp(prefix="astar-build-")
+            with open(os.path.join(build_dir, language["source"]), "wb") as file:
+                file.write(source)
+            return Program(language, build_dir, cleanup=True)
+
+        digest = hashlib.sha256(repr(language["compile"]).encode() + b"\0" + source).hexdigest()
+        build_dir = os.path.join(self.cache_dir, digest)
+        compile_error_path = os.path.join(build_dir, ".compile_error")
+        if os.path.isdir(build_dir):
+            os.utime(build_dir)
+            if os.path.exists(compile_error_path):
+                with open(compile_error_path, "rb") as file:
+                    return Program(language, build_dir, compile_output=file.read())
+            return Program(language, build_dir)
+
+        # Compile in a private directory and move it into place, concurrent compiles of the same source are harmless
+        staging_dir = tempfile.mkdtemp(prefix=f"{digest}-", dir=self.cache_dir)
+        with open(os.path.join(staging_dir, language["source"]), "wb") as file:
+            file.write(source)
+        open(os.path.join(staging_dir, ".stdin"), "wb").close()
+        try:
+            with self.slots:
+                result = self._spawn(
+                    language["compile"], staging_dir, os.path.join(staging_dir, ".stdin"),
+                    COMPILE_CPU_TIME_LIMIT, COMPILE_WALL_TIME_LIMIT, 1024, False,
+                )
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        compile_output = None
+        if result["returncode"] != 0:
+            compile_output = (result["stdout"] + result["stderr"]) or b"Compilation failed"
+            if result["timed_out"]:
+                compile_output = b"Compilation time limit exceeded"
+            with open(os.path.join(staging_dir, ".compile_error"), "wb") as file:
+                file.write(compile_output)
+        for name in (".stdin", ".stdout", ".stderr"):
+            os.remove(os.path.join(staging_dir, name))
+        try:
+            os.rename(staging_dir, build_dir)
+        except OSError:
+            # Another worker finished the same build first
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        self._evict()
+        return Program(language, build_dir, compile_output=compile_output)
+
+    def _evict(self):
+        # Least recently used builds go first, a build is touched whenever it is reused
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_dir() and len(entry.name) == 64]
+        if len(entries) <= COMPILE_CACHE_ENTRIES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[: len(entries) - COMPILE_CACHE_ENTRIES]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def execute(self, program, stdin, expected_output=None, cpu_time_limit=None, wall_time_limit=None, memory_limit=None, checker=None):
+        """Run a compiled Program on base64 encoded stdin and return a Judge0 shaped result.
+
+        Limits default to the EXECUTOR_* settings, memory_limit is in kilobytes as in Judge0. The output is compared
+        with checker, by default checkers.LineChecker.
+        """
+        cpu_time_limit = cpu_time_limit or CPU_TIME_LIMIT
+        wall_time_limit = wall_time_limit or WALL_TIME_LIMIT
+        memory = math.ceil(memory_limit / 1024) if memory_limit else MEMORY_LIMIT
+        if not program.compiled:
+            return {"status": COMPILATION_ERROR, "compile_output": _encode(program.compile_output), "time": None, "memory": None}
+
+        run_dir = tempfile.mkdtemp(prefix="astar-run-")
+        try:
+            stdin_path = os.path.join(run_dir, ".stdin")
+            with open(stdin_path, "wb") as file:
+                file.write(base64.b64decode(stdin or ""))
+            with self.slots:
+                result = self._spawn(
+                    self._command(program, memory), run_dir, stdin_path,
+                    cpu_time_limit, wall_time_limit, memory, program.language["address_space_limit"],
+                    [program.build_dir],
+                )
+
+            returncode = result["returncode"]
+            check = None
+            if result["timed_out"] or result["cpu_time"] > cpu_time_limit or returncode == -signal.SIGXCPU:
+                status = TIME_LIMIT_EXCEEDED
+            elif returncode < 0:
+                status = SIGNAL_STATUSES.get(-returncode, OTHER_RUNTIME_ERROR)
+            elif returncode != 0:
+                status = RUNTIME_ERROR
+            elif expected_output is None:
+                status = ACCEPTED
+            else:
+                # Streamed from the output file, large outputs are never loaded at once
+                try:
+                    check = (checker or checkers.LineChecker()).check(
+                        result["stdout_path"], base64.b64decode(expected_output), stdin_path
+                    )
+                    status = ACCEPTED if check.accepted else WRONG_ANSWER
+                except checkers.CheckerError as e:
+                    check = checkers.CheckResult(False, str(e))
+                    status = INTERNAL_ERROR
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+        judge0_result = {
+            "status": status,
+            "stdout": _encode(result["stdout"]),
+            "stderr": _encode(result["stderr"]),
+            "time": f"{result['cpu_time']:.3f}",
+            "wall_time": f"{result['wall_time']:.3f}",
+            "memory": result["memory"],
+        }
+        if check is not None and check.message:
+            judge0_result["message"] = check.message
+        return judge0_result
+
+    def _command(self, program, memory=MEMORY_LIMIT):
+        return [
+            part.replace("{build}", program.build_dir).replace("{memory}", str(memory)) for part in program.language["run"]
+        ]
+
+    def run_program(self, program, arguments):
+        """Run a compiled helper program, such as a checker, with extra arguments and no stdin.
+
+        Arguments that are paths of existing files are visible to it read-only. Returns the exit code, the start of
+        stdout and stderr and whether it timed out.
+        """
+        run_dir = tempfile.mkdtemp(prefix="astar-run-")
+        try:
+            stdin_path = os.path.join(run_dir, ".stdin")
+            open(stdin_path, "wb").close()
+            with self.slots:
+                result = self._spawn(
+                    [*self._command(program), *arguments], run_dir, stdin_path,
+                    CPU_TIME_LIMIT, WALL_TIME_LIMIT, MEMORY_LIMIT, program.language["address_space_limit"],
+                    [program.build_dir, *(argument for argument in arguments if os.path.exists(argument))],
+                )
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        return result
+
+    def execute_all(self, program, test_cases, fail_fast=False, checker=None):
+        """Run a Program on every test case in parallel, results are in test case order.
+
+        Test cases are dicts with base64 encoded stdin and expected_output, and optional limits. In fail fast mode the
+        cases not started yet when one fails are left out, their result is None.
+        """
+        if not program.compiled:
+            return [self.execute(program, None)] * len(test_cases)
+        results = [None] * len(test_cases)
+        with ThreadPoolExecutor(max_workers=min(len(test_cases), self.workers) or 1) as pool:
+            futures = {
+                pool.submit(
+                    self.execute,
+                    program,
+                    test_case["stdin"],
+                    test_case["expected_output"],
+                    test_case.get("cpu_time_limit"),
+                    test_case.get("wall_time_limit"),
+                    test_case.get("memory_limit"),
+                    checker,
+                ): index
+                for index, test_case in enumerate(test_cases)
+            }
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                results[futures[future]] = future.result()
+                if fail_fast and results[futures[future]]["status"]["id"] != ACCEPTED["id"]:
+                    for pending in futures:
+                        pending.cancel()
+        return results
+
+    def release(self, program):
+        if program.cleanup:
+            shutil.rmtree(program.build_dir, ignore_errors=True)
+
+    def judge(self, language_id, source_code, test_cases, fail_fast=False, checker=None):
+        """Compile once and run every test case (see execute_all), returns the aggregated Judge0 shaped result."""
+        try:
+            program = self.compile(language_id, source_code)
+        except (ValueError, OSError) as e:
+            return {"status": INTERNAL_ERROR, "stderr": _encode(str(e).encode()), "time": None, "memory": None}
+        try:
+            return aggregate_results(self.execute_all(program, test_cases, fail_fast, checker))
+        except OSError as e:
+            return {"status": INTERNAL_ERROR, "stderr": _encode(str(e).encode()), "time": None, "memory": None}
+        finally:
+            self.release(program)
+
+    def run(self, payload):
+        """Judge a Judge0 submission payload (source_code, stdin, expected_output, language_id)."""
+        try:
+            program = self.compile(payload["language_id"], payload["source_code"])
+        except (ValueError, OSError) as e:
+            return {"status": INTERNAL_ERROR, "stderr": _encode(str(e).encode()), "time": None, "memory": None}
+        try:
+            return self.execute(program, payload.get("stdin"), payload.get("expected_output"))
+        except OSError as e:
+            # Missing interpreter or compiler on this host
+            return {"status": INTERNAL_ERROR, "stderr": _encode(str(e).encode()), "time": None, "memory": None}
+        finally:
+            self.release(program)
+
+
+def _seconds(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def aggregate_results(results):
+    """Combine the Judge0 shaped results of every test case (None when skipped) into one result.
+
+    The verdict, output and errors are those of the first failed case, time and memory the maximum over all cases.
+    """
+    judged = [result for result in results if result is not None]
+    failed = next((result for result in judged if result["status"]["id"] != ACCEPTED["id"]), None)
+    shown = failed or (judged[-1] if judged else {})
+    return {
+        "status": failed["status"] if failed else ACCEPTED if judged else INTERNAL_ERROR,
+        "stdout": shown.get("stdout"),
+        "stderr": shown.get("stderr"),
+        "compile_output": shown.get("compile_output"),
+        "message": shown.get("message"),
+        "time": f"{max((_seconds(result.get('time')) for result in judged), default=0):.3f}",
+        "memory": max((result.get("memory") or 0 for result in judged), default=0),
+        "test_cases": [
+            {
+                "status": result["status"] if result is not None else SKIPPED,
+                "time": result.get("time") if result is not None else None,
+                "memory": result.get("memory") if result is not None else None,
+                "message": result.get("message") if result is not None else None,
+            }
+            for result in results
+        ],
+        "number_of_passed_test_cases": f"{sum(1 for result in judged if result['status']['id'] == ACCEPTED['id'])}/{len(results)}",
+    }
+
+
+# JUDGE_EXECUTOR values handled in-process, "judge0" sends submissions to the hosted Judge0 API instead.
+# "stub" is the name of the earlier Python-only development executor.
+EXECUTORS = {"local": LocalExecutor, "stub": LocalExecutor}
+
+
+def get_executor(name):
+    executor_class = EXECUTORS.get(name)
+    return executor_class() if executor_class is not None else None
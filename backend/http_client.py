@@ -0,0 +1,143 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+# Outbound services, each with its own keep-alive session and connection pool.
+# Timeouts are (connect, read) seconds. Connection errors are retried for every method, read errors and
+# retryable status codes only for the methods listed, a POST may already have been processed by the upstream.
+UPSTREAMS = {
+    "judge0": {"timeout": (5, 60), "pool_size": 16, "retries": 2, "retry_methods": ("GET",)},
+    "gemini": {"timeout": (5, 120), "pool_size": 4, "retries": 2, "retry_methods": ()},
+    "cdn": {"timeout": (5, 30), "pool_size": 4, "retries": 1, "retry_methods": ()},
+    "oauth": {"timeout": (5, 15), "pool_size": 4, "retries": 1, "retry_methods": ()},
+}
+RETRY_STATUS_CODES = (502, 503, 504)
+RETRY_BACKOFF = 0.2  # seconds, doubled after every retry
+RETRY_JITTER = 0.2  # seconds of random delay added to every backoff
+
+# The circuit opens after this many consecutive failures (connection errors, timeouts and 5xx responses)
+# and fails calls immediately until the cooldown has passed, then a single call probes the upstream
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 30  # seconds
+
+_redis_client = None
+_sessions = {}
+_circuits = {}
+_lock = threading.Lock()
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """Raised without a network call while the upstream's circuit is open."""
+
+
+class Circuit:
+    __slots__ = ("failures", "opened_at", "probing")
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+
+def init_metrics(redis_client):
+    global _redis_client
+    _redis_client = redis_client
+
+
+def get_session(upstream):
+    # Sessions are created on first use, so every Gunicorn worker and forked process gets its own pools
+    session = _sessions.get(upstream)
+    if session is not None:
+        return session
+    with _lock:
+        if upstream not in _sessions:
+            config = UPSTREAMS[upstream]
+            # urllib3 retries every method when allowed_methods is empty, so upstreams without retry methods turn
+            # read and status retries off instead
+            retry_methods = frozenset(config["retry_methods"])
+            retry = Retry(
+                total=config["retries"],
+                connect=config["retries"],
+                read=config["retries"] if retry_methods else 0,
+                status=config["retries"] if retry_methods else 0,
+                other=0,
+                allowed_methods=retry_methods or Retry.DEFAULT_ALLOWED_METHODS,
+                status_forcelist=RETRY_STATUS_CODES,
+                backoff_factor=RETRY_BACKOFF,
+                backoff_jitter=RETRY_JITTER,
+                raise_on_status=False,
+            )
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=config["pool_size"], max_retries=retry))
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=config["pool_size"], max_retries=retry))
+            _sessions[upstream] = session
+            _circuits[upstream] = Circuit()
+        return _sessions[upstream]
+
+
+def _allow_request(upstream):
+    circuit = _circuits[upstream]
+    with _lock:
+        if circuit.opened_at is None:
+            return True
+        if circuit.probing or time.monotonic() - circuit.opened_at < CIRCUIT_COOLDOWN:
+            return False
+        circuit.probing = True
+        return True
+
+
+def _record_result(upstream, failed):
+    circuit = _circuits[upstream]
+    with _lock:
+        circuit.probing = False
+        if not failed:
+            circuit.failures = 0
+            circuit.opened_at = None
+            return
+        circuit.failures += 1
+        if circuit.opened_at is not None or circuit.failures >= CIRCUIT_FAILURE_THRESHOLD:
+            circuit.opened_at = time.monotonic()
+
+
+def _record_latency(upstream, outcome, duration):
+    if _redis_client is not None:
+        metrics.record(
+            _redis_client, "astar_upstream_request_duration_seconds", {"upstream": upstream, "outcome": outcome}, duration
+        )
+
+
+def request(upstream, method, url, **kwargs):
+    """Send a request through the upstream's pooled session, returns the requests.Response.
+
+    Raises UpstreamUnavailable while the circuit is open and requests.exceptions.RequestException when the
+    upstream could not be reached, the same exceptions requests.request raises.
+    """
+    session = get_session(upstream)
+    if not _allow_request(upstream):
+        _record_latency(upstream, "circuit_open", 0)
+        raise UpstreamUnavailable(f"{upstream} is unavailable, circuit open")
+
+    kwargs.setdefault("timeout", UPSTREAMS[upstream]["timeout"])
+    started_at = time.perf_counter()
+    try:
+        response = session.request(method, url, **kwargs)
+    except Exception:
+        _record_result(upstream, failed=True)
+        _record_latency(upstream, "error", time.perf_counter() - started_at)
+        raise
+    _record_result(upstream, failed=response.status_code >= 500)
+    _record_latency(upstream, f"{response.status_code // 100}xx", time.perf_counter() - started_at)
+    return response
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, "GET", url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, "POST", url, **kwargs)
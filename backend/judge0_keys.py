@@ -0,0 +1,148 @@
+import hashlib
+import random
+import time
+
+import redis
+
+# Scheduling state of every Judge0 RapidAPI key lives in Redis, shared by all web and judge worker processes.
+# Keys are identified by a hash of the key, the key itself is never stored in Redis or MongoDB.
+KEY_STATE_PREFIX = "judge0:key:"
+DEFAULT_WEIGHT = 100  # quota assumed for a key whose rate limit headers have not been seen yet
+DEFAULT_COOLDOWN = 60  # seconds a key rests after a 429 without a usable Retry-After or reset header
+ERROR_WINDOW = 300  # seconds, error rates are computed over fixed windows of this length
+ERROR_RATE_MIN_REQUESTS = 5
+MIN_WEIGHT_FACTOR = 0.05  # a failing key keeps a small share so it is noticed when it recovers
+
+
+class NoKeyAvailable(Exception):
+    """Every key is cooling down or out of quota, retry_after is the seconds until the first one is usable."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"No Judge0 API key available for {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+def key_id(key):
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+
+def load_keys(value):
+    # Comma separated keys from the API_KEY setting, by key id
+    return {key_id(key): key for key in (key.strip() for key in value.split(",")) if key}
+
+
+def _header(headers, name):
+    value = headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _weight(state, errors, now):
+    cooldown_until = float(state.get(b"cooldown_until", 0))
+    if cooldown_until > now:
+        return 0, cooldown_until - now
+    reset_at = float(state.get(b"reset_at", 0))
+    if b"remaining" in state and reset_at > now:
+        remaining = float(state[b"remaining"])
+        if remaining <= 0:
+            return 0, reset_at - now
+        weight = remaining
+    else:
+        # The quota was never reported or has been reset since
+        weight = float(state.get(b"limit", DEFAULT_WEIGHT))
+
+    requests_seen = int(errors.get(b"requests", 0))
+    if requests_seen >= ERROR_RATE_MIN_REQUESTS:
+        weight *= max(MIN_WEIGHT_FACTOR, 1 - int(errors.get(b"errors", 0)) / requests_seen)
+    return weight, 0
+
+
+def choose_key(redis_client, keys):
+    """Pick a key id, weighted by remaining quota and recent error rate. Raises NoKeyAvailable."""
+    if not keys:
+        raise NoKeyAvailable(DEFAULT_COOLDOWN)
+    now = time.time()
+    window = int(now // ERROR_WINDOW)
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hgetall(f"{KEY_STATE_PREFIX}{key}")
+            pipeline.hgetall(f"{KEY_STATE_PREFIX}{key}:errors:{window}")
+        replies = pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        # Scheduling must never stop judging, fall back to a uniform choice
+        print(f"Judge0 key state unavailable: {e}")
+        return random.choice(list(keys))
+
+    weights = {}
+    waits = []
+    for index, key in enumerate(keys):
+        weight, wait = _weight(replies[2 * index], replies[2 * index + 1], now)
+        if weight > 0:
+            weights[key] = weight
+        else:
+            waits.append(wait)
+    if not weights:
+        raise NoKeyAvailable(min(waits))
+    return random.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def retry_after(redis_client, keys):
+    """Seconds until one of the keys can be used again, 0 when one already can."""
+    try:
+        choose_key(redis_client, keys)
+    except NoKeyAvailable as e:
+        return e.retry_after
+    return 0
+
+
+def record_response(redis_client, key, response=None):
+    """Store the quota a response reported for a key, a missing response counts as a failed request."""
+    now = time.time()
+    window_key = f"{KEY_STATE_PREFIX}{key}:errors:{int(now // ERROR_WINDOW)}"
+    state = {}
+    failed = response is None or response.status_code >= 500
+    if response is not None:
+        # RapidAPI reports the plan quota on every response, the reset is in seconds from now
+        remaining = _header(response.headers, "x-ratelimit-requests-remaining")
+        limit = _header(response.headers, "x-ratelimit-requests-limit")
+        reset = _header(response.headers, "x-ratelimit-requests-reset")
+        if remaining is not None:
+            state["remaining"] = remaining
+        if limit is not None:
+            state["limit"] = limit
+        if reset is not None:
+            state["reset_at"] = now + reset
+        if response.status_code == 429:
+            retry_after = _header(response.headers, "retry-after") or reset or DEFAULT_COOLDOWN
+            state["cooldown_until"] = now + min(retry_after, 24 * 3600)
+
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        if state:
+            pipeline.hset(f"{KEY_STATE_PREFIX}{key}", mapping=state)
+        pipeline.hincrby(window_key, "requests", 1)
+        if failed:
+            pipeline.hincrby(window_key, "errors", 1)
+        pipeline.expire(window_key, ERROR_WINDOW * 2)
+        pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to record Judge0 key state: {e}")
+
+
+def get_key_states(redis_client, keys):
+    # Remaining quota (None when unknown) and cooldown of every key, for monitoring
+    now = time.time()
+    pipeline = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.hgetall(f"{KEY_STATE_PREFIX}{key}")
+    states = {}
+    for key, state in zip(keys, pipeline.execute()):
+        reset_at = float(state.get(b"reset_at", 0))
+        states[key] = {
+            "remaining": float(state[b"remaining"]) if b"remaining" in state and reset_at > now else None,
+            "cooling_down": float(state.get(b"cooldown_until", 0)) > now,
+        }
+    return states
@@ -1,21 +1,41 @@
 import os
 import uuid
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import base64
 import random
 from collections import defaultdict
 import requests
 import json
-import difflib
 import re
+import pickle
 import redis
+import click
+import time
+import subprocess
+import csv
+import io
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from flask import Flask, request, jsonify, session, redirect, url_for, render_template, abort
+from pymongo import MongoClient, UpdateOne, ReturnDocument, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Flask, Response, request, jsonify, session, redirect, url_for, render_template, abort, g, has_request_context
 from flask_session import Session
 from flask_cors import CORS
 from flask_ckeditor import CKEditor
+import similarity
+import repository
+import profiling
+import metrics
+import http_client
+import judge0_keys
+import executors
+import checkers
+import blobs
+import events
 from zoneinfo import ZoneInfo
 import google.generativeai as genai
 import secrets
@@ -52,13 +72,385 @@ app.config["CKEDITOR_HEIGHT"] = 400
 ckeditor = CKEditor(app)
 
 # Connect to MongoDB
-mongodb_client = MongoClient(os.getenv("MONGODB_URI"))["communitycompetitionprod"]
+mongodb_client = MongoClient(os.getenv("MONGODB_URI"), event_listeners=[profiling.query_profiler])["communitycompetitionprod"]
+repository.init_database(mongodb_client)
+blobs.init_store(mongodb_client)
+
+# Requests reading more documents than this through the repository are logged as likely N+1 queries
+QUERY_COUNT_WARNING = 25
+
+# Index manifest, every hot lookup must be served by one of these (checked by `flask verify-query-plans`)
+MONGODB_INDEXES = {
+    "submissions": [
+        IndexModel([("submission_id", ASCENDING)], unique=True),
+        # Rate limit check and keyset paginated submission history
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Top submissions of a problem and contest plagiarism reports
+        IndexModel(
+            [("problem_id", ASCENDING), ("submission_status.status_code", ASCENDING), ("submission_status.time", ASCENDING)]
+        ),
+        # Judging reconciliation
+        IndexModel([("judging_state", ASCENDING), ("judging_started_at", ASCENDING)]),
+        IndexModel([("judging_state", ASCENDING), ("created_at", ASCENDING)]),
+        # Submission chart backfill and keyset pagination of the admin listings
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "users": [
+        IndexModel([("user_account.user_id", ASCENDING)], unique=True),
+        # Login, every OAuth callback looks the user up by email
+        IndexModel([("user_account.primary_email", ASCENDING)]),
+        IndexModel([("user_account.created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "problems": [
+        IndexModel([("problem_id", ASCENDING)], unique=True),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "problem_test_cases": [
+        IndexModel([("problem_id", ASCENDING), ("test_set_version", ASCENDING), ("case_index", ASCENDING)], unique=True),
+    ],
+    "contests": [
+        IndexModel([("contest_id", ASCENDING)], unique=True),
+        IndexModel([("contest_end_time", ASCENDING), ("global_leaderboard_synced", ASCENDING)]),
+    ],
+    "announcements": [
+        IndexModel([("announcement_id", ASCENDING)], unique=True),
+        IndexModel([("is_active", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "global_leaderboard": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        IndexModel([("score", DESCENDING)]),
+    ],
+    "submission_daily_counts": [IndexModel([("date", ASCENDING)], unique=True)],
+    "user_stats": [IndexModel([("user_id", ASCENDING)], unique=True)],
+    "submission_fingerprints": [
+        IndexModel([("submission_id", ASCENDING)], unique=True),
+        IndexModel([("problem_id", ASCENDING), ("lsh_bands", ASCENDING)]),
+    ],
+    "contest_participants": [IndexModel([("contest_id", ASCENDING), ("user_id", ASCENDING)], unique=True)],
+    "contest_leaderboard": [IndexModel([("contest_id", ASCENDING), ("user_id", ASCENDING)], unique=True)],
+    "contest_plagiarism_reports": [IndexModel([("contest_id", ASCENDING)], unique=True)],
+    "slow_requests": [IndexModel([("endpoint", ASCENDING), ("duration", DESCENDING)])],
+}
+
+# Capped collections and their size in bytes, the oldest documents are dropped once full
+MONGODB_CAPPED_COLLECTIONS = {"slow_requests": 16 * 1024 * 1024}
+# Capped collections this process has made sure exist
+created_capped_collections = set()
+
+
+def create_capped_collection(collection):
+    # Writers call this before the first insert, an insert into a missing collection would create it uncapped
+    if collection in created_capped_collections:
+        return
+    try:
+        mongodb_client.create_collection(collection, capped=True, size=MONGODB_CAPPED_COLLECTIONS[collection])
+    except CollectionInvalid:
+        # Already exists
+        pass
+    created_capped_collections.add(collection)
+
+
+def ensure_indexes():
+    # createIndexes is a no-op for indexes that already exist, returns the collections that failed
+    failed_collections = []
+    for collection in MONGODB_CAPPED_COLLECTIONS:
+        create_capped_collection(collection)
+    for collection, indexes in MONGODB_INDEXES.items():
+        try:
+            mongodb_client[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            print(f"Failed to create indexes on {collection}: {e}")
+            failed_collections.append(collection)
+    return failed_collections
+
+
+if os.getenv("MONGODB_ENSURE_INDEXES") == "true":
+    ensure_indexes()
 
 # Gemini API Configuration
 genai.configure(api_key=os.environ["GEMINI_API_KEY"])
 
+# Redis client shared with Flask-Session, also used for application caches
+redis_client = app.config["SESSION_REDIS"]
+http_client.init_metrics(redis_client)
+
+# Time to live (in seconds) of each cached section of the global template context
+CONTEXT_CACHE_TTL = {
+    "announcements": 300,
+    "contests": 300,
+    "global_leaderboard": 120,
+    "submissions_chart": 60,
+    "new_users": 300,
+}
+
+
+def count_cache_lookup(cache, is_hit, count=1):
+    # Lookups made during a request are written with the request's metrics in one pipeline
+    if not count:
+        return
+    labels = (("cache", cache), ("result", "hit" if is_hit else "miss"))
+    if has_request_context():
+        g.setdefault("cache_lookups", defaultdict(int))[labels] += count
+    else:
+        metrics.record(redis_client, "astar_cache_requests_total", dict(labels), count)
+
+
+def get_cached_context(key, generate_value):
+    # Serve the value from Redis when present, otherwise generate it and cache it with the key's TTL
+    cache_key = f"context:{key}"
+    try:
+        cached_value = redis_client.get(cache_key)
+        if cached_value is not None:
+            count_cache_lookup("context", True)
+            return pickle.loads(cached_value)
+    except redis.exceptions.RedisError as e:
+        print(f"Context cache read failed for {key}: {e}")
+        return generate_value()
+
+    count_cache_lookup("context", False)
+    value = generate_value()
+    try:
+        redis_client.set(cache_key, pickle.dumps(value), ex=CONTEXT_CACHE_TTL[key])
+    except redis.exceptions.RedisError as e:
+        print(f"Context cache write failed for {key}: {e}")
+    return value
+
+
+def invalidate_context_cache(*keys):
+    try:
+        redis_client.delete(*[f"context:{key}" for key in keys])
+    except redis.exceptions.RedisError as e:
+        print(f"Context cache invalidation failed for {keys}: {e}")
+
+# Server-Sent Events are fanned out through Redis pub/sub channels, see events.stream
+def publish_event(channel, event_type, data):
+    try:
+        redis_client.publish(f"events:{channel}", json.dumps({"type": event_type, "data": data}, default=str))
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to publish {event_type} event on {channel}: {e}")
+
+
+# Request profiling, per endpoint totals are kept in Redis and slow requests are sampled to MongoDB
+SLOW_REQUEST_THRESHOLD = 1.0  # seconds
+REQUEST_PROFILE_ENDPOINTS_KEY = "request_profile:endpoints"
+REQUEST_COUNTS_TTL = 3 * 24 * 3600  # seconds
+# Measuring MongoDB reply sizes re-encodes every reply, so it only runs in development or when asked for
+PROFILE_DB_BYTES = os.getenv("ENVIROMENT") == "development" or os.getenv("PROFILE_DB_BYTES") == "true"
+
+
+def record_request_profile(stats, response):
+    endpoint = request.endpoint or "unknown"
+    today = datetime.now(tz=kolkata_tz).strftime("%Y-%m-%d")
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.sadd(REQUEST_PROFILE_ENDPOINTS_KEY, endpoint)
+        pipeline.hincrby(f"request_profile:{endpoint}", "requests", 1)
+        pipeline.hincrby(f"request_profile:{endpoint}", "db_commands", stats.db_commands)
+        if stats.db_bytes is not None:
+            pipeline.hincrby(f"request_profile:{endpoint}", "measured_requests", 1)
+            pipeline.hincrby(f"request_profile:{endpoint}", "db_bytes", stats.db_bytes)
+        pipeline.hincrbyfloat(f"request_profile:{endpoint}", "db_time", stats.db_time)
+        pipeline.hincrbyfloat(f"request_profile:{endpoint}", "duration", stats.duration)
+        metrics.observe(pipeline, "astar_http_request_duration_seconds", {"route": endpoint}, stats.duration)
+        metrics.increment(
+            pipeline,
+            "astar_http_requests_total",
+            {"route": endpoint, "method": request.method, "status": response.status_code},
+        )
+        for labels, count in g.get("cache_lookups", {}).items():
+            metrics.increment(pipeline, "astar_cache_requests_total", dict(labels), count)
+        pipeline.hincrby(f"request_counts:{today}", "total", 1)
+        if response.status_code >= 500:
+            pipeline.hincrby(f"request_counts:{today}", "error", 1)
+        pipeline.expire(f"request_counts:{today}", REQUEST_COUNTS_TTL)
+        pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to record the request profile of {endpoint}: {e}")
+
+    if stats.duration >= SLOW_REQUEST_THRESHOLD:
+        try:
+            create_capped_collection("slow_requests")
+            mongodb_client.slow_requests.insert_one(
+                {
+                    "endpoint": endpoint,
+                    "method": request.method,
+                    "path": request.path,
+                    "status_code": response.status_code,
+                    "duration": stats.duration,
+                    "db_commands": stats.db_commands,
+                    "db_time": stats.db_time,
+                    "db_bytes": stats.db_bytes,
+                    "created_at": datetime.now(),
+                }
+            )
+        except PyMongoError as e:
+            print(f"Failed to record the slow request to {endpoint}: {e}")
+
+
+def get_request_profiles():
+    # Per endpoint averages, most time spent in MongoDB first
+    endpoints = sorted(member.decode() for member in redis_client.smembers(REQUEST_PROFILE_ENDPOINTS_KEY))
+    pipeline = redis_client.pipeline(transaction=False)
+    for endpoint in endpoints:
+        pipeline.hgetall(f"request_profile:{endpoint}")
+    request_profiles = []
+    for endpoint, profile in zip(endpoints, pipeline.execute()):
+        profile = {field.decode(): float(value) for field, value in profile.items()}
+        requests_count = profile.get("requests", 0)
+        if not requests_count:
+            continue
+        request_profiles.append(
+            {
+                "endpoint": endpoint,
+                "requests": int(requests_count),
+                "average_duration_ms": round(profile.get("duration", 0) / requests_count * 1000, 2),
+                "average_db_commands": round(profile.get("db_commands", 0) / requests_count, 2),
+                "average_db_time_ms": round(profile.get("db_time", 0) / requests_count * 1000, 2),
+                # Only requests whose reply sizes were measured, see PROFILE_DB_BYTES
+                "average_db_bytes": (
+                    round(profile["db_bytes"] / profile["measured_requests"]) if profile.get("measured_requests") else None
+                ),
+                "total_db_time_s": round(profile.get("db_time", 0), 3),
+            }
+        )
+    return sorted(request_profiles, key=lambda profile: profile["total_db_time_s"], reverse=True)
+
+
+# Admin listings are paginated with keyset cursors and exported as streams, so memory use does not grow
+# with the collection size
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 1000
+# Responses whose content type is kept by the middleware
+STREAMING_MIMETYPES = ("text/event-stream", "application/x-ndjson", "text/csv")
+
+# Collection, sort field and exported fields of every admin listing
+ADMIN_LISTINGS = {
+    "users": {
+        "collection": "users",
+        "sort_field": "user_account.created_at",
+        "fields": {
+            "user_id": "user_account.user_id",
+            "display_name": "user_profile.display_name",
+            "primary_email": "user_account.primary_email",
+            "role": "user_account.role",
+            "student_id": "university_details.student_id",
+            "avatar_url": "user_profile.avatar_url",
+            "created_at": "user_account.created_at",
+        },
+    },
+    "submissions": {
+        "collection": "submissions",
+        "sort_field": "created_at",
+        "fields": {
+            "submission_id": "submission_id",
+            "user_id": "user_id",
+            "problem_id": "problem_id",
+            "contest_id": "contest_id",
+            "language": "language",
+            "status": "submission_status.status",
+            "time": "submission_status.time",
+            "memory": "submission_status.memory",
+            "is_similar": "is_similar",
+            "created_at": "created_at",
+        },
+    },
+}
+
+
+def encode_page_cursor(sort_value, document_id):
+    cursor = json.dumps({"v": sort_value.isoformat() if sort_value is not None else None, "id": str(document_id)})
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_page_cursor(cursor):
+    # Returns (sort value, _id) or None for a missing or malformed cursor
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        sort_value = datetime.fromisoformat(cursor["v"]) if cursor["v"] is not None else None
+        return sort_value, ObjectId(cursor["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        return None
+
+
+def flatten_listing_document(listing, document):
+    row = {}
+    for name, path in ADMIN_LISTINGS[listing]["fields"].items():
+        value = document
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        row[name] = value
+    return row
+
+
+def get_admin_listing_page(listing, cursor=None, limit=ADMIN_PAGE_SIZE):
+    # Keyset pagination on (sort field, _id) descending: each page starts right after the previous page's last document
+    # on the compound index, so deep pages cost the same as the first one
+    collection = ADMIN_LISTINGS[listing]["collection"]
+    sort_field = ADMIN_LISTINGS[listing]["sort_field"]
+    query = {}
+    if cursor is not None:
+        sort_value, document_id = cursor
+        if sort_value is None:
+            # Documents without the sort field sort last, only their _id order is left
+            query = {sort_field: None, "_id": {"$lt": document_id}}
+        else:
+            query = {
+                "$or": [
+                    {sort_field: {"$lt": sort_value}},
+                    {sort_field: sort_value, "_id": {"$lt": document_id}},
+                    {sort_field: None},
+                ]
+            }
+    projection = {path: 1 for path in ADMIN_LISTINGS[listing]["fields"].values()}
+    documents = list(
+        mongodb_client[collection].find(query, projection).sort([(sort_field, -1), ("_id", -1)]).limit(limit + 1)
+    )
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last_document = documents[-1]
+        last_sort_value = last_document
+        for part in sort_field.split("."):
+            last_sort_value = last_sort_value.get(part) if isinstance(last_sort_value, dict) else None
+        next_cursor = encode_page_cursor(last_sort_value, last_document["_id"])
+    return documents, next_cursor
+
+
+def stream_admin_listing(listing, export_format):
+    # Generator over the whole listing, the cursor fetches EXPORT_BATCH_SIZE documents per round trip
+    fields = ADMIN_LISTINGS[listing]["fields"]
+    documents = mongodb_client[ADMIN_LISTINGS[listing]["collection"]].find(
+        {}, {"_id": 0, **{path: 1 for path in fields.values()}}, batch_size=EXPORT_BATCH_SIZE
+    )
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(fields))
+    if export_format == "csv":
+        writer.writeheader()
+    try:
+        for document in documents:
+            row = flatten_listing_document(listing, document)
+            if export_format == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, default=str) + "\n")
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        documents.close()
+
+
 # Middleware
 
+@app.before_request
+def start_request_profile():
+    profiling.start_request(measure_bytes=PROFILE_DB_BYTES)
+
+
 @app.after_request
 def headers(response):
     if request.path.startswith("/static/"):
@@ -66,48 +458,81 @@ def headers(response):
     if request.path.startswith(("/", "/problems", "/contests", "/users")):
         response.headers["Cache-Control"] = "private, max-age=3600, must-revalidate"
     if request.path.startswith("/api/"):
-        response.headers["Content-Type"] = "application/json"
+        if response.mimetype not in STREAMING_MIMETYPES:
+            response.headers["Content-Type"] = "application/json"
         response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+
+    query_count = sum(repository.get_query_counts().values())
+    stats = profiling.finish_request()
+    if os.getenv("ENVIROMENT") == "development":
+        response.headers["X-Query-Count"] = str(query_count)
+        if stats is not None:
+            response.headers["Server-Timing"] = profiling.server_timing(stats)
+    if stats is not None:
+        record_request_profile(stats, response)
+    if query_count > QUERY_COUNT_WARNING:
+        print(f"{request.method} {request.path} ran {query_count} repository queries: {dict(repository.get_query_counts())}")
     return response
 
 
 # App context processors
 @app.context_processor
 def inject_global_vars():
+    current_time = datetime.now(tz=kolkata_tz)
+    announcements = get_cached_context("announcements", get_active_announcements)
+    contest_schedule = get_cached_context("contests", get_contest_schedule)
     return dict(
-        global_message=mongodb_client.announcements.find_one(
-            {"is_active": True}, {"_id": 0}, sort=[("created_at", -1)], limit=1
+        global_message=announcements["global_message"],
+        has_global_message=announcements["global_message"] is not None,
+        announcements=announcements["recent_announcements"],
+        # Contest schedule is cached as a whole, upcoming/past is decided on every render so it never goes stale
+        upcoming_contests=[
+            contest
+            for contest in contest_schedule
+            if datetime.strptime(
+                contest["contest_start_time"], "%Y-%m-%dT%H:%M"
+            ).replace(tzinfo=kolkata_tz)
+            > current_time
+        ],
+        global_leaderboard=get_cached_context("global_leaderboard", calculate_global_leaderboard),
+        past_contests=[
+            contest
+            for contest in contest_schedule
+            if datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz)
+            < current_time
+        ],
+        submissions_chart=get_cached_context("submissions_chart", generate_submissions_chart),
+        current_year=current_time.year,
+        new_users=get_cached_context("new_users", get_new_users),
+    )
+
+
+def get_active_announcements():
+    return {
+        "global_message": mongodb_client.announcements.find_one(
+            {"is_active": True}, {"_id": 0}, sort=[("created_at", -1)]
         ),
-        has_global_message=mongodb_client.announcements.count_documents(
-            {"is_active": True}
-        )
-        > 0,
-        announcements=list(
+        "recent_announcements": list(
             mongodb_client.announcements.find(
                 {"is_active": True},
                 {"_id": 0}
             ).sort("created_at", -1).limit(3)
         ),
-        upcoming_contests=list(
-            contests
-            for contests in mongodb_client.contests.find({}, {"_id": 0})
-            if datetime.strptime(
-                contests["contest_start_time"], "%Y-%m-%dT%H:%M"
-            ).replace(tzinfo=kolkata_tz)
-            > datetime.now(tz=kolkata_tz)
-        ),
-        global_leaderboard= calculate_global_leaderboard(),
-        past_contests = list(
-            contest for contest in mongodb_client.contests.find({}, {"_id": 0}) 
-            if datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz) 
-            < datetime.now(tz=kolkata_tz)
-        ),
-        submissions_chart = generate_submissions_chart(),
-        current_year = datetime.now(tz=kolkata_tz).year,
-        new_users = list(
-            mongodb_client.users.find({}, {"_id": 0, "university_details.student_id": 1, "user_profile.avatar_url": 1, "user_profile.display_name": 1, "user_profile.user_id" : 1, "user_account.user_id" : 1 }, sort=[("user_account.created_at", -1)], limit=5)
-            ),
+    }
+
+
+def get_contest_schedule():
+    return list(
+        mongodb_client.contests.find(
+            {}, {"_id": 0, "contest_id": 1, "contest_title": 1, "contest_start_time": 1, "contest_end_time": 1}
         )
+    )
+
+
+def get_new_users():
+    return list(
+        mongodb_client.users.find({}, {"_id": 0, "university_details.student_id": 1, "user_profile.avatar_url": 1, "user_profile.display_name": 1, "user_profile.user_id" : 1, "user_account.user_id" : 1 }, sort=[("user_account.created_at", -1)], limit=5)
+    )
 
 
 @app.context_processor
@@ -130,314 +555,1844 @@ def format_date():
 
     return dict(format_date=format_date)
 
-def calculate_global_leaderboard():
-    # Create a dictionary to store the aggregated scores
-    global_leaderboard = defaultdict(lambda: {"score": 0, "problems_solved": 0})
+# Participants and leaderboard entries live in the contest_participants and contest_leaderboard collections,
+# one document per (contest, user), so contest documents stay the same size however many users register
+CONTEST_STORAGE_VERSION = 2
+# Projection excluding the arrays embedded in contests that have not been migrated yet
+LEGACY_CONTEST_FIELDS = {"contest_statistics.contest_participants": 0, "contest_statistics.contest_leaderboard": 0}
+
+
+def fill_contest_solve_times(problems_by_user):
+    # Leaderboard entries from before solve times were stored only reference the accepted submission, its time is
+    # copied in place so the fastest solve and the speed bonus are still computed from it
+    untimed_problems = [
+        problem
+        for problems in problems_by_user
+        for problem in problems.values()
+        if problem.get("has_accepted_submission") and problem.get("submissions_id") and "time" not in problem
+    ]
+    if not untimed_problems:
+        return 0
+    solve_times = {
+        submission["submission_id"]: float(submission.get("submission_status", {}).get("time") or 0)
+        for submission in mongodb_client.submissions.find(
+            {"submission_id": {"$in": list({problem["submissions_id"] for problem in untimed_problems})}},
+            {"_id": 0, "submission_id": 1, "submission_status.time": 1},
+        )
+    }
+    filled = 0
+    for problem in untimed_problems:
+        if problem["submissions_id"] in solve_times:
+            problem["time"] = solve_times[problem["submissions_id"]]
+            filled += 1
+    return filled
 
-    # Iterate through all contests
-    for contest in mongodb_client.contests.find({}, {"_id": 0, "contest_end_time": 1, "contest_statistics": 1}):
-        # Convert contest end time to a datetime object
-        contest_end_time = datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz)
 
-        # Only consider contests that have ended
-        if contest_end_time < datetime.now(tz=kolkata_tz):
-            contest_leaderboard = contest["contest_statistics"]["contest_leaderboard"]
-            
-            # Iterate through each user in the contest leaderboard
-
-            if isinstance(contest_leaderboard, list):
-                contest_leaderboard = {user["user_id"]: user for user in contest_leaderboard}
-            for user_id, user_data in contest_leaderboard.items():
-                global_leaderboard[user_id]["score"] += user_data["score"]
-                global_leaderboard[user_id]["problems_solved"] += sum(
-                    1 for problem in user_data["problems"] 
-                    if user_data["problems"][problem]["has_accepted_submission"]
+def migrate_contest_storage(contest_id):
+    contest = mongodb_client.contests.find_one(
+        {"contest_id": contest_id},
+        {
+            "_id": 0,
+            "storage_version": 1,
+            "contest_statistics.contest_participants": 1,
+            "contest_statistics.contest_leaderboard": 1,
+        },
+    )
+    if contest is None or contest.get("storage_version", 1) >= CONTEST_STORAGE_VERSION:
+        return False
+
+    contest_statistics = contest.get("contest_statistics", {})
+    contest_leaderboard = contest_statistics.get("contest_leaderboard") or {}
+    # Older contests stored the leaderboard as an array
+    if isinstance(contest_leaderboard, list):
+        contest_leaderboard = {user["user_id"]: user for user in contest_leaderboard}
+
+    # $setOnInsert so documents written by a concurrent migration or verdict are never overwritten
+    participants = contest_statistics.get("contest_participants") or []
+    if participants:
+        mongodb_client.contest_participants.bulk_write(
+            [
+                UpdateOne(
+                    {"contest_id": contest_id, "user_id": user_id},
+                    {"$setOnInsert": {"registered_at": datetime.now()}},
+                    upsert=True,
+                )
+                for user_id in participants
+            ],
+            ordered=False,
+        )
+    if contest_leaderboard:
+        fill_contest_solve_times([user_data["problems"] for user_data in contest_leaderboard.values()])
+        mongodb_client.contest_leaderboard.bulk_write(
+            [
+                UpdateOne(
+                    {"contest_id": contest_id, "user_id": user_id},
+                    {
+                        "$setOnInsert": {
+                            "score": user_data["score"],
+                            "problems": user_data["problems"],
+                            "updated_at": datetime.now(),
+                        }
+                    },
+                    upsert=True,
                 )
+                for user_id, user_data in contest_leaderboard.items()
+            ],
+            ordered=False,
+        )
 
-    # Convert the global leaderboard to a sorted list by score
-    for user_id in global_leaderboard:
-        global_leaderboard[user_id]["profile"] = mongodb_client.users.find_one({"user_account.user_id": user_id}, {"_id": 0, "user_profile": 1, "user_account": 1})
-    sorted_global_leaderboard = sorted(global_leaderboard.items(), key=lambda x: x[1]["score"], reverse=True)
+    mongodb_client.contests.update_one(
+        {"contest_id": contest_id, "storage_version": {"$exists": False}},
+        {
+            "$set": {"storage_version": CONTEST_STORAGE_VERSION},
+            "$unset": {"contest_statistics.contest_participants": "", "contest_statistics.contest_leaderboard": ""},
+        },
+    )
+    return True
 
-    return sorted_global_leaderboard
 
-def generate_submissions_chart():
-    # Dictonary of last seven days with the date as the key and the number of submissions as the value
-    submissions_chart = defaultdict(int)
+def ensure_contest_storage(contest):
+    # Compatibility layer: contests created before storage version 2 are migrated on first access,
+    # callers must include storage_version in the contest projection
+    if contest.get("storage_version", 1) < CONTEST_STORAGE_VERSION:
+        migrate_contest_storage(contest["contest_id"])
+        contest["storage_version"] = CONTEST_STORAGE_VERSION
 
-    # Get the current date
-    current_date = datetime.now(tz=kolkata_tz)
 
-    for i in range(6, -1, -1):
-        # Get the date of the current iteration
-        date = current_date - timedelta(days=i)
+def is_contest_participant(contest, user_id):
+    ensure_contest_storage(contest)
+    return (
+        mongodb_client.contest_participants.find_one(
+            {"contest_id": contest["contest_id"], "user_id": user_id}, {"_id": 1}
+        )
+        is not None
+    )
 
-        # Get the submissions for the current date
-        submissions = mongodb_client.submissions.count_documents(
-            {
-                "created_at": {
-                    "$gte": date.replace(hour=0, minute=0, second=0),
-                    "$lt": date.replace(hour=23, minute=59, second=59),
-                }
+
+def get_contest_participant_ids(contest):
+    ensure_contest_storage(contest)
+    return mongodb_client.contest_participants.distinct("user_id", {"contest_id": contest["contest_id"]})
+
+
+def register_contest_participant(contest, user_id):
+    # Upsert on the unique (contest_id, user_id) index, the counter only moves when the user was inserted
+    ensure_contest_storage(contest)
+    result = mongodb_client.contest_participants.update_one(
+        {"contest_id": contest["contest_id"], "user_id": user_id},
+        {"$setOnInsert": {"registered_at": datetime.now()}},
+        upsert=True,
+    )
+    if result.upserted_id is None:
+        return False
+    mongodb_client.contests.update_one(
+        {"contest_id": contest["contest_id"]}, {"$inc": {"contest_statistics.total_participants": 1}}
+    )
+    return True
+
+
+def get_contest_leaderboard_entries(contest):
+    # Leaderboard entries keyed by user ID, ranked as on the live leaderboard (see contest_leaderboard_sort_key)
+    ensure_contest_storage(contest)
+    entries = {
+        entry.pop("user_id"): entry
+        for entry in mongodb_client.contest_leaderboard.find(
+            {"contest_id": contest["contest_id"]}, {"_id": 0, "user_id": 1, "score": 1, "problems": 1, "scored_at": 1}
+        )
+    }
+    return dict(sorted(entries.items(), key=lambda item: contest_leaderboard_sort_key(*item)))
+
+
+def global_leaderboard_update(contest_id, user_data, profile=None, overwrite=True):
+    # Pipeline update: store the contest's contribution on the user's entry and recompute totals from all contributions,
+    # so applying the same contest twice never double counts. Without overwrite an existing contribution is kept
+    contribution = {
+        "score": user_data["score"],
+        "problems_solved": sum(
+            1 for problem in user_data["problems"].values() if problem["has_accepted_submission"]
+        ),
+    }
+    contribution = {"$literal": contribution}
+    if not overwrite:
+        contribution = {"$ifNull": [f"$contests.{contest_id}", contribution]}
+    fields = {f"contests.{contest_id}": contribution, "updated_at": datetime.now()}
+    if profile is not None:
+        fields["profile"] = {"$literal": profile}
+    return [
+        {"$set": fields},
+        {
+            "$set": {
+                "score": {"$sum": {"$map": {"input": {"$objectToArray": "$contests"}, "in": "$$this.v.score"}}},
+                "problems_solved": {
+                    "$sum": {"$map": {"input": {"$objectToArray": "$contests"}, "in": "$$this.v.problems_solved"}}
+                },
             }
+        },
+    ]
+
+
+def find_global_leaderboard_profiles(user_ids):
+    # Fetch every user's profile in one query instead of one query per user
+    return {
+        user["user_account"]["user_id"]: {
+            "user_account": {"user_id": user["user_account"]["user_id"]},
+            "user_profile": user.get("user_profile", {}),
+        }
+        for user in mongodb_client.users.find(
+            {"user_account.user_id": {"$in": list(user_ids)}},
+            {"_id": 0, "user_account.user_id": 1, "user_profile.display_name": 1, "user_profile.avatar_url": 1},
         )
+    }
 
-        # Add the submissions to the chart
-        submissions_chart[date.strftime("%d-%m")] = submissions
-
-    return submissions_chart
-
-def is_code_similar(submitted_code, existing_code, threshold=0.8):
-    similarity_ratio = difflib.SequenceMatcher(None, submitted_code, existing_code).ratio()
-    return similarity_ratio >= threshold    
-
-def calculate_score(user_id, contest_id):
-    contest = mongodb_client.contests.find_one({"contest_id": contest_id})
-    leaderboard = contest["contest_statistics"]["contest_leaderboard"]
-    user_score = 0
-    for problem in contest["contest_problems"].values():
-        if leaderboard[user_id]["problems"][problem]["has_accepted_submission"]:
-            user_score += (
-                20
-                if problem == contest["contest_problems"]["contest_first_problem"]
-                else 30
-                if problem == contest["contest_problems"]["contest_second_problem"]
-                else 50
-            )
-            user_score -= (
-                min(
-                    leaderboard[user_id]["problems"][problem][
-                        "number_of_incorrect_submissions"
-                    ],
-                    5,
-                )
-                * 2
-            )
-            user_score += int(
-                100
-                / (
-                    float(
-                        mongodb_client.submissions.find_one(
-                            {
-                                "submission_id": leaderboard[user_id]["problems"][
-                                    problem
-                                ]["submissions_id"]
-                            }
-                        )["submission_status"]["time"]
-                    )
-                    * 1000
-                )
-            )
-    return user_score
-
-def is_user_allowed_to_submit_as_competition_submission(problem_id, user_id):
-    if mongodb_client.problems.find_one({"problem_id": problem_id})[
-        "is_part_of_competition"
-    ]:
-        contest_id = mongodb_client.problems.find_one({"problem_id": problem_id})[
-            "competition_id"
-        ]
-        contest = mongodb_client.contests.find_one({"contest_id": contest_id})
 
-        if contest is None:
-            return False
+def apply_contest_to_global_leaderboard(contest):
+    contest_leaderboard = get_contest_leaderboard_entries(contest)
+    if not contest_leaderboard:
+        return
+
+    profiles = find_global_leaderboard_profiles(contest_leaderboard)
+    # A verdict judged while the contest is being folded syncs its user itself (see sync_global_leaderboard_user),
+    # the possibly older entry read here must not replace it
+    mongodb_client.global_leaderboard.bulk_write(
+        [
+            UpdateOne(
+                {"user_id": user_id},
+                global_leaderboard_update(contest["contest_id"], user_data, profiles.get(user_id), overwrite=False),
+                upsert=True,
+            )
+            for user_id, user_data in contest_leaderboard.items()
+        ],
+        ordered=False,
+    )
 
-        if datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(
-            tzinfo=kolkata_tz
-        ) < datetime.now(tz=kolkata_tz):
-            return False
-        if datetime.strptime(contest["contest_start_time"], "%Y-%m-%dT%H:%M").replace(
-            tzinfo=kolkata_tz
-        ) > datetime.now(tz=kolkata_tz):
-            return False
-        if user_id not in contest["contest_statistics"]["contest_participants"]:
-            return False
-        return True
-
-def add_competition_submission(submission_id):
-    submission = mongodb_client.submissions.find_one({"submission_id": submission_id})
-    problem = mongodb_client.problems.find_one({"problem_id": submission["problem_id"]})
-    contest_id = problem["competition_id"]
-    contest = mongodb_client.contests.find_one({"contest_id": contest_id})
-    user_id = submission["user_id"]
 
-    if is_user_allowed_to_submit_as_competition_submission(submission["problem_id"], user_id):
-        # Ensure that contest_leaderboard is an object (not an array)
-        leaderboard = contest["contest_statistics"].get("contest_leaderboard", {})
-        
-        if isinstance(leaderboard, list):
-            # If it's an array, replace it with an empty document
+def fold_ended_contests_into_global_leaderboard():
+    # Contest times are stored as "%Y-%m-%dT%H:%M" strings in Asia/Kolkata time, which compare correctly as strings
+    current_time = datetime.now(tz=kolkata_tz).strftime("%Y-%m-%dT%H:%M")
+    while True:
+        # The contest is claimed before its leaderboard is read: verdicts stored from then on see the flag and sync
+        # themselves, and concurrent callers never fold the same contest
+        contest = mongodb_client.contests.find_one_and_update(
+            {"contest_end_time": {"$lte": current_time}, "global_leaderboard_synced": {"$ne": True}},
+            {"$set": {"global_leaderboard_synced": True}},
+            projection={"_id": 0, "contest_id": 1, "storage_version": 1},
+        )
+        if contest is None:
+            return
+        try:
+            apply_contest_to_global_leaderboard(contest)
+        except Exception:
             mongodb_client.contests.update_one(
-                {"contest_id": contest_id},
-                {"$set": {"contest_statistics.contest_leaderboard": {}}}
+                {"contest_id": contest["contest_id"]}, {"$unset": {"global_leaderboard_synced": ""}}
             )
-            leaderboard = {}
-
-        # Check if the user is already in the leaderboard
-        if user_id not in leaderboard:
-            # Initialize the user's entry in the leaderboard
-            new_entry = {
-                "score": 0,
-                "problems": {
-                    contest["contest_problems"]["contest_first_problem"]: {
-                        "submissions_id": None,
-                        "has_accepted_submission": False,
-                        "number_of_incorrect_submissions": 0,
-                    },
-                    contest["contest_problems"]["contest_second_problem"]: {
-                        "submissions_id": None,
-                        "has_accepted_submission": False,
-                        "number_of_incorrect_submissions": 0,
+            raise
+
+
+def calculate_global_leaderboard():
+    fold_ended_contests_into_global_leaderboard()
+
+    # Kept as (user_id, entry) pairs, the shape the templates expect. Every ranked user is listed
+    return [
+        (entry["user_id"], entry)
+        for entry in mongodb_client.global_leaderboard.find(
+            {}, {"_id": 0, "user_id": 1, "score": 1, "problems_solved": 1, "profile": 1}
+        ).sort("score", -1)
+    ]
+
+def get_submission_day(created_at):
+    # Naive datetimes are server local time, days are counted in Asia/Kolkata
+    return created_at.astimezone(kolkata_tz).strftime("%Y-%m-%d")
+
+
+def record_daily_submission(created_at):
+    mongodb_client.submission_daily_counts.update_one(
+        {"date": get_submission_day(created_at)}, {"$inc": {"count": 1}}, upsert=True
+    )
+
+
+# Per user counters, updated when submissions are created and finalized instead of counted on every profile view.
+# Counters are only incremented on existing documents. Sign up creates the document, for users from before the
+# counters the first profile view (or backfill-user-stats) does
+SUBMISSION_HISTORY_PAGE_SIZE = 20
+
+
+def aggregate_user_stats(match):
+    return mongodb_client.submissions.aggregate(
+        [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": "$user_id",
+                    "total_submissions": {"$sum": 1},
+                    "total_accepted_submissions": {
+                        "$sum": {"$cond": [{"$eq": ["$submission_status.status_code", 3]}, 1, 0]}
                     },
-                    contest["contest_problems"]["contest_third_problem"]: {
-                        "submissions_id": None,
-                        "has_accepted_submission": False,
-                        "number_of_incorrect_submissions": 0,
+                    "solved_problem_ids": {
+                        "$addToSet": {
+                            "$cond": [{"$eq": ["$submission_status.status_code", 3]}, "$problem_id", "$$REMOVE"]
+                        }
                     },
+                }
+            },
+        ]
+    )
+
+
+def get_user_stats(user_id):
+    user_stats = mongodb_client.user_stats.find_one(
+        {"user_id": user_id}, {"_id": 0, "total_submissions": 1, "total_accepted_submissions": 1, "solved_problem_ids": 1}
+    )
+    if user_stats is not None:
+        return user_stats
+
+    user_stats = next(
+        aggregate_user_stats({"user_id": user_id}),
+        {"total_submissions": 0, "total_accepted_submissions": 0, "solved_problem_ids": []},
+    )
+    user_stats.pop("_id", None)
+    mongodb_client.user_stats.update_one(
+        {"user_id": user_id}, {"$setOnInsert": {**user_stats, "updated_at": datetime.now()}}, upsert=True
+    )
+    return user_stats
+
+
+def create_user_stats(user_id):
+    # Created with the user, so no submission is made before the counters exist
+    mongodb_client.user_stats.update_one(
+        {"user_id": user_id},
+        {
+            "$setOnInsert": {
+                "total_submissions": 0,
+                "total_accepted_submissions": 0,
+                "solved_problem_ids": [],
+                "updated_at": datetime.now(),
+            }
+        },
+        upsert=True,
+    )
+
+
+def record_user_submission(user_id):
+    mongodb_client.user_stats.update_one(
+        {"user_id": user_id}, {"$inc": {"total_submissions": 1}, "$set": {"updated_at": datetime.now()}}
+    )
+
+
+def record_user_verdict(user_id, problem_id, is_accepted):
+    if not is_accepted:
+        return
+    mongodb_client.user_stats.update_one(
+        {"user_id": user_id},
+        {
+            "$inc": {"total_accepted_submissions": 1},
+            "$addToSet": {"solved_problem_ids": problem_id},
+            "$set": {"updated_at": datetime.now()},
+        },
+    )
+
+
+def get_contest_end_times():
+    # Served from the cached contest schedule of the template context, no query per submission
+    return {contest["contest_id"]: contest["contest_end_time"] for contest in get_cached_context("contests", get_contest_schedule)}
+
+
+def get_submission_history_page(user_id, cursor=None, limit=SUBMISSION_HISTORY_PAGE_SIZE):
+    # Newest first, keyset paginated on the (user_id, created_at, _id) index
+    query = {"user_id": user_id}
+    if cursor is not None:
+        created_at, submission_id = cursor
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": submission_id}},
+        ]
+    submissions = list(
+        mongodb_client.submissions.find(
+            query,
+            {"submission_id": 1, "problem_id": 1, "language": 1, "submission_status.status": 1, "created_at": 1},
+        ).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1)
+    )
+    next_cursor = None
+    if len(submissions) > limit:
+        submissions = submissions[:limit]
+        next_cursor = encode_page_cursor(submissions[-1]["created_at"], submissions[-1]["_id"])
+
+    # Problem titles in one $in query, titles of contest problems stay hidden until the contest has ended
+    problems = repository.find_problems(
+        [submission["problem_id"] for submission in submissions],
+        ["problem_title", "is_part_of_competition", "competition_id"],
+    )
+    contest_end_times = get_contest_end_times()
+    current_time = datetime.now(tz=kolkata_tz).strftime("%Y-%m-%dT%H:%M")
+    for submission in submissions:
+        submission.pop("_id")
+        problem = problems.get(submission["problem_id"])
+        if problem is not None:
+            submission["problem_title"] = problem["problem_title"]
+            if problem["is_part_of_competition"]:
+                contest_end_time = contest_end_times.get(problem["competition_id"])
+                if contest_end_time is not None and contest_end_time > current_time:
+                    submission["problem_title"] = "Hidden Due to Access Restriction"
+            else:
+                submission["problem_title"] = "Hidden Due to Access Restriction"
+        else:
+            submission["problem_title"] = "Problem Not Found"
+    return submissions, next_cursor
+
+
+def aggregate_submission_daily_counts(since=None):
+    # Single $group-by-day pass over submissions, used to backfill the daily rollup
+    pipeline = []
+    if since is not None:
+        pipeline.append({"$match": {"created_at": {"$gte": since}}})
+    pipeline.append(
+        {
+            "$group": {
+                "_id": {
+                    "$dateToString": {"format": "%Y-%m-%d", "date": "$created_at", "timezone": "Asia/Kolkata"}
                 },
+                "count": {"$sum": 1},
             }
-            # Add new entry to the leaderboard document
-            mongodb_client.contests.update_one(
-                {"contest_id": contest_id},
+        }
+    )
+    return {day["_id"]: day["count"] for day in mongodb_client.submissions.aggregate(pipeline)}
+
+
+def generate_submissions_chart():
+    # Last seven days (oldest first) with the date as the key and the number of submissions as the value
+    current_date = datetime.now(tz=kolkata_tz).date()
+    days = [current_date - timedelta(days=i) for i in range(6, -1, -1)]
+
+    daily_counts = {
+        day["date"]: day["count"]
+        for day in mongodb_client.submission_daily_counts.find(
+            {"date": {"$in": [day.isoformat() for day in days]}}, {"_id": 0, "date": 1, "count": 1}
+        )
+    }
+
+    return {day.strftime("%d-%m"): daily_counts.get(day.isoformat(), 0) for day in days}
+
+# Upper bound on LSH candidates verified per submission
+SIMILARITY_MAX_CANDIDATES = 200
+
+
+def save_submission_fingerprint(submission, fingerprint):
+    mongodb_client.submission_fingerprints.update_one(
+        {"submission_id": submission["submission_id"]},
+        {
+            "$set": {
+                "problem_id": submission["problem_id"],
+                "user_id": submission["user_id"],
+                **fingerprint,
+                "created_at": datetime.now(),
+            }
+        },
+        upsert=True,
+    )
+
+
+def index_submission_similarity(submission):
+    # Fingerprint the submission, flag it when another user's submission for the problem is a near duplicate
+    # and add it to the problem's LSH bucket index
+    fingerprint = similarity.fingerprint_source(submission["code"], submission.get("language", "python"))
+
+    is_similar = False
+    for candidate in mongodb_client.submission_fingerprints.find(
+        {
+            "problem_id": submission["problem_id"],
+            "lsh_bands": {"$in": fingerprint["lsh_bands"]},
+            "user_id": {"$ne": submission["user_id"]},
+        },
+        {"_id": 0, "minhash": 1},
+    ).limit(SIMILARITY_MAX_CANDIDATES):
+        if similarity.estimate_similarity(fingerprint["minhash"], candidate["minhash"]) >= similarity.SIMILARITY_THRESHOLD:
+            is_similar = True
+            break
+
+    save_submission_fingerprint(submission, fingerprint)
+    if is_similar:
+        mongodb_client.submissions.update_one(
+            {"submission_id": submission["submission_id"]}, {"$set": {"is_similar": True}}
+        )
+    return is_similar
+
+# Live contest leaderboards are kept in Redis: a sorted set ranks users, a hash holds each user's entry
+LIVE_LEADERBOARD_TTL = 3600 * 24 * 7  # 7 days
+LEADERBOARD_PAGE_SIZE = 50
+LEADERBOARD_PROFILES_KEY = "leaderboard:profiles"
+
+
+def live_leaderboard_rank_score(user_data):
+    # The sorted set is read in ascending order with the same ranking as contest_leaderboard_sort_key: the score
+    # (highest first) and problems solved (at most 3, so one decimal digit is enough) are negated above 2^32, the
+    # second the score was reached (earliest first) fills the low bits. Members with equal scores are ordered by
+    # user ID, as Redis does. Scores stay below 2^53, so every value is exact
+    entry = live_leaderboard_entry(user_data)
+    return -(entry["score"] * 10 + entry["problems_solved"]) * 2**32 + int(
+        scored_at_timestamp(user_data.get("scored_at"))
+    )
+
+
+def scored_at_timestamp(scored_at):
+    # Entries stored before scored_at rank as if reached first, as in contest_leaderboard_sort_key
+    return scored_at.replace(tzinfo=timezone.utc).timestamp() if scored_at else 0
+
+
+def contest_leaderboard_sort_key(user_id, user_data):
+    entry = live_leaderboard_entry(user_data)
+    return -entry["score"], -entry["problems_solved"], scored_at_timestamp(user_data.get("scored_at")), user_id
+
+
+def live_leaderboard_entry(user_data):
+    return {
+        "score": user_data["score"],
+        "problems_solved": sum(
+            1 for problem in user_data["problems"].values() if problem["has_accepted_submission"]
+        ),
+    }
+
+
+def update_live_leaderboard(contest_id, user_id, user_data):
+    entry = live_leaderboard_entry(user_data)
+    pipeline = redis_client.pipeline()
+    pipeline.zrank(f"contest:{contest_id}:ranking", user_id)
+    pipeline.zadd(f"contest:{contest_id}:ranking", {user_id: live_leaderboard_rank_score(user_data)})
+    pipeline.zrank(f"contest:{contest_id}:ranking", user_id)
+    pipeline.hset(f"contest:{contest_id}:entries", user_id, json.dumps(entry))
+    pipeline.expire(f"contest:{contest_id}:ranking", LIVE_LEADERBOARD_TTL)
+    pipeline.expire(f"contest:{contest_id}:entries", LIVE_LEADERBOARD_TTL)
+    pipeline.zcard(f"contest:{contest_id}:ranking")
+    previous_rank, _, rank, *_, total = pipeline.execute()
+
+    # Open pages patch their table from the event. Every rank between the previous and the new one shifts by one, so
+    # a page whose first or last row moves in from a neighbouring page gets that entry with the event
+    moved_from = previous_rank if previous_rank is not None else total - 1
+    boundary_ranks = [
+        index
+        for index in range(min(rank, moved_from), max(rank, moved_from) + 1)
+        if index % LEADERBOARD_PAGE_SIZE in (0, LEADERBOARD_PAGE_SIZE - 1)
+    ]
+    pipeline = redis_client.pipeline()
+    for index in boundary_ranks:
+        pipeline.zrange(f"contest:{contest_id}:ranking", index, index)
+    boundary_user_ids = {
+        index: user_ids[0].decode() for index, user_ids in zip(boundary_ranks, pipeline.execute()) if user_ids
+    }
+    boundary_entries = (
+        redis_client.hmget(f"contest:{contest_id}:entries", list(boundary_user_ids.values())) if boundary_user_ids else []
+    )
+    profiles = get_leaderboard_profiles([user_id, *boundary_user_ids.values()])
+
+    publish_event(
+        f"contest:{contest_id}",
+        "leaderboard",
+        {
+            "user_id": user_id,
+            **entry,
+            "profile": profiles.get(user_id),
+            "rank": rank + 1,
+            "previous_rank": previous_rank + 1 if previous_rank is not None else None,
+            "total": total,
+            "page_size": LEADERBOARD_PAGE_SIZE,
+            "boundary_entries": [
                 {
-                    "$set": {
-                        f"contest_statistics.contest_leaderboard.{user_id}": new_entry
-                    }
-                },
-            )
+                    "rank": index + 1,
+                    "user_id": boundary_user_id,
+                    **(json.loads(boundary_entry) if boundary_entry is not None else {"score": 0, "problems_solved": 0}),
+                    "profile": profiles.get(boundary_user_id),
+                }
+                for (index, boundary_user_id), boundary_entry in zip(boundary_user_ids.items(), boundary_entries)
+            ],
+        },
+    )
 
-        # If submission is accepted, update the leaderboard
-        if submission["submission_status"]["status_code"] == 3:
-            leaderboard = mongodb_client.contests.find_one({"contest_id": contest_id})[
-                "contest_statistics"
-            ]["contest_leaderboard"]
 
-            if not leaderboard[user_id]["problems"][problem["problem_id"]][
-                "has_accepted_submission"
-            ]:
-                # Update the accepted submission details
-                mongodb_client.contests.update_one(
-                    {"contest_id": contest_id},
-                    {
-                        "$set": {
-                            f"contest_statistics.contest_leaderboard.{user_id}.problems.{problem['problem_id']}": {
-                                "submissions_id": submission_id,
-                                "has_accepted_submission": True,
-                                "number_of_incorrect_submissions": leaderboard[user_id][
-                                    "problems"
-                                ][problem["problem_id"]][
-                                    "number_of_incorrect_submissions"
-                                ],
-                            }
-                        }
-                    },
-                )
-            else:
-                # If user has already submitted an accepted solution, update only if the new one has a better score (faster time)
-                previous_submission = mongodb_client.submissions.find_one(
-                    {
-                        "submission_id": leaderboard[user_id]["problems"][
-                            problem["problem_id"]
-                        ]["submissions_id"]
-                    }
-                )
-                if previous_submission["submission_status"]["time"] > submission["submission_status"]["time"]:
-                    mongodb_client.contests.update_one(
-                        {"contest_id": contest_id},
+def ensure_live_leaderboard(contest_id):
+    # Seed the Redis leaderboard from MongoDB once, entries written by verdicts in the meantime are kept (NX)
+    if redis_client.exists(f"contest:{contest_id}:ranking:ready"):
+        return
+    contest = mongodb_client.contests.find_one({"contest_id": contest_id}, {"_id": 0, "contest_id": 1, "storage_version": 1})
+    if contest is None:
+        return
+
+    pipeline = redis_client.pipeline()
+    for user_id, user_data in get_contest_leaderboard_entries(contest).items():
+        pipeline.zadd(f"contest:{contest_id}:ranking", {user_id: live_leaderboard_rank_score(user_data)}, nx=True)
+        pipeline.hsetnx(f"contest:{contest_id}:entries", user_id, json.dumps(live_leaderboard_entry(user_data)))
+    pipeline.expire(f"contest:{contest_id}:ranking", LIVE_LEADERBOARD_TTL)
+    pipeline.expire(f"contest:{contest_id}:entries", LIVE_LEADERBOARD_TTL)
+    pipeline.set(f"contest:{contest_id}:ranking:ready", 1, ex=LIVE_LEADERBOARD_TTL)
+    pipeline.execute()
+
+
+def get_leaderboard_profiles(user_ids):
+    # Profiles are cached in a Redis hash, missing ones are fetched in a single query
+    if not user_ids:
+        return {}
+    profiles = {
+        user_id: json.loads(profile)
+        for user_id, profile in zip(user_ids, redis_client.hmget(LEADERBOARD_PROFILES_KEY, user_ids))
+        if profile is not None
+    }
+    missing_user_ids = [user_id for user_id in user_ids if user_id not in profiles]
+    count_cache_lookup("leaderboard_profiles", True, len(user_ids) - len(missing_user_ids))
+    count_cache_lookup("leaderboard_profiles", False, len(missing_user_ids))
+    if missing_user_ids:
+        for user in mongodb_client.users.find(
+            {"user_account.user_id": {"$in": missing_user_ids}},
+            {"_id": 0, "user_account.user_id": 1, "user_profile.display_name": 1, "user_profile.avatar_url": 1},
+        ):
+            profiles[user["user_account"]["user_id"]] = {"user_profile": user.get("user_profile", {})}
+        fetched_profiles = {
+            user_id: json.dumps(profiles[user_id]) for user_id in missing_user_ids if user_id in profiles
+        }
+        if fetched_profiles:
+            redis_client.hset(LEADERBOARD_PROFILES_KEY, mapping=fetched_profiles)
+    return profiles
+
+
+def get_live_leaderboard_page(contest_id, page=1, page_size=LEADERBOARD_PAGE_SIZE):
+    ensure_live_leaderboard(contest_id)
+    start = (page - 1) * page_size
+
+    pipeline = redis_client.pipeline()
+    pipeline.zrange(f"contest:{contest_id}:ranking", start, start + page_size - 1)
+    pipeline.zcard(f"contest:{contest_id}:ranking")
+    user_ids, total = pipeline.execute()
+    user_ids = [user_id.decode() for user_id in user_ids]
+
+    entries = redis_client.hmget(f"contest:{contest_id}:entries", user_ids) if user_ids else []
+    profiles = get_leaderboard_profiles(user_ids)
+    contest_leaderboard = {}
+    for user_id, entry in zip(user_ids, entries):
+        contest_leaderboard[user_id] = json.loads(entry) if entry is not None else {"score": 0, "problems_solved": 0}
+        contest_leaderboard[user_id]["profile"] = profiles.get(user_id)
+    return contest_leaderboard, total
+
+
+def get_live_leaderboard_rank(contest_id, user_id):
+    ensure_live_leaderboard(contest_id)
+    pipeline = redis_client.pipeline()
+    pipeline.zrank(f"contest:{contest_id}:ranking", user_id)
+    pipeline.hget(f"contest:{contest_id}:entries", user_id)
+    pipeline.zcard(f"contest:{contest_id}:ranking")
+    rank, entry, total = pipeline.execute()
+    if rank is None:
+        return None
+    return {"rank": rank + 1, "total": total, **(json.loads(entry) if entry is not None else {})}
+
+
+def contest_leaderboard_update(contest_problems, problem_id, submission_id, is_accepted, execution_time, submitted_at=None):
+    # Pipeline update applying one verdict to the user's contest_leaderboard document (created by the upsert)
+    # and recomputing the score server side: 20/30/50 points for the first/second/third problem, minus 2 per
+    # incorrect submission (at most 5), plus 100 / execution time in milliseconds for the fastest accepted submission.
+    # scored_at, the second the submission that last changed the score was made, breaks ties between equal scores
+    empty_problem = {"submissions_id": None, "has_accepted_submission": False, "number_of_incorrect_submissions": 0}
+    new_problems = {"$literal": {contest_problem_id: empty_problem for contest_problem_id in contest_problems.values()}}
+
+    accepted_problem = {
+        "submissions_id": submission_id,
+        "has_accepted_submission": True,
+        "number_of_incorrect_submissions": "$$problem.number_of_incorrect_submissions",
+        "time": execution_time,
+    }
+    if is_accepted:
+        # Keep the fastest accepted submission. A solve without a time (stored before times were, and not filled in
+        # by fill_contest_solve_times) cannot be compared and is kept
+        updated_problem = {
+            "$cond": [
+                {
+                    "$or": [
+                        {"$not": ["$$problem.has_accepted_submission"]},
+                        {"$gt": [{"$ifNull": ["$$problem.time", -1]}, execution_time]},
+                    ]
+                },
+                accepted_problem,
+                "$$problem",
+            ]
+        }
+    else:
+        # Incorrect submissions only count until the problem is solved
+        updated_problem = {
+            "$cond": [
+                "$$problem.has_accepted_submission",
+                "$$problem",
+                {
+                    "$mergeObjects": [
+                        "$$problem",
                         {
-                            "$set": {
-                                f"contest_statistics.contest_leaderboard.{user_id}.problems.{problem['problem_id']}": {
-                                    "submissions_id": submission_id,
-                                    "has_accepted_submission": True,
-                                    "number_of_incorrect_submissions": leaderboard[
-                                        user_id
-                                    ]["problems"][problem["problem_id"]][
-                                        "number_of_incorrect_submissions"
-                                    ],
-                                }
-                            }
+                            "submissions_id": None,
+                            "number_of_incorrect_submissions": {"$add": ["$$problem.number_of_incorrect_submissions", 1]},
                         },
-                    )
-
-            # Recalculate the user's score and update the leaderboard
-            user_score = calculate_score(user_id, contest_id)
-            mongodb_client.contests.update_one(
-                {"contest_id": contest_id},
-                {
-                    "$set": {
-                        f"contest_statistics.contest_leaderboard.{user_id}.score": user_score
-                    }
+                    ]
                 },
-            )
+            ]
+        }
 
-            return True
+    updated_problems = {
+        "$let": {
+            "vars": {"problems": {"$ifNull": ["$problems", new_problems]}},
+            "in": {
+                "$let": {
+                    "vars": {"problem": {"$ifNull": [{"$getField": {"field": problem_id, "input": "$$problems"}}, empty_problem]}},
+                    "in": {"$setField": {"field": problem_id, "input": "$$problems", "value": updated_problem}},
+                }
+            },
+        }
+    }
 
-        else:
-            # If submission is rejected, update the number of incorrect submissions
-            if not leaderboard[user_id]["problems"][problem["problem_id"]][
-                "has_accepted_submission"
-            ]:
-                mongodb_client.contests.update_one(
-                    {"contest_id": contest_id},
+    execution_time_ms = {"$multiply": [{"$ifNull": ["$$this.v.time", 0]}, 1000]}
+    score = {
+        "$reduce": {
+            "input": {"$objectToArray": "$problems"},
+            "initialValue": 0,
+            "in": {
+                "$add": [
+                    "$$value",
                     {
-                        "$set": {
-                            f"contest_statistics.contest_leaderboard.{user_id}.problems.{problem['problem_id']}": {
-                                "submissions_id": None,
-                                "has_accepted_submission": False,
-                                "number_of_incorrect_submissions": leaderboard[
-                                    user_id
-                                ]["problems"][problem["problem_id"]][
-                                    "number_of_incorrect_submissions"
+                        "$cond": [
+                            "$$this.v.has_accepted_submission",
+                            {
+                                "$add": [
+                                    {
+                                        "$switch": {
+                                            "branches": [
+                                                {"case": {"$eq": ["$$this.k", {"$literal": contest_problems["contest_first_problem"]}]}, "then": 20},
+                                                {"case": {"$eq": ["$$this.k", {"$literal": contest_problems["contest_second_problem"]}]}, "then": 30},
+                                            ],
+                                            "default": 50,
+                                        }
+                                    },
+                                    {"$multiply": [{"$min": ["$$this.v.number_of_incorrect_submissions", 5]}, -2]},
+                                    {
+                                        "$cond": [
+                                            {"$gt": [execution_time_ms, 0]},
+                                            {"$trunc": [{"$divide": [100, execution_time_ms]}]},
+                                            0,
+                                        ]
+                                    },
                                 ]
-                                + 1,
-                            }
-                        }
+                            },
+                            0,
+                        ]
                     },
+                ]
+            },
+        }
+    }
+
+    scored_at = (submitted_at or datetime.now()).replace(microsecond=0)
+    return [
+        {"$set": {"problems": updated_problems, "updated_at": "$$NOW", "previous_score": "$score"}},
+        {"$set": {"score": score}},
+        {"$set": {"scored_at": {"$cond": [{"$eq": ["$score", "$previous_score"]}, "$scored_at", {"$literal": scored_at}]}}},
+        {"$unset": "previous_score"},
+    ]
+
+
+def add_competition_submission(submission):
+    # The verdict is applied to the user's own leaderboard document with one atomic pipeline update,
+    # after checking the contest is running and the user is registered
+    contest_id = submission.get("contest_id")
+    if "contest_id" not in submission:
+        # Submissions created before contest_id was stored on the submission
+        problem = mongodb_client.problems.find_one(
+            {"problem_id": submission["problem_id"]}, {"_id": 0, "is_part_of_competition": 1, "competition_id": 1}
+        )
+        contest_id = problem["competition_id"] if problem and problem.get("is_part_of_competition") else None
+    if contest_id is None:
+        return False
+
+    contest = repository.find_contest(
+        contest_id,
+        ["contest_id", "contest_start_time", "contest_end_time", "contest_problems", "storage_version"],
+    )
+    # Contest times are stored as "%Y-%m-%dT%H:%M" strings in Asia/Kolkata time, which compare correctly as strings.
+    # The window is checked at submission time, the verdict of a submission made just before the end may come later
+    submitted_at = (submission.get("created_at") or datetime.now()).astimezone(kolkata_tz).strftime("%Y-%m-%dT%H:%M")
+    if contest is None or not contest["contest_start_time"] <= submitted_at < contest["contest_end_time"]:
+        return False
+
+    user_id = submission["user_id"]
+    if not is_contest_participant(contest, user_id):
+        return False
+
+    is_accepted = submission["submission_status"]["status_code"] == 3
+    user_data = mongodb_client.contest_leaderboard.find_one_and_update(
+        {"contest_id": contest_id, "user_id": user_id},
+        contest_leaderboard_update(
+            contest["contest_problems"],
+            submission["problem_id"],
+            submission["submission_id"],
+            is_accepted,
+            float(submission["submission_status"]["time"] or 0) if is_accepted else None,
+            submission.get("created_at"),
+        ),
+        projection={"_id": 0, "score": 1, "problems": 1, "scored_at": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    update_live_leaderboard(contest_id, user_id, user_data)
+    sync_global_leaderboard_user(contest_id, user_id, user_data)
+    return True
+
+def sync_global_leaderboard_user(contest_id, user_id, user_data):
+    # Contests are folded into the global leaderboard once they end. Submissions made before the end may be judged
+    # after the fold (queued, or retried after a Judge0 failure), their verdicts are applied here. The flag is read
+    # after the leaderboard write, so a fold that claimed the contest before it either read the new entry or is
+    # overwritten by this one
+    contest = mongodb_client.contests.find_one({"contest_id": contest_id}, {"_id": 0, "global_leaderboard_synced": 1})
+    if not contest or not contest.get("global_leaderboard_synced"):
+        return
+    mongodb_client.global_leaderboard.update_one(
+        {"user_id": user_id},
+        global_leaderboard_update(contest_id, user_data, find_global_leaderboard_profiles([user_id]).get(user_id)),
+        upsert=True,
+    )
+    invalidate_context_cache("global_leaderboard")
+
+def calculate_error_rate():
+    # Share of today's requests that ended with a server error, counted by record_request_profile
+    total_api_calls_today, total_error_calls_today = (
+        int(count or 0)
+        for count in redis_client.hmget(
+            f"request_counts:{datetime.now(tz=kolkata_tz).strftime('%Y-%m-%d')}", "total", "error"
+        )
+    )
+
+    if total_api_calls_today == 0:
+        return "0%"
+    
+    return str(round((total_error_calls_today / total_api_calls_today) * 100, 2)) + "%"
+
+def compare_output(submission_output, problem_id):
+    # Only used for single Judge0 submissions dispatched before test sets, which were judged against one case
+    test_cases, _, _ = get_problem_test_cases(problem_id)
+    if not test_cases or submission_output is None:
+        return "0/1"
+    try:
+        result = get_problem_checker(problem_id).check(
+            submission_output.encode(), test_cases[0]["expected_output"].encode(), test_cases[0]["stdin"].encode()
+        )
+    except checkers.CheckerError as e:
+        print(f"Checker failed for problem {problem_id}: {e}")
+        return "0/1"
+    return "1/1" if result.accepted else "0/1"
+
+# Judging pipeline
+JUDGE_QUEUE_KEY = "judge:queue"
+JUDGE_PROCESSING_KEY = "judge:processing"
+# Public base URL of this app, Judge0 reports results to it instead of being polled
+JUDGE0_CALLBACK_URL = os.getenv("JUDGE0_CALLBACK_URL")
+# "judge0" (default) sends submissions to the hosted Judge0 API, "local" runs them in a sandbox on the worker
+JUDGE_EXECUTOR = os.getenv("JUDGE_EXECUTOR", "judge0")
+LOCAL_EXECUTOR = executors.get_executor(JUDGE_EXECUTOR)
+# Custom checkers always run on the worker, with the Judge0 executor a local one is created when first needed
+CHECKER_EXECUTOR = LOCAL_EXECUTOR
+# Judge0 RapidAPI keys by key id, scheduled by remaining quota in judge0_keys
+JUDGE0_KEYS = judge0_keys.load_keys(os.getenv("API_KEY", ""))
+# Submissions the execution server failed to accept wait here (score: when to retry) before going back to the queue
+JUDGE_DELAYED_KEY = "judge:delayed"
+JUDGE_DISPATCH_MAX_ATTEMPTS = 5
+JUDGE_RETRY_BASE_DELAY = 5  # seconds, doubled after every failed attempt
+# Maximum number of characters of stdout/stderr stored with a submission
+SUBMISSION_OUTPUT_LIMIT = 4096
+# Judge0 accepts at most this many submissions per batch request
+JUDGE0_BATCH_SIZE = 20
+# Seconds a worker polls a batch without callbacks, unfinished submissions are left to reconcile-submissions
+JUDGE0_BATCH_TIMEOUT = 60
+JUDGE0_RESULT_FIELDS = "token,stdout,stderr,compile_output,status,time,memory"
+MAX_TEST_CASES = 100
+# Verdicts of judged sources, so a resubmission of the same code to the same test set skips execution.
+# Entries expire after the TTL, and past the size limit the least recently used ones are evicted (tracked in a
+# sorted set by last use). Only verdicts that do not depend on timing or on the execution server are cached
+VERDICT_CACHE_PREFIX = "verdicts:"
+VERDICT_CACHE_LRU_KEY = "verdicts:lru"
+VERDICT_CACHE_TTL = 24 * 3600  # seconds
+VERDICT_CACHE_SIZE = 50000  # entries
+VERDICT_CACHEABLE_STATUSES = (3, 4, 6)  # Accepted, Wrong Answer, Compilation Error
+
+
+def enqueue_submission(submission_id):
+    redis_client.lpush(JUDGE_QUEUE_KEY, submission_id)
+
+
+def requeue_submission(submission_id, delay=0, failed_attempt=False):
+    # Hand a claimed submission that never reached Judge0 back to the queue, delayed ones wait in a sorted set
+    # until judge workers promote them
+    update = {"$set": {"judging_state": "queued"}}
+    if failed_attempt:
+        update["$inc"] = {"dispatch_attempts": 1}
+    result = mongodb_client.submissions.update_one(
+        {"submission_id": submission_id, "judging_state": "running", "judge0_submission_id": None}, update
+    )
+    if result.modified_count:
+        if delay > 0:
+            redis_client.zadd(JUDGE_DELAYED_KEY, {submission_id: time.time() + delay})
+        else:
+            enqueue_submission(submission_id)
+    return result.modified_count
+
+
+def retry_dispatch(submission, error):
+    # The execution server is unreachable, timed out, answered with a 5xx or its circuit is open: the submission
+    # is retried with exponential backoff and jitter, and only fails after JUDGE_DISPATCH_MAX_ATTEMPTS
+    attempt = submission.get("dispatch_attempts", 0) + 1
+    if attempt >= JUDGE_DISPATCH_MAX_ATTEMPTS:
+        print(f"Giving up on submission {submission['submission_id']} after {attempt} attempts: {error}")
+        fail_submission(submission["submission_id"], "Failed to submit to execution server")
+        return
+    delay = JUDGE_RETRY_BASE_DELAY * 2 ** (attempt - 1) + random.uniform(0, JUDGE_RETRY_BASE_DELAY)
+    print(f"Execution server unavailable for submission {submission['submission_id']}, retrying in {delay:.0f}s: {error}")
+    requeue_submission(submission["submission_id"], delay, failed_attempt=True)
+
+
+def promote_due_submissions():
+    # ZREM decides which worker moves a due submission, so every one is queued once
+    for submission_id in redis_client.zrangebyscore(JUDGE_DELAYED_KEY, "-inf", time.time(), start=0, num=100):
+        if redis_client.zrem(JUDGE_DELAYED_KEY, submission_id):
+            redis_client.lpush(JUDGE_QUEUE_KEY, submission_id)
+
+
+def normalize_source(code):
+    # Conservative on purpose: only changes no compiler or interpreter tells apart are undone, line endings and
+    # trailing whitespace at the end of the file. Anything else, even whitespace inside a line, is a new source
+    return similarity.decode_source(code).replace("\r\n", "\n").rstrip()
+
+
+def get_verdict_cache_key(problem_id, test_set_version, language, code):
+    # None for problems from before test sets, their test data has no version an edit would change
+    if test_set_version is None:
+        return None
+    source_hash = hashlib.sha256(normalize_source(code).encode()).hexdigest()
+    return f"{VERDICT_CACHE_PREFIX}{problem_id}:{test_set_version}:{JUDGE_EXECUTOR}:{language}:{source_hash}"
+
+
+def get_cached_verdict(cache_key):
+    if cache_key is None:
+        return None
+    try:
+        cached_value = redis_client.get(cache_key)
+        if cached_value is not None:
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.zadd(VERDICT_CACHE_LRU_KEY, {cache_key: time.time()})
+            pipeline.expire(cache_key, VERDICT_CACHE_TTL)
+            pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Verdict cache unavailable: {e}")
+        return None
+    count_cache_lookup("verdicts", cached_value is not None)
+    return json.loads(cached_value) if cached_value is not None else None
+
+
+def cache_verdict(cache_key, problem_id, judge0_result):
+    # Outputs are cut to what finalize_submission stores anyway
+    statuses = [judge0_result["status"]] + [test_case["status"] for test_case in judge0_result.get("test_cases") or []]
+    if cache_key is None or any(
+        status["id"] not in VERDICT_CACHEABLE_STATUSES and status["id"] != executors.SKIPPED["id"] for status in statuses
+    ):
+        return
+    cached_value = {
+        **trim_judge0_result(judge0_result),
+        **{field: judge0_result[field] for field in ("test_cases", "number_of_passed_test_cases") if field in judge0_result},
+    }
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.set(cache_key, json.dumps(cached_value), ex=VERDICT_CACHE_TTL)
+        pipeline.zadd(VERDICT_CACHE_LRU_KEY, {cache_key: time.time()})
+        # Entries by problem, so a test set edit can drop them at once
+        pipeline.sadd(f"{VERDICT_CACHE_PREFIX}problem:{problem_id}", cache_key)
+        pipeline.expire(f"{VERDICT_CACHE_PREFIX}problem:{problem_id}", VERDICT_CACHE_TTL)
+        pipeline.zcard(VERDICT_CACHE_LRU_KEY)
+        size = pipeline.execute()[-1]
+        if size > VERDICT_CACHE_SIZE:
+            evicted = [key for key, _ in redis_client.zpopmin(VERDICT_CACHE_LRU_KEY, size - VERDICT_CACHE_SIZE)]
+            if evicted:
+                redis_client.delete(*evicted)
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to cache verdict: {e}")
+
+
+def invalidate_verdict_cache(problem_id):
+    # Cache keys contain the test set version, so a new set already misses. This frees the old entries right away
+    problem_key = f"{VERDICT_CACHE_PREFIX}problem:{problem_id}"
+    try:
+        cache_keys = list(redis_client.smembers(problem_key))
+        pipeline = redis_client.pipeline(transaction=False)
+        if cache_keys:
+            pipeline.delete(*cache_keys)
+            pipeline.zrem(VERDICT_CACHE_LRU_KEY, *cache_keys)
+        pipeline.delete(problem_key)
+        pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to invalidate the verdict cache of problem {problem_id}: {e}")
+
+
+def judge0_request(method, url, key=None, **kwargs):
+    # Returns the response and the id of the key that sent it. A known key is used as is, polls must go through
+    # the key that created the submission. Otherwise keys are chosen by remaining quota, and a 429 moves on to the
+    # next key until every key was tried. Raises judge0_keys.NoKeyAvailable when all keys are cooling down
+    pinned = key in JUDGE0_KEYS
+    headers = kwargs.pop("headers", {})
+    tried = set()
+    while True:
+        if not pinned:
+            key = judge0_keys.choose_key(redis_client, [key_id for key_id in JUDGE0_KEYS if key_id not in tried])
+        tried.add(key)
+        try:
+            response = http_client.request(
+                "judge0",
+                method,
+                url,
+                headers={**headers, "x-rapidapi-key": JUDGE0_KEYS[key], "x-rapidapi-host": "judge0-ce.p.rapidapi.com"},
+                **kwargs,
+            )
+        except requests.exceptions.RequestException:
+            judge0_keys.record_response(redis_client, key)
+            raise
+        judge0_keys.record_response(redis_client, key, response)
+        if response.status_code != 429 or pinned or len(tried) == len(JUDGE0_KEYS):
+            return response, key
+
+
+def decode_judge0_field(value):
+    # Submissions are created with base64_encoded=true, so Judge0 returns base64 encoded outputs
+    if value is None:
+        return None
+    try:
+        return base64.b64decode(value).decode("utf-8", errors="replace")
+    except (ValueError, TypeError):
+        return value
+
+
+def format_submission_result(submission):
+    # Same shape as a Judge0 submission, which is what the editor expects
+    submission_status = submission["submission_status"]
+    submission_output = submission.get("submission_output", {})
+    return {
+        "status": {"id": submission_status["status_code"], "description": submission_status["status"]},
+        "time": submission_status["time"],
+        "memory": submission_status["memory"],
+        "stdout": submission_output.get("stdout"),
+        "stderr": submission_output.get("stderr"),
+        "number_of_passed_test_cases": submission_status.get("number_of_passed_test_cases"),
+        "test_cases": submission_status.get("test_cases"),
+        "message": submission_status.get("message"),
+    }
+
+
+def finalize_submission(submission_id, judge0_result, cached=False):
+    # Judging state machine: queued -> running -> finalized. Only the call that moves a submission to
+    # finalized applies the statistics and leaderboard changes, repeated callbacks are no-ops.
+    # A judged verdict is added to the verdict cache, cached is set when the verdict came from it
+    stdout = decode_judge0_field(judge0_result.get("stdout"))
+    stderr = decode_judge0_field(judge0_result.get("stderr") or judge0_result.get("compile_output"))
+    status = judge0_result.get("status") or {"id": 13, "description": "Internal Error"}
+
+    submission = mongodb_client.submissions.find_one(
+        {"submission_id": submission_id},
+        {
+            "_id": 0,
+            "submission_id": 1,
+            "problem_id": 1,
+            "user_id": 1,
+            "contest_id": 1,
+            "created_at": 1,
+            "judging_state": 1,
+            "verdict_cache_key": 1,
+        },
+    )
+    if submission is None or submission.get("judging_state") == "finalized":
+        return False
+
+    submission_status = {
+        "status_code": status["id"],
+        "status": status["description"],
+        "time": judge0_result.get("time"),
+        "memory": judge0_result.get("memory"),
+        "message": judge0_result.get("message"),
+    }
+    if "test_cases" in judge0_result:
+        submission_status["number_of_passed_test_cases"] = judge0_result["number_of_passed_test_cases"]
+        submission_status["test_cases"] = judge0_result["test_cases"]
+    else:
+        submission_status["number_of_passed_test_cases"] = compare_output(stdout, submission["problem_id"])
+
+    result = mongodb_client.submissions.update_one(
+        {"submission_id": submission_id, "judging_state": {"$in": ["queued", "running"]}},
+        {
+            "$set": {
+                "judging_state": "finalized",
+                "submission_status": submission_status,
+                "submission_output": {
+                    "stdout": stdout[:SUBMISSION_OUTPUT_LIMIT] if stdout is not None else None,
+                    "stderr": stderr[:SUBMISSION_OUTPUT_LIMIT] if stderr is not None else None,
+                },
+                "verdict_cached": cached,
+                "updated_at": datetime.now(),
+            },
+            "$unset": {"judge0_case_results": ""},
+        },
+    )
+    if result.modified_count == 0:
+        return False
+    if not cached:
+        cache_verdict(submission.get("verdict_cache_key"), submission["problem_id"], judge0_result)
+
+    if status["id"] == 3:
+        mongodb_client.problems.update_one(
+            {"problem_id": submission["problem_id"]},
+            {"$inc": {"problem_statistics.total_accepted_submissions": 1}},
+        )
+    elif stdout is not None:
+        mongodb_client.problems.update_one(
+            {"problem_id": submission["problem_id"]},
+            {"$inc": {"problem_statistics.total_rejected_submissions": 1}},
+        )
+    metrics.record(redis_client, "astar_verdicts_total", {"status": status["description"], "cached": str(cached).lower()})
+    record_user_verdict(submission["user_id"], submission["problem_id"], status["id"] == 3)
+    add_competition_submission({**submission, "submission_status": submission_status})
+    publish_event(
+        f"user:{submission['user_id']}",
+        "verdict",
+        {
+            "submission_id": submission_id,
+            **format_submission_result(
+                {"submission_status": submission_status, "submission_output": {"stdout": stdout, "stderr": stderr}}
+            ),
+        },
+    )
+    return True
+
+
+def fail_submission(submission_id, message):
+    # Execution server errors are not the user's fault, so no statistics or leaderboard changes are made
+    submission = mongodb_client.submissions.find_one_and_update(
+        {"submission_id": submission_id, "judging_state": {"$in": ["queued", "running"]}},
+        {
+            "$set": {
+                "judging_state": "finalized",
+                "submission_status": {"status_code": 13, "status": "Internal Error", "time": 0, "memory": 0},
+                "submission_output": {"stdout": None, "stderr": message},
+                "updated_at": datetime.now(),
+            }
+        },
+        projection={"_id": 0, "user_id": 1, "submission_status": 1, "submission_output": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if submission is not None:
+        metrics.record(redis_client, "astar_verdicts_total", {"status": "Internal Error", "cached": "false"})
+        publish_event(
+            f"user:{submission['user_id']}",
+            "verdict",
+            {"submission_id": submission_id, **format_submission_result(submission)},
+        )
+
+
+TEST_CASE_LIMITS = ("cpu_time_limit", "wall_time_limit", "memory_limit")
+
+
+def get_checker_executor():
+    global CHECKER_EXECUTOR
+    if CHECKER_EXECUTOR is None:
+        CHECKER_EXECUTOR = executors.LocalExecutor()
+    return CHECKER_EXECUTOR
+
+
+def get_problem_checker(problem_id):
+    # Output checker of a problem, problems without a checker setting compare line by line
+    problem = repository.find_problem(problem_id, ["checker"]) or {}
+    config = problem.get("checker")
+    return checkers.get_checker(config, get_checker_executor() if config and config.get("mode") == "custom" else None)
+
+
+def parse_checker(value):
+    # Validated checker setting from a test cases API request body, or an error message
+    if not isinstance(value, dict) or value.get("mode") not in checkers.CHECKER_MODES:
+        return None, f"Checker mode must be one of {', '.join(checkers.CHECKER_MODES)}"
+    checker = {"mode": value["mode"]}
+    if value["mode"] == "float":
+        for tolerance in ("abs_tolerance", "rel_tolerance"):
+            if value.get(tolerance) is None:
+                continue
+            if isinstance(value[tolerance], bool) or not isinstance(value[tolerance], (int, float)) or value[tolerance] < 0:
+                return None, f"Checker {tolerance} must be a non-negative number"
+            checker[tolerance] = value[tolerance]
+    if value["mode"] == "custom":
+        if executors.LANGUAGES.get(value.get("language_id")) is None:
+            return None, "Checker language_id must be a language supported by the local executor"
+        try:
+            base64.b64decode(value.get("source_code") or "", validate=True)
+        except (TypeError, ValueError):
+            return None, "Checker source_code must be base64 encoded"
+        if not value.get("source_code"):
+            return None, "Checker source_code is required"
+        checker["language_id"] = value["language_id"]
+        checker["source_code"] = value["source_code"]
+    return checker, None
+
+
+TEST_CASE_DATA_FIELDS = ("stdin", "expected_output")
+# Projection of a test case document, the data itself is in the blob store unless the case predates it
+TEST_CASE_PROJECTION = {
+    "_id": 0,
+    **{field: 1 for field in TEST_CASE_DATA_FIELDS},
+    **{f"{field}_blob": 1 for field in TEST_CASE_DATA_FIELDS},
+    **{f"{field}_length": 1 for field in TEST_CASE_DATA_FIELDS},
+    **{limit: 1 for limit in TEST_CASE_LIMITS},
+}
+
+
+def load_test_case_data(test_cases):
+    # Fills stdin and expected_output of test case documents from the blob store, in one round trip
+    contents = blobs.get_many(
+        test_case[f"{field}_blob"]
+        for test_case in test_cases
+        for field in TEST_CASE_DATA_FIELDS
+        if field not in test_case and test_case.get(f"{field}_blob")
+    )
+    for test_case in test_cases:
+        for field in TEST_CASE_DATA_FIELDS:
+            if field not in test_case:
+                test_case[field] = contents[test_case[f"{field}_blob"]].decode() if test_case.get(f"{field}_blob") else ""
+    return test_cases
+
+
+def load_submission_code(submissions):
+    # Fills code of submission documents from the blob store, submissions from before it store the code inline
+    contents = blobs.get_many(
+        submission["code_blob"] for submission in submissions if "code" not in submission and submission.get("code_blob")
+    )
+    for submission in submissions:
+        if "code" not in submission:
+            submission["code"] = contents[submission["code_blob"]].decode() if submission.get("code_blob") else ""
+    return submissions
+
+
+def test_case_length(test_case, field):
+    return test_case[f"{field}_length"] if f"{field}_length" in test_case else len(test_case.get(field, ""))
+
+
+def get_problem_test_cases(problem_id, load_data=True):
+    # Test cases of the problem's current test set, its fail fast setting and the version the cases were read from,
+    # (None, False, None) for unknown problems. Problems from before test sets are judged as one case made of their
+    # problem_stdin/problem_stdout, with version None. Without load_data only the metadata of each case is read
+    problem = mongodb_client.problems.find_one(
+        {"problem_id": problem_id}, {"_id": 0, "test_set_version": 1, "fail_fast": 1, "problem_stdin": 1, "problem_stdout": 1}
+    )
+    if problem is None:
+        return None, False, None
+    if problem.get("test_set_version") is None:
+        return [{"stdin": problem.get("problem_stdin", ""), "expected_output": problem.get("problem_stdout", "")}], False, None
+    test_cases = list(
+        mongodb_client.problem_test_cases.find(
+            {"problem_id": problem_id, "test_set_version": problem["test_set_version"]}, TEST_CASE_PROJECTION
+        ).sort("case_index", ASCENDING)
+    )
+    if load_data:
+        load_test_case_data(test_cases)
+    return test_cases, problem.get("fail_fast", False), problem["test_set_version"]
+
+
+def encode_test_case(test_case):
+    # Judge0 submission fields of a test case, inputs are base64 encoded like the source code
+    return {
+        "stdin": base64.b64encode(test_case["stdin"].encode()).decode(),
+        "expected_output": base64.b64encode(test_case["expected_output"].encode()).decode(),
+        **{limit: test_case[limit] for limit in TEST_CASE_LIMITS if test_case.get(limit)},
+    }
+
+
+def get_problem_test_case(problem_id, test_set_version, case_index):
+    # One test case of a given test set, test_set_version None is the problem_stdin/problem_stdout of an old problem
+    if test_set_version is None:
+        problem = repository.find_problem(problem_id, ["problem_stdin", "problem_stdout"])
+        if problem is None or case_index != 0:
+            return None
+        return {"stdin": problem.get("problem_stdin", ""), "expected_output": problem.get("problem_stdout", "")}
+    test_case = mongodb_client.problem_test_cases.find_one(
+        {"problem_id": problem_id, "test_set_version": test_set_version, "case_index": case_index}, TEST_CASE_PROJECTION
+    )
+    return load_test_case_data([test_case])[0] if test_case is not None else None
+
+
+def replace_problem_test_cases(problem_id, test_cases, fail_fast=False, checker=None):
+    # The new set is written under a new version before the problem switches to it, a submission judged meanwhile
+    # reads either the old or the new set, never a mix. The old set is kept for submissions still being judged
+    # against it, see prune_test_sets. Returns the new version, None for unknown problems.
+    # The checker is part of the set, None keeps the current one
+    problem = mongodb_client.problems.find_one_and_update(
+        {"problem_id": problem_id},
+        {"$inc": {"next_test_set_version": 1}},
+        projection={"_id": 0, "next_test_set_version": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if problem is None:
+        return None
+    version = problem["next_test_set_version"]
+    problem_update = {
+        "test_set_version": version,
+        "test_case_count": len(test_cases),
+        "fail_fast": fail_fast,
+        "test_set_updated_at": datetime.now(),
+    }
+    if checker is not None:
+        problem_update["checker"] = checker
+    mongodb_client.problem_test_cases.insert_many(
+        [
+            {
+                "problem_id": problem_id,
+                "test_set_version": version,
+                "case_index": index,
+                # Identical inputs and outputs, within and across problems, are stored once
+                **{f"{field}_blob": blobs.put(test_case[field]) for field in TEST_CASE_DATA_FIELDS},
+                **{f"{field}_length": len(test_case[field]) for field in TEST_CASE_DATA_FIELDS},
+                **{limit: test_case[limit] for limit in TEST_CASE_LIMITS if test_case.get(limit)},
+                "created_at": datetime.now(),
+            }
+            for index, test_case in enumerate(test_cases)
+        ]
+    )
+    mongodb_client.problems.update_one(
+        {"problem_id": problem_id, "$or": [{"test_set_version": {"$lt": version}}, {"test_set_version": {"$exists": False}}]},
+        {
+            "$set": problem_update,
+            # The problem document no longer carries the test data
+            "$unset": {"problem_stdin": "", "problem_stdout": ""},
+        },
+    )
+    invalidate_verdict_cache(problem_id)
+    return version
+
+
+def prune_test_sets(older_than):
+    # Deletes superseded test sets once nothing can judge against them anymore: no running submission references
+    # the version, and the problem switched away more than older_than ago (a worker may have read the old version
+    # just before the switch and not stored it on the submission yet). Returns the number of deleted cases
+    in_use = {
+        (submission["problem_id"], submission.get("test_set_version"))
+        for submission in mongodb_client.submissions.find(
+            {"judging_state": "running"}, {"_id": 0, "problem_id": 1, "test_set_version": 1}
+        )
+    }
+    switched_before = datetime.now() - older_than
+    pruned = 0
+    for problem in mongodb_client.problems.find(
+        {
+            "test_set_version": {"$ne": None},
+            "$or": [{"test_set_updated_at": {"$lt": switched_before}}, {"test_set_updated_at": {"$exists": False}}],
+        },
+        {"_id": 0, "problem_id": 1, "test_set_version": 1},
+    ):
+        superseded_versions = [
+            version
+            for version in mongodb_client.problem_test_cases.distinct(
+                "test_set_version", {"problem_id": problem["problem_id"], "test_set_version": {"$lt": problem["test_set_version"]}}
+            )
+            if (problem["problem_id"], version) not in in_use
+        ]
+        if superseded_versions:
+            pruned += mongodb_client.problem_test_cases.delete_many(
+                {"problem_id": problem["problem_id"], "test_set_version": {"$in": superseded_versions}}
+            ).deleted_count
+    return pruned
+
+
+def dispatch_submission(submission_id):
+    # Claim the submission, duplicate queue entries for the same submission find it already running
+    submission = mongodb_client.submissions.find_one_and_update(
+        {"submission_id": submission_id, "judging_state": "queued"},
+        {"$set": {"judging_state": "running", "judging_started_at": datetime.now()}},
+        projection={
+            "_id": 0,
+            "submission_id": 1,
+            "problem_id": 1,
+            "user_id": 1,
+            "code": 1,
+            "code_blob": 1,
+            "language": 1,
+            "dispatch_attempts": 1,
+        },
+    )
+    if submission is None:
+        return
+    load_submission_code([submission])
+
+    try:
+        index_submission_similarity(submission)
+    except Exception as e:
+        # A failed similarity check must not block judging
+        print(f"Similarity check failed for submission {submission_id}: {e}")
+
+    # The version the cases were read from is the one recorded on the submission and in the verdict cache key
+    test_cases, fail_fast, test_set_version = get_problem_test_cases(submission["problem_id"], load_data=False)
+    if not test_cases:
+        fail_submission(submission_id, "Problem not found" if test_cases is None else "Problem has no test cases")
+        return
+    verdict_cache_key = get_verdict_cache_key(
+        submission["problem_id"], test_set_version, submission["language"], submission["code"]
+    )
+    cached_verdict = get_cached_verdict(verdict_cache_key)
+    if cached_verdict is not None:
+        # Judged before against the same test set, nothing is executed
+        finalize_submission(submission_id, cached_verdict, cached=True)
+        return
+
+    test_cases = [encode_test_case(test_case) for test_case in load_test_case_data(test_cases)]
+    language_id = get_language_id(submission["language"])
+
+    if LOCAL_EXECUTOR is not None:
+        if verdict_cache_key is not None:
+            mongodb_client.submissions.update_one(
+                {"submission_id": submission_id}, {"$set": {"verdict_cache_key": verdict_cache_key}}
+            )
+        finalize_submission(
+            submission_id,
+            LOCAL_EXECUTOR.judge(
+                language_id, submission["code"], test_cases, fail_fast, get_problem_checker(submission["problem_id"])
+            ),
+        )
+        return
+
+    # One Judge0 submission per test case, all judged in parallel. The expected output stays here, Judge0 only
+    # runs the program and the problem's checker compares the output, see check_judge0_results
+    judge0_payloads = [
+        {
+            "source_code": submission["code"],
+            "language_id": language_id,
+            **{field: value for field, value in test_case.items() if field != "expected_output"},
+        }
+        for test_case in test_cases
+    ]
+    judging_details = {
+        "test_case_count": len(test_cases),
+        "fail_fast": fail_fast,
+        "test_set_version": test_set_version,
+        "verdict_cache_key": verdict_cache_key,
+    }
+    if JUDGE0_CALLBACK_URL:
+        # The secret is stored before submitting, Judge0 may call back before the response arrives
+        judging_details["callback_secret"] = secrets.token_urlsafe(24)
+        for index, judge0_payload in enumerate(judge0_payloads):
+            judge0_payload["callback_url"] = (
+                f"{JUDGE0_CALLBACK_URL.rstrip('/')}/api/v1/judge0/callback/{submission_id}"
+                f"?secret={judging_details['callback_secret']}&case={index}"
+            )
+    mongodb_client.submissions.update_one({"submission_id": submission_id}, {"$set": judging_details})
+
+    # Batches go through the same key, so the tokens can be polled through it
+    tokens = []
+    judge0_key_id = None
+    judge0_started_at = time.perf_counter()
+    try:
+        for batch_start in range(0, len(judge0_payloads), JUDGE0_BATCH_SIZE):
+            judge0_response, judge0_key_id = judge0_request(
+                "POST",
+                "https://judge0-ce.p.rapidapi.com/submissions/batch?base64_encoded=true",
+                key=judge0_key_id,
+                json={"submissions": judge0_payloads[batch_start:batch_start + JUDGE0_BATCH_SIZE]},
+                headers={"Content-Type": "application/json"},
+            )
+            if judge0_response.status_code not in (200, 201):
+                break
+            tokens.extend(item.get("token") for item in judge0_response.json())
+    except judge0_keys.NoKeyAvailable as e:
+        # Every key is out of quota, the submission waits in judge:delayed for one instead of failing. The worker
+        # thread moves on to other submissions meanwhile
+        print(f"Submission {submission_id} waiting for a Judge0 key: {e}")
+        requeue_submission(submission_id, delay=e.retry_after)
+        return
+    except requests.exceptions.RequestException as e:
+        # Connection errors, timeouts and an open circuit (http_client.UpstreamUnavailable) are transient
+        retry_dispatch(submission, e)
+        return
+    finally:
+        metrics.record(
+            redis_client,
+            "astar_judge0_request_duration_seconds",
+            {"operation": "submit_batch"},
+            time.perf_counter() - judge0_started_at,
+        )
+
+    if judge0_response.status_code == 429:
+        # Every key was tried and is now cooling down, the submission waits until the first one is usable
+        requeue_submission(submission_id, delay=judge0_keys.retry_after(redis_client, list(JUDGE0_KEYS)))
+        return
+    if judge0_response.status_code >= 500:
+        retry_dispatch(submission, f"HTTP {judge0_response.status_code}")
+        return
+
+    if judge0_response.status_code not in (200, 201) or not all(tokens):
+        mongodb_client.system_logs.insert_one(
+            {
+                "log_id": str(uuid.uuid4()),
+                "log_type": "error",
+                "log_message": "Failed to submit to execution server",
+                "log_details": {"status_code": judge0_response.status_code, "body": judge0_response.text},
+                "created_at": datetime.now(),
+            }
+        )
+        fail_submission(submission_id, "Failed to submit to execution server")
+        return
+
+    mongodb_client.system_logs.insert_one(
+        {
+            "log_id": str(uuid.uuid4()),
+            "log_type": "info",
+            "log_message": "Submitted to execution server",
+            "log_details": {"tokens": tokens},
+            "created_at": datetime.now(),
+        }
+    )
+    mongodb_client.submissions.update_one(
+        {"submission_id": submission_id, "judging_state": "running"},
+        {
+            "$set": {
+                "judge0_submission_id": tokens[0],
+                "judge0_tokens": tokens,
+                "judge0_key_id": judge0_key_id,
+                "submission_status.status_code": 2,
+                "submission_status.status": "Processing",
+            }
+        },
+    )
+
+    if not JUDGE0_CALLBACK_URL:
+        poll_judge0_batch(submission_id, submission["problem_id"], test_set_version, tokens, judge0_key_id, fail_fast)
+
+
+def check_judge0_result(checker, problem_id, test_set_version, case_index, judge0_result):
+    # Judge0 runs without the expected output, Accepted only means the program exited cleanly until the checker
+    # has compared its output with the test case
+    if not judge0_result or judge0_result["status"]["id"] != executors.ACCEPTED["id"]:
+        return judge0_result
+    test_case = get_problem_test_case(problem_id, test_set_version, case_index)
+    if test_case is None:
+        return {**judge0_result, "status": executors.INTERNAL_ERROR, "message": "Test case not found"}
+    try:
+        result = checker.check(
+            base64.b64decode(judge0_result.get("stdout") or ""),
+            test_case["expected_output"].encode(),
+            test_case["stdin"].encode(),
+        )
+    except checkers.CheckerError as e:
+        return {**judge0_result, "status": executors.INTERNAL_ERROR, "message": str(e)}
+    if not result.accepted:
+        return {**judge0_result, "status": executors.WRONG_ANSWER, "message": result.message}
+    return judge0_result
+
+
+def check_judge0_results(problem_id, test_set_version, results, checked=None):
+    # Checked results of a batch in test case order. Cases already in checked, by index, are not checked again
+    checked = {} if checked is None else checked
+    checker = None
+    for index, result in enumerate(results):
+        if index in checked or not result or result["status"]["id"] <= 2:
+            continue
+        if checker is None:
+            checker = get_problem_checker(problem_id)
+        checked[index] = check_judge0_result(checker, problem_id, test_set_version, index, result)
+    return [checked.get(index) for index in range(len(results))]
+
+
+def collect_judge0_results(results, fail_fast):
+    # Results in test case order once judging is complete, otherwise None. Unfinished cases are None, which
+    # aggregate_results reports as skipped, when a case already failed in fail fast mode
+    finished = [result if result and result["status"]["id"] > 2 else None for result in results]
+    if all(result is not None for result in finished):
+        return finished
+    if fail_fast and any(result is not None and result["status"]["id"] != 3 for result in finished):
+        return finished
+    return None
+
+
+def poll_judge0_batch(submission_id, problem_id, test_set_version, tokens, key, fail_fast):
+    # Without callbacks the worker polls the batch with growing delays until every case is judged
+    deadline = time.monotonic() + JUDGE0_BATCH_TIMEOUT
+    delay = 0.25
+    checked = {}
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        results = fetch_judge0_batch(tokens, key)
+        if results is not None:
+            results = collect_judge0_results(check_judge0_results(problem_id, test_set_version, results, checked), fail_fast)
+        if results is not None:
+            finalize_submission(submission_id, executors.aggregate_results(results))
+            return
+        delay = min(delay * 2, 2)
+
+
+def fetch_judge0_batch(tokens, key=None):
+    # Results of a batch in token order, None if any request failed
+    results = []
+    judge0_started_at = time.perf_counter()
+    try:
+        for batch_start in range(0, len(tokens), JUDGE0_BATCH_SIZE):
+            judge0_response, _ = judge0_request(
+                "GET",
+                f"https://judge0-ce.p.rapidapi.com/submissions/batch?tokens={','.join(tokens[batch_start:batch_start + JUDGE0_BATCH_SIZE])}"
+                f"&base64_encoded=true&fields={JUDGE0_RESULT_FIELDS}",
+                key=key,
+                timeout=(5, 30),
+            )
+            if judge0_response.status_code != 200:
+                return None
+            results.extend(judge0_response.json()["submissions"])
+    except (judge0_keys.NoKeyAvailable, requests.exceptions.RequestException):
+        return None
+    finally:
+        metrics.record(
+            redis_client, "astar_judge0_request_duration_seconds", {"operation": "fetch_batch"}, time.perf_counter() - judge0_started_at
+        )
+    return results
+
+
+def trim_judge0_result(judge0_result):
+    # Case results are stored on the submission until it is finalized, outputs are cut to what is kept anyway
+    trimmed = {field: judge0_result.get(field) for field in ("status", "time", "memory", "message")}
+    for field in ("stdout", "stderr", "compile_output"):
+        value = decode_judge0_field(judge0_result.get(field))
+        trimmed[field] = base64.b64encode(value[:SUBMISSION_OUTPUT_LIMIT].encode()).decode() if value else None
+    return trimmed
+
+
+def record_judge0_case_result(submission_id, case_index, judge0_result):
+    # Judge0 calls back once per test case, the callback completing the set finalizes the submission.
+    # The output is checked before it is trimmed for storage
+    submission = mongodb_client.submissions.find_one(
+        {"submission_id": submission_id, "judging_state": "running"}, {"_id": 0, "problem_id": 1, "test_set_version": 1}
+    )
+    if submission is None:
+        return
+    judge0_result = check_judge0_result(
+        get_problem_checker(submission["problem_id"]),
+        submission["problem_id"],
+        submission.get("test_set_version"),
+        case_index,
+        judge0_result,
+    )
+    submission = mongodb_client.submissions.find_one_and_update(
+        {"submission_id": submission_id, "judging_state": "running"},
+        {"$set": {f"judge0_case_results.{case_index}": trim_judge0_result(judge0_result)}},
+        projection={"_id": 0, "test_case_count": 1, "fail_fast": 1, "judge0_case_results": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if submission is None:
+        return
+    case_results = submission.get("judge0_case_results", {})
+    results = collect_judge0_results(
+        [case_results.get(str(index)) for index in range(submission.get("test_case_count", 1))],
+        submission.get("fail_fast", False),
+    )
+    if results is not None:
+        finalize_submission(submission_id, executors.aggregate_results(results))
+
+
+def fetch_judge0_submission(token, key=None):
+    # Polled through the key that created the submission, any key when it is unknown or no longer configured
+    judge0_started_at = time.perf_counter()
+    try:
+        judge0_response, _ = judge0_request(
+            "GET",
+            f"https://judge0-ce.p.rapidapi.com/submissions/{token}?base64_encoded=true&fields=stdout,stderr,compile_output,status,time,memory",
+            key=key,
+            timeout=(5, 30),
+        )
+    except judge0_keys.NoKeyAvailable:
+        return None
+    finally:
+        metrics.record(
+            redis_client, "astar_judge0_request_duration_seconds", {"operation": "fetch"}, time.perf_counter() - judge0_started_at
+        )
+    if judge0_response.status_code != 200:
+        return None
+    return judge0_response.json()
+
+
+def reconcile_stale_submissions(older_than):
+    # Recover submissions whose worker died or whose Judge0 callback never arrived
+    stale_before = datetime.now() - older_than
+    reconciled = 0
+
+    # Submissions created before the judging state machine, still waiting on a Judge0 token
+    mongodb_client.submissions.update_many(
+        {
+            "judging_state": {"$exists": False},
+            "submission_status.status_code": {"$in": [0, 1, 2]},
+            "judge0_submission_id": {"$ne": None},
+        },
+        [{"$set": {"judging_state": "running", "judging_started_at": "$created_at"}}],
+    )
+
+    for submission in mongodb_client.submissions.find(
+        {"judging_state": "running", "judging_started_at": {"$lt": stale_before}},
+        {
+            "_id": 0,
+            "submission_id": 1,
+            "problem_id": 1,
+            "judge0_submission_id": 1,
+            "judge0_tokens": 1,
+            "judge0_key_id": 1,
+            "fail_fast": 1,
+            "test_set_version": 1,
+        },
+    ):
+        if submission.get("judge0_tokens"):
+            results = fetch_judge0_batch(submission["judge0_tokens"], submission.get("judge0_key_id"))
+            if results is not None:
+                results = collect_judge0_results(
+                    check_judge0_results(submission["problem_id"], submission.get("test_set_version"), results),
+                    submission.get("fail_fast", False),
                 )
+            if results is not None:
+                reconciled += finalize_submission(submission["submission_id"], executors.aggregate_results(results))
+            continue
+        if submission.get("judge0_submission_id"):
+            judge0_result = fetch_judge0_submission(submission["judge0_submission_id"], submission.get("judge0_key_id"))
+            if judge0_result is not None and judge0_result["status"]["id"] > 2:
+                reconciled += finalize_submission(submission["submission_id"], judge0_result)
+            continue
+        # Never reached the execution server, hand it back to the queue
+        reconciled += requeue_submission(submission["submission_id"])
+
+    for submission in mongodb_client.submissions.find(
+        {"judging_state": "queued", "created_at": {"$lt": stale_before}}, {"_id": 0, "submission_id": 1}
+    ):
+        # Re-enqueueing is safe, only one worker can claim a queued submission
+        enqueue_submission(submission["submission_id"])
+        reconciled += 1
+
+    return reconciled
+
+
+def judge_next_submission():
+    # The item stays on the processing list until it has been dispatched
+    try:
+        promote_due_submissions()
+        submission_id = redis_client.brpoplpush(JUDGE_QUEUE_KEY, JUDGE_PROCESSING_KEY, timeout=5)
+    except redis.exceptions.RedisError as e:
+        print(f"Judge queue unavailable: {e}")
+        time.sleep(5)
+        return
+    if submission_id is None:
+        return
+    submission_id = submission_id.decode()
+    try:
+        dispatch_submission(submission_id)
+    except Exception as e:
+        print(f"Failed to judge submission {submission_id}: {e}")
+        fail_submission(submission_id, "Failed to submit to execution server")
+    finally:
+        try:
+            redis_client.lrem(JUDGE_PROCESSING_KEY, 1, submission_id)
+        except redis.exceptions.RedisError as e:
+            # The submission's state is in MongoDB, a stale processing entry is harmless
+            print(f"Failed to remove submission {submission_id} from the processing list: {e}")
 
-            return True
 
-    return False
+def judge_worker_loop():
+    # Every error is logged and the loop goes on, a worker thread that ended would leave the pool short unnoticed
+    while True:
+        try:
+            judge_next_submission()
+        except Exception as e:
+            print(f"Judge worker error: {e!r}")
+            time.sleep(1)
 
-def calculate_error_rate():
-    total_api_calls_today = mongodb_client.platform_logs.count_documents(
-        {
-            "created_at": {
-                "$gte": datetime.now().replace(hour=0, minute=0, second=0)
-            }
-        }
+# Candidate pairs compared in the calling process, larger batches go to a process pool
+PLAGIARISM_INLINE_PAIRS = 64
+
+
+def generate_contest_plagiarism_report(contest_id, workers=None):
+    # Compare all accepted contest submissions per problem: LSH buckets prune the candidate pairs,
+    # the exact token sequence comparison of the remaining pairs runs in a process pool
+    contest = mongodb_client.contests.find_one(
+        {"contest_id": contest_id},
+        {"_id": 0, "contest_id": 1, "contest_start_time": 1, "contest_end_time": 1, "contest_problems": 1, "storage_version": 1},
     )
-    total_error_calls_today = mongodb_client.platform_logs.count_documents(
-        {
-            "created_at": {
-                "$gte": datetime.now().replace(hour=0, minute=0, second=0)
-            },
-            "log_type": "error",
+    if contest is None:
+        return None
+    participant_ids = get_contest_participant_ids(contest)
+
+    clusters = []
+    compared_pairs = 0
+    submissions_checked = 0
+    for problem_id in contest["contest_problems"].values():
+        submissions = {
+            submission["submission_id"]: submission
+            for submission in mongodb_client.submissions.find(
+                {
+                    "problem_id": problem_id,
+                    "submission_status.status_code": 3,
+                    "user_id": {"$in": participant_ids},
+                    "created_at": {
+                        "$gte": datetime.strptime(contest["contest_start_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz),
+                        "$lt": datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz),
+                    },
+                },
+                {"_id": 0, "submission_id": 1, "user_id": 1, "code": 1, "code_blob": 1, "language": 1},
+            )
         }
+        load_submission_code(list(submissions.values()))
+        submissions_checked += len(submissions)
+
+        tokens = {}
+        band_keys = {}
+        for submission_id, submission in submissions.items():
+            tokens[submission_id] = similarity.normalize_tokens(
+                similarity.decode_source(submission["code"]), submission.get("language", "python")
+            )
+            band_keys[submission_id] = similarity.lsh_bands(
+                similarity.minhash_signature(similarity.shingle_hashes(tokens[submission_id]))
+            )
 
-    )
+        pairs = [
+            (submission_a, tokens[submission_a], submission_b, tokens[submission_b])
+            for submission_a, submission_b in similarity.candidate_pairs(band_keys)
+            if submissions[submission_a]["user_id"] != submissions[submission_b]["user_id"]
+        ]
+        compared_pairs += len(pairs)
 
-    if total_api_calls_today == 0:
-        return "0%"
-    
-    return str(round((total_error_calls_today / total_api_calls_today) * 100, 2)) + "%"
+        if len(pairs) > PLAGIARISM_INLINE_PAIRS:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(similarity.compare_token_sequences, pairs, chunksize=16))
+        else:
+            results = [similarity.compare_token_sequences(pair) for pair in pairs]
+
+        similar_pairs = [result for result in results if result[2] >= similarity.SIMILARITY_THRESHOLD]
+        for members in similarity.cluster_pairs([(a, b) for a, b, _ in similar_pairs]):
+            member_set = set(members)
+            cluster_pairs = [
+                {"submission_a": a, "submission_b": b, "similarity": round(ratio, 3)}
+                for a, b, ratio in similar_pairs
+                if a in member_set
+            ]
+            clusters.append(
+                {
+                    "problem_id": problem_id,
+                    "members": [
+                        {"submission_id": submission_id, "user_id": submissions[submission_id]["user_id"]}
+                        for submission_id in members
+                    ],
+                    "max_similarity": max(pair["similarity"] for pair in cluster_pairs),
+                    "pairs": cluster_pairs,
+                }
+            )
 
-def compare_output(submission_output, problem_id):
-    problem = mongodb_client.problems.find_one({"problem_id": problem_id})
-    expected_output = list(map(str.strip, problem.get("problem_stdout").split("\n")))
-    number_of_passed_test_cases = 0
-    if submission_output is None:
-        return str(number_of_passed_test_cases) + "/" + str(len(expected_output))
-    submission_output = list(map(str.strip, submission_output.split("\n")))
+    report = {
+        "contest_id": contest_id,
+        "clusters": sorted(clusters, key=lambda cluster: cluster["max_similarity"], reverse=True),
+        "submissions_checked": submissions_checked,
+        "compared_pairs": compared_pairs,
+        "generated_at": datetime.now(),
+    }
+    mongodb_client.contest_plagiarism_reports.replace_one({"contest_id": contest_id}, report, upsert=True)
+    return report
 
-    try:
-        for i in range(len(expected_output)):
-            if expected_output[i] == submission_output[i]:
-                number_of_passed_test_cases += 1
-    except IndexError:
-        return str(number_of_passed_test_cases) + "/" + str(len(expected_output))
 
-    return str(number_of_passed_test_cases) + "/" + str(len(expected_output))
+# Overridable so development and tests can point at a local fake Gemini server
+GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_MODEL_URL = f"{GEMINI_API_BASE_URL.rstrip('/')}/v1beta/models/gemini-2.0-flash:generateContent"
+
 
 def generate_contest_report(contest, contest_submissions, contest_problems, contest_leaderboard):
     # Set up the prompt for the generative model
@@ -451,13 +2406,14 @@ def generate_contest_report(contest, contest_submissions, contest_problems, cont
     """
 
     # Make the API request to the Gemini model
-    response = requests.post(
-        f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={os.environ['GEMINI_API_KEY']}",
+    response = http_client.post(
+        "gemini",
+        f"{GEMINI_MODEL_URL}?key={os.environ['GEMINI_API_KEY']}",
         headers={"Content-Type": "application/json"},
         data=json.dumps({
             "contents": [{"parts": [{"text": prompt}]}],
             "generationConfig": {"response_mime_type": "application/json"}
-        })
+        }),
     )
 
     # Check for a successful response
@@ -583,8 +2539,9 @@ def generate_problem_using_ai(level, problem_type):
     """
     # --- End of Prompt ---
 
-    response = requests.post(
-        "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key=" + os.environ["GEMINI_API_KEY"],
+    response = http_client.post(
+        "gemini",
+        f"{GEMINI_MODEL_URL}?key={os.environ['GEMINI_API_KEY']}",
         headers={"Content-Type": "application/json"},
         data=json.dumps(
             {
@@ -632,80 +2589,265 @@ def generate_problem_using_ai(level, problem_type):
         print(f"Response content:\n{response.text}")  # Print raw response for debugging
         return None
     
+# AI generation runs in the ai-worker process. Pages enqueue a job and show the stored text (or a placeholder),
+# a job recomputes its input and only calls Gemini when the input hash differs from the stored one
+AI_QUEUE_KEY = "ai:queue"
+AI_PROCESSING_KEY = "ai:processing"
+AI_DELAYED_KEY = "ai:delayed"
+AI_JOB_THROTTLE = 600  # seconds before the same document can be queued again
+AI_MAX_ATTEMPTS = 5
+AI_RETRY_BASE_DELAY = 30  # seconds, doubled after every failed attempt
+AI_MIN_REPORT_LENGTH = 200
+USER_SUMMARY_PLACEHOLDER = "Summary is being generated, check back shortly."
+CONTEST_REPORT_PLACEHOLDER = "<p>The report is being generated, check back shortly.</p>"
+
+
+def hash_ai_input(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def enqueue_ai_job(job_type, document_id):
+    # At most one job per document per AI_JOB_THROTTLE, page views in between do not queue anything
+    try:
+        if redis_client.set(f"ai:pending:{job_type}:{document_id}", 1, nx=True, ex=AI_JOB_THROTTLE):
+            redis_client.lpush(AI_QUEUE_KEY, json.dumps({"type": job_type, "id": document_id, "attempt": 0}))
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to queue {job_type} job for {document_id}: {e}")
+
+
+def get_user_summary_input(user):
+    submissions, _ = get_submission_history_page(user["user_account"]["user_id"])
+    return {
+        "display_name": user["user_profile"]["display_name"],
+        "submissions": [
+            {key: value for key, value in submission.items() if key != "created_at"} for submission in submissions
+        ],
+    }
+
+
+def generate_user_summary(user_id):
+    user = mongodb_client.users.find_one(
+        {"user_account.user_id": user_id},
+        {"_id": 0, "user_account.user_id": 1, "user_profile.display_name": 1, "user_summary_hash": 1},
+    )
+    if user is None:
+        return
+    summary_input = get_user_summary_input(user)
+    input_hash = hash_ai_input(summary_input)
+    if user.get("user_summary_hash") == input_hash:
+        return
+
+    response = http_client.post(
+        "gemini",
+        f"{GEMINI_MODEL_URL}?key={os.environ['GEMINI_API_KEY']}",
+        headers={"Content-Type": "application/json"},
+        data=json.dumps({
+            "contents": [{"parts": [{"text": f"Generate a concise, two-sentence plain text summary of a user based on their display name and submissions. Return ONLY the two sentences, with absolutely no additional text, markdown, special characters, or newlines. Display name: {summary_input['display_name']}, submissions: {summary_input['submissions']}"}]}],
+            "generationConfig": {
+                "response_mime_type": "text/plain", # Ask for plain text
+                "maxOutputTokens": 150  # Adjust as needed
+            }
+        }),
+        timeout=(5, 60),
+    )
+    if response.status_code != 200:
+        raise Exception(f"Request failed with status code {response.status_code}")
+    user_summary = response.json()["candidates"][0]["content"]["parts"][0]["text"]
+    mongodb_client.users.update_one(
+        {"user_account.user_id": user_id}, {"$set": {"user_summary": user_summary, "user_summary_hash": input_hash}}
+    )
+
+
+def get_contest_report_data(contest):
+    # Leaderboard (sorted by score, with profiles), submissions and problems of an ended contest
+    contest_leaderboard = get_contest_leaderboard_entries(contest)
+    profiles = {
+        user["user_account"]["user_id"]: {"user_profile": user.get("user_profile", {})}
+        for user in mongodb_client.users.find(
+            {"user_account.user_id": {"$in": list(contest_leaderboard)}},
+            {"_id": 0, "user_account.user_id": 1, "user_profile": 1},
+        )
+    }
+
+    # Calculate problems solved by each user
+    for user_id in contest_leaderboard:
+        contest_leaderboard[user_id]["problems_solved"] = sum(
+            1
+            for problem in contest_leaderboard[user_id]["problems"]
+            if contest_leaderboard[user_id]["problems"][problem][
+                "has_accepted_submission"
+            ]
+        )
+        contest_leaderboard[user_id]["profile"] = profiles.get(user_id)
+    participant_ids = get_contest_participant_ids(contest)
+
+    # Submissions to the contest problems by participants within the contest window
+    contest_submissions = []
+    for problem_id in contest["contest_problems"].values():
+        contest_submissions.extend(
+            mongodb_client.submissions.find(
+                {
+                    "problem_id": problem_id,
+                    "user_id": {"$in": participant_ids},
+                    "created_at": {
+                        "$gte": datetime.strptime(contest["contest_start_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz),
+                        "$lt": datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz),
+                    }
+                },
+                {"_id": 0, "problem_id": 1, "user_id": 1, "submission_status": 1, "language": 1, "created_at": 1},
+            )
+        )
+
+    # Get title of all contest problems and thier difficulty
+    contest_problems = list(
+        mongodb_client.problems.find(
+            {
+                "problem_id": {
+                    "$in": [
+                        contest["contest_problems"]["contest_first_problem"],
+                        contest["contest_problems"]["contest_second_problem"],
+                        contest["contest_problems"]["contest_third_problem"],
+                    ]
+                }
+            },
+            {"_id": 0, "problem_id": 1, "problem_title": 1, "problem_description": 1, "problem_level": 1},
+        )
+    )
+    return contest_leaderboard, contest_submissions, contest_problems
+
+
+def generate_contest_summary(contest_id):
+    contest = mongodb_client.contests.find_one(
+        {"contest_id": contest_id},
+        {"_id": 0, "contest_id": 1, "contest_title": 1, "contest_start_time": 1, "contest_end_time": 1, "contest_statistics.total_participants": 1, "contest_problems": 1, "storage_version": 1, "contest_report_hash": 1},
+    )
+    if contest is None:
+        return
+    contest_report_hash = contest.pop("contest_report_hash", None)
+    contest_leaderboard, contest_submissions, contest_problems = get_contest_report_data(contest)
+    input_hash = hash_ai_input([contest, contest_submissions, contest_problems, contest_leaderboard])
+    if contest_report_hash == input_hash:
+        return
+
+    contest_summary, contest_improvement = generate_contest_report(contest, contest_submissions, contest_problems, contest_leaderboard)
+    if len(contest_summary) <= AI_MIN_REPORT_LENGTH and len(contest_improvement) <= AI_MIN_REPORT_LENGTH:
+        raise ValueError("Generated contest report is too short")
+    mongodb_client.contests.update_one(
+        {"contest_id": contest_id},
+        {
+            "$set": {
+                "contest_summary": contest_summary,
+                "contest_improvement": contest_improvement,
+                "contest_report_hash": input_hash,
+            }
+        },
+    )
+
+
+AI_JOBS = {"user_summary": generate_user_summary, "contest_report": generate_contest_summary}
+
+
+def retry_ai_job(job, error):
+    # Exponential backoff with jitter through the delayed set, the job is dropped after AI_MAX_ATTEMPTS
+    attempt = job["attempt"] + 1
+    if attempt >= AI_MAX_ATTEMPTS:
+        mongodb_client.system_logs.insert_one(
+            {
+                "log_id": str(uuid.uuid4()),
+                "log_type": "error",
+                "log_message": f"AI job {job['type']} failed",
+                "log_details": {"id": job["id"], "attempts": attempt, "error": str(error)},
+                "created_at": datetime.now(),
+            }
+        )
+        return
+    delay = AI_RETRY_BASE_DELAY * 2 ** job["attempt"] + random.uniform(0, AI_RETRY_BASE_DELAY)
+    redis_client.zadd(AI_DELAYED_KEY, {json.dumps({**job, "attempt": attempt}): time.time() + delay})
+
+
+def promote_due_ai_jobs():
+    # ZREM decides which worker moves a due job, so every job is queued once
+    for job in redis_client.zrangebyscore(AI_DELAYED_KEY, "-inf", time.time(), start=0, num=100):
+        if redis_client.zrem(AI_DELAYED_KEY, job):
+            redis_client.lpush(AI_QUEUE_KEY, job)
+
+
+def run_next_ai_job():
+    try:
+        promote_due_ai_jobs()
+        job = redis_client.brpoplpush(AI_QUEUE_KEY, AI_PROCESSING_KEY, timeout=5)
+    except redis.exceptions.RedisError as e:
+        print(f"AI queue unavailable: {e}")
+        time.sleep(5)
+        return
+    if job is None:
+        return
+    try:
+        ai_job = json.loads(job)
+        try:
+            AI_JOBS[ai_job["type"]](ai_job["id"])
+        except Exception as e:
+            print(f"AI job {ai_job['type']} for {ai_job['id']} failed (attempt {ai_job['attempt'] + 1}): {e}")
+            retry_ai_job(ai_job, e)
+    finally:
+        try:
+            redis_client.lrem(AI_PROCESSING_KEY, 1, job)
+        except redis.exceptions.RedisError as e:
+            print(f"Failed to remove AI job {job!r} from the processing list: {e}")
+
+
+def ai_worker_loop():
+    # Every error is logged and the loop goes on, a worker thread that ended would leave the pool short unnoticed
+    while True:
+        try:
+            run_next_ai_job()
+        except Exception as e:
+            print(f"AI worker error: {e!r}")
+            time.sleep(1)
+
+
 # Frontend endpoints
 
 @app.route("/users", methods=["GET"])
 def users():
     if session.get("is_authenticated") is None or session["user"]["user_account"]["role"] != "admin":
         return redirect(url_for("homepage"))
-    return render_template("users.html", users=list(mongodb_client.users.find({}, {"_id": 0})))
+    cursor = decode_page_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    users, next_cursor = get_admin_listing_page("users", cursor)
+    return render_template(
+        "users.html",
+        users=users,
+        next_cursor=next_cursor,
+        start=max(request.args.get("start", 1, type=int), 1),
+        page_size=ADMIN_PAGE_SIZE,
+    )
 
 @app.route("/users/<user_id>", methods=["GET"])
 def user(user_id):
-    user = mongodb_client.users.find_one({"user_account.user_id": user_id})
+    user = repository.find_user(user_id, ["user_account", "user_profile", "university_details", "user_summary"])
     if user is None:
         abort(404)
+    # Copy, the summary below is set on the user without touching the request's identity map
+    user = dict(user)
 
-    # Number of submissions by user 
-    total_submissions = mongodb_client.submissions.count_documents({"user_id": user["user_account"]["user_id"]})
-    # Number of accepted submissions by user
-    total_accepted_submissions = mongodb_client.submissions.count_documents({"user_id": user["user_account"]["user_id"], "submission_status.status_code": 3})
-    # Number of problems solved by user make unique by problem id
-    total_problems_solved = mongodb_client.submissions.distinct("problem_id", {"user_id": user["user_account"]["user_id"], "submission_status.status_code": 3})
-    total_problems_solved = len(total_problems_solved)
-    # Total number of problems
-    total_problems = mongodb_client.problems.count_documents({})
-
-    all_submissions = list(mongodb_client.submissions.find({"user_id": user["user_account"]["user_id"]}, {"_id": 0, 'submission_id': 1, 'problem_id': 1, 'language': 1, 'submission_status.status': 1}).sort("updated_at", -1))
-    # Add problem title to each submission only if the problem is a part of competition that has ended
-    for submission in all_submissions:
-        problem = mongodb_client.problems.find_one({"problem_id": submission["problem_id"]})
-        if problem is not None:
-            submission["problem_title"] = problem["problem_title"]
-            if problem["is_part_of_competition"]:
-                contest = mongodb_client.contests.find_one({"contest_id": problem["competition_id"]})
-                if contest is not None:
-                    if datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz) > datetime.now(tz=kolkata_tz):
-                        submission["problem_title"] = "Hidden Due to Access Restriction"
-            else:
-                submission["problem_title"] = "Hidden Due to Access Restriction"
-        else:
-            submission["problem_title"] = "Problem Not Found"
-
-    if user.get("user_summary") is None:
-        try:
-            generated_summary = requests.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={os.environ['GEMINI_API_KEY']}",
-                headers={"Content-Type": "application/json"},
-                data=json.dumps({
-                    "contents": [{"parts": [{"text": f"Generate a concise, two-sentence plain text summary of a user based on their display name and submissions. Return ONLY the two sentences, with absolutely no additional text, markdown, special characters, or newlines. Display name: {user['user_profile']['display_name']}, submissions: {list(all_submissions)}"}]}],
-                    "generationConfig": {
-                        "response_mime_type": "text/plain", # Ask for plain text
-                        "maxOutputTokens": 150  # Adjust as needed
-                    }
-                })
-            )
+    user_stats = get_user_stats(user["user_account"]["user_id"])
+    total_submissions = user_stats["total_submissions"]
+    total_accepted_submissions = user_stats["total_accepted_submissions"]
+    total_problems_solved = len(user_stats["solved_problem_ids"])
+    # Total number of problems, read from the collection metadata
+    total_problems = mongodb_client.problems.estimated_document_count()
 
-            
-            if generated_summary.status_code != 200:
-                user["user_summary"] = "Unable to generate summary due to API error."
-                print(f"API Error: {generated_summary.status_code} - {generated_summary.text}") # More informative error message
-            else:
-                user["user_summary"] = generated_summary.json()["candidates"][0]["content"]["parts"][0]["text"]
-                mongodb_client.users.update_one({"user_account.user_id": user["user_account"]["user_id"]}, {"$set": {"user_summary": user["user_summary"]}})  # Save the summary to the database
-        except requests.exceptions.RequestException as e:
-            user["user_summary"] = "Unable to generate summary due to a network error."
-            print(f"Network error: {e}")
-        except (KeyError, IndexError) as e:  #added error handling for missing keys or index out of range
-            user["user_summary"] = "Unable to generate summary due to unexpected API response format."
-            print(f"API response format error: {e}")
+    cursor = decode_page_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    all_submissions, next_cursor = get_submission_history_page(user["user_account"]["user_id"], cursor)
 
-    user["user_summary"] = user.get("user_summary", "No summary available.")
+    # Generated (or refreshed when the submissions changed) by the ai-worker
+    enqueue_ai_job("user_summary", user["user_account"]["user_id"])
+    user["user_summary"] = user.get("user_summary") or USER_SUMMARY_PLACEHOLDER
 
 
 
 
-    return render_template("user.html", user=user, total_submissions=total_submissions, total_accepted_submissions=total_accepted_submissions, total_problems_solved=total_problems_solved, total_problems=total_problems, all_submissions=all_submissions)
+    return render_template("user.html", user=user, total_submissions=total_submissions, total_accepted_submissions=total_accepted_submissions, total_problems_solved=total_problems_solved, total_problems=total_problems, all_submissions=all_submissions, next_cursor=next_cursor, is_first_page=cursor is None)
 
 @app.route("/", methods=["GET"])
 def homepage():
@@ -722,24 +2864,22 @@ def platform_information():
                 "platform_name": "A*",
                 "platform_version": "1.0.0",
                 "platform_statistic": {
-                    "total_problems": mongodb_client.problems.count_documents({}),
-                    "total_contests": mongodb_client.contests.count_documents({}),
-                    "total_submissions": mongodb_client.submissions.count_documents({}),
+                    "total_problems": mongodb_client.problems.estimated_document_count(),
+                    "total_contests": mongodb_client.contests.estimated_document_count(),
+                    "total_submissions": mongodb_client.submissions.estimated_document_count(),
                 },
                 "user_statistics": {
-                    "total_users": mongodb_client.users.count_documents({}),
-                    "users": list(
-                        mongodb_client.users.find({}, {"_id": 0, "user_account.created_at": 1, "user_account.primary_email": 1, "user_account.user_id": 1, "user_profile.display_name": 1}, sort=[("user_account.created_at", -1)])
-                    ),
+                    "total_users": mongodb_client.users.estimated_document_count(),
+                    "users_url": url_for("admin_listing_api", listing="users"),
+                    "export_url": url_for("admin_export_api", listing="users", format="csv"),
                 },
                 "submission_statistics": {
-                    "total_submissions": mongodb_client.submissions.count_documents({}),
-                    "submissions": list(
-                        mongodb_client.submissions.find({}, {"_id": 0, "language": 1, "problem_id" : 1, "updated_at": 1, "user_id": 1}, sort=[("updated_at", -1)])
-                    ),
+                    "total_submissions": mongodb_client.submissions.estimated_document_count(),
+                    "submissions_url": url_for("admin_listing_api", listing="submissions"),
+                    "export_url": url_for("admin_export_api", listing="submissions", format="csv"),
                 },
                 "external_api_statistics": {
-                    "total_api_calls": mongodb_client.submissions.count_documents({}),
+                    "total_api_calls": mongodb_client.submissions.estimated_document_count(),
                     "total_api_calls_today": mongodb_client.submissions.count_documents(
                         {
                             "created_at": {
@@ -749,6 +2889,10 @@ def platform_information():
                     ),
                     "error_rate_today": calculate_error_rate(),
                 },
+                "request_profiles": get_request_profiles(),
+                "slow_requests": list(
+                    mongodb_client.slow_requests.find({}, {"_id": 0}).sort("$natural", -1).limit(20)
+                ),
                 "platform_devlopers": [
                     {
                         "name": "Om Mishra",
@@ -759,6 +2903,40 @@ def platform_information():
         }
     )
 
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # Prometheus scrape target, reads Redis only. It exposes key ids, quotas and traffic, so it requires the
+    # METRICS_TOKEN bearer token and does not exist at all when no token is configured
+    metrics_token = os.getenv("METRICS_TOKEN")
+    if not metrics_token:
+        abort(404)
+    if not secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {metrics_token}"):
+        abort(401)
+
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.llen(JUDGE_QUEUE_KEY)
+    pipeline.llen(JUDGE_PROCESSING_KEY)
+    queue_depth, processing = pipeline.execute()
+    gauges = [
+        ("astar_judge_queue_depth", "Submissions in the judge queue lists.", {"queue": "queued"}, queue_depth),
+        ("astar_judge_queue_depth", "Submissions in the judge queue lists.", {"queue": "processing"}, processing),
+    ]
+    key_states = judge0_keys.get_key_states(redis_client, JUDGE0_KEYS)
+    gauges.extend(
+        ("astar_judge0_key_remaining", "Judge0 requests left in the current quota period, by key id.", {"key": key}, state["remaining"])
+        for key, state in key_states.items()
+        if state["remaining"] is not None
+    )
+    gauges.extend(
+        ("astar_judge0_key_cooling_down", "1 while a Judge0 key rests after a 429, by key id.", {"key": key}, int(state["cooling_down"]))
+        for key, state in key_states.items()
+    )
+    return Response(
+        metrics.render(redis_client, gauges),
+        mimetype="text/plain; version=0.0.4",
+    )
+
+
 @app.route("/login", methods=["GET"])
 def login():
     if session.get("is_authenticated"):
@@ -776,8 +2954,8 @@ def logout():
 
 @app.route("/announcements/<announcement_id>", methods=["GET"])
 def announcement(announcement_id):
-    announcement = mongodb_client.announcements.find_one(
-        {"announcement_id": announcement_id}
+    announcement = repository.find_announcement(
+        announcement_id, ["announcement_id", "announcement_title", "announcement_body", "is_active", "created_at"]
     )
     if announcement:
         return render_template("announcement.html", announcement=announcement)
@@ -843,7 +3021,10 @@ def problems():
 def problem(problem_id):
     if session.get("is_authenticated") is None:
         return redirect(url_for("login"))
-    problem = mongodb_client.problems.find_one({"problem_id": problem_id})
+    problem = repository.find_problem(
+        problem_id,
+        ["problem_id", "problem_title", "problem_description", "is_visible", "is_part_of_competition", "competition_id"],
+    )
     if problem:
         top_submissions = list(
             mongodb_client.submissions.aggregate(
@@ -910,10 +3091,13 @@ def problem(problem_id):
         
         if problem.get("is_visible") is False:
             if problem.get("is_part_of_competition"):
+                # One contest lookup, served from the request's identity map afterwards
+                contest = repository.find_contest(
+                    problem.get("competition_id"),
+                    ["contest_id", "contest_start_time", "contest_end_time", "storage_version"],
+                )
                 if datetime.strptime(
-                    mongodb_client.contests.find_one(
-                        {"contest_id": problem.get("competition_id")}
-                    )["contest_end_time"],
+                    contest["contest_end_time"],
                     "%Y-%m-%dT%H:%M",
                 ).replace(tzinfo=kolkata_tz) < datetime.now(tz=kolkata_tz):
                     mongodb_client.problems.update_one(
@@ -926,24 +3110,11 @@ def problem(problem_id):
                     )
                 else:
                     if datetime.strptime(
-                        mongodb_client.contests.find_one(
-                            {"contest_id": problem.get("competition_id")}
-                        )["contest_start_time"],
+                        contest["contest_start_time"],
                         "%Y-%m-%dT%H:%M",
                     ).replace(tzinfo=kolkata_tz) < datetime.now(
                         tz=kolkata_tz
-                    ) and session[
-                        "user"
-                    ][
-                        "user_account"
-                    ][
-                        "user_id"
-                    ] in [
-                        participant
-                        for participant in mongodb_client.contests.find_one(
-                            {"contest_id": problem.get("competition_id")}
-                        )["contest_statistics"]["contest_participants"]
-                    ]:
+                    ) and is_contest_participant(contest, session["user"]["user_account"]["user_id"]):
                         return render_template(
                             "individual-problem.html",
                             problem=problem,
@@ -959,7 +3130,7 @@ def problem(problem_id):
 @app.route("/contests", methods=["GET"])
 def contests():
     return render_template(
-        "contests.html", all_contests=list(mongodb_client.contests.find({}))
+        "contests.html", all_contests=list(mongodb_client.contests.find({}, LEGACY_CONTEST_FIELDS))
     )
 
 @app.route("/contests/<contest_id>", methods=["GET"])
@@ -971,7 +3142,18 @@ def contest(contest_id):
     has_contest_ended = False
     has_user_participated = False
     
-    contest = mongodb_client.contests.find_one({"contest_id": contest_id})
+    contest = repository.find_contest(
+        contest_id,
+        [
+            "contest_id",
+            "contest_title",
+            "contest_description",
+            "contest_start_time",
+            "contest_end_time",
+            "contest_problems",
+            "storage_version",
+        ],
+    )
     if contest:
         # Check contest start and end time
         if datetime.strptime(
@@ -996,56 +3178,20 @@ def contest(contest_id):
             has_contest_ended = True
         
         # Check if user has participated
-        has_user_participated = session["user"]["user_account"]["user_id"] in [
-            participant
-            for participant in contest["contest_statistics"]["contest_participants"]
-        ]
+        has_user_participated = is_contest_participant(contest, session["user"]["user_account"]["user_id"])
         
-        contest_problems = mongodb_client.problems.find(
-            {
-                "problem_id": {
-                    "$in": [
-                        contest["contest_problems"]["contest_first_problem"],
-                        contest["contest_problems"]["contest_second_problem"],
-                        contest["contest_problems"]["contest_third_problem"],
-                    ]
-                }
-            }
-        )
-
-        # Retrieve the leaderboard
-        contest_leaderboard = mongodb_client.contests.find_one(
-            {"contest_id": contest_id}
-        )["contest_statistics"]["contest_leaderboard"]
-
-        # Ensure contest_leaderboard is a dictionary (if it's a list)
-        if isinstance(contest_leaderboard, list):
-            contest_leaderboard = {
-                user["user_id"]: user for user in contest_leaderboard
-            }
-
-        # Calculate problems solved by each user
-        for user_id in contest_leaderboard:
-            contest_leaderboard[user_id]["problems_solved"] = sum(
-                1
-                for problem in contest_leaderboard[user_id]["problems"]
-                if contest_leaderboard[user_id]["problems"][problem][
-                    "has_accepted_submission"
-                ]
-            )
-            # Retrieve user profile data
-            contest_leaderboard[user_id]["profile"] = mongodb_client.users.find_one(
-                {"user_account.user_id": user_id}, {"_id": 0, "user_profile": 1}
-            )
+        contest_problems = repository.find_problems(
+            [
+                contest["contest_problems"]["contest_first_problem"],
+                contest["contest_problems"]["contest_second_problem"],
+                contest["contest_problems"]["contest_third_problem"],
+            ],
+            ["problem_id", "problem_title", "problem_level"],
+        ).values()
 
-        # Sort the leaderboard based on score
-        contest_leaderboard = dict(
-            sorted(
-                contest_leaderboard.items(),
-                key=lambda item: item[1]["score"],
-                reverse=True,
-            )
-        )
+        # Retrieve one page of the leaderboard from Redis
+        leaderboard_page = max(request.args.get("page", 1, type=int), 1)
+        contest_leaderboard, leaderboard_total = get_live_leaderboard_page(contest_id, leaderboard_page)
 
         # Return the appropriate response
         return render_template("individual-contest.html", 
@@ -1054,7 +3200,11 @@ def contest(contest_id):
                             has_contest_started=has_contest_started, 
                             has_contest_ended=has_contest_ended, 
                             has_user_participated=has_user_participated, 
-                            contest_problems=contest_problems)
+                            contest_problems=contest_problems,
+                            leaderboard_page=leaderboard_page,
+                            leaderboard_offset=(leaderboard_page - 1) * LEADERBOARD_PAGE_SIZE,
+                            leaderboard_page_size=LEADERBOARD_PAGE_SIZE,
+                            has_next_leaderboard_page=leaderboard_page * LEADERBOARD_PAGE_SIZE < leaderboard_total)
     return abort(404)
 
 
@@ -1101,7 +3251,7 @@ def create_contest():
             )
         )
         
-        previous_contests = list(mongodb_client.contests.find({}, {"_id": 0}))
+        previous_contests = list(mongodb_client.contests.find({}, {"_id": 0, **LEGACY_CONTEST_FIELDS}))
         return render_template(
             "create_contest.html",
             problems=problems,
@@ -1118,108 +3268,30 @@ def contest_results(contest_id):
     if session["user"]["user_account"]["role"] != "admin":
         return redirect(url_for("homepage"))
     
-    contest = mongodb_client.contests.find_one({"contest_id": contest_id}, {"_id": 0, "contest_id": 1, "contest_title": 1, "contest_start_time": 1, "contest_end_time": 1, "contest_statistics": 1, "contest_problems": 1, "contest_summary": 1, "contest_improvement": 1})
+    contest = mongodb_client.contests.find_one({"contest_id": contest_id}, {"_id": 0, "contest_id": 1, "contest_title": 1, "contest_start_time": 1, "contest_end_time": 1, "contest_statistics.total_participants": 1, "contest_problems": 1, "contest_summary": 1, "contest_improvement": 1, "storage_version": 1})
     if contest:
-        contest_leaderboard = mongodb_client.contests.find_one(
-            {"contest_id": contest_id}
-        )["contest_statistics"]["contest_leaderboard"]
-
         # Ensure the contest has ended
         if datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz) > datetime.now(tz=kolkata_tz):
             return redirect(url_for("contest", contest_id=contest_id))
 
-        # Ensure contest_leaderboard is a dictionary (if it's a list)
-        if isinstance(contest_leaderboard, list):
-            contest_leaderboard = {
-                user["user_id"]: user for user in contest_leaderboard
-            }
-
-        # Calculate problems solved by each user
-        for user_id in contest_leaderboard:
-            contest_leaderboard[user_id]["problems_solved"] = sum(
-                1
-                for problem in contest_leaderboard[user_id]["problems"]
-                if contest_leaderboard[user_id]["problems"][problem][
-                    "has_accepted_submission"
-                ]
-            )
-            # Retrieve user profile data
-            contest_leaderboard[user_id]["profile"] = mongodb_client.users.find_one(
-                {"user_account.user_id": user_id}, {"_id": 0, "user_profile": 1}
-            )
-
-        # Sort the leaderboard based on score
-        contest_leaderboard = dict(
-            sorted(
-                contest_leaderboard.items(),
-                key=lambda item: item[1]["score"],
-                reverse=True,
-            )
-        )
-
-        # Get all submissions for the contest by looping thorough all the problems of the contest then checking submissisons for the ptobelm id in the contest timeframe and at end cchecking if the user had participated in it 
-        contest_submissions = []
-        number_of_passed_submissions = 0
-        number_of_failed_submissions = 0
-
-
-        for problem_id in contest["contest_problems"].values():
-            submissions = list(
-                mongodb_client.submissions.find(
-                    {
-                        "problem_id": problem_id,
-                        "user_id": {"$in": contest["contest_statistics"]["contest_participants"]},
-                        "created_at": {
-                            "$gte": datetime.strptime(contest["contest_start_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz),
-                            "$lt": datetime.strptime(contest["contest_end_time"], "%Y-%m-%dT%H:%M").replace(tzinfo=kolkata_tz),
-                        }
-                    },
-                    {"_id": 0, "problem_id": 1, "user_id": 1, "submission_status": 1, "language": 1, "created_at": 1},
-                )
-            )
-
-
-            for submission in submissions:
-                contest_submissions.append(submission)
-                if submission["submission_status"]["status_code"] == 3:
-                    number_of_passed_submissions += 1
-                else:
-                    number_of_failed_submissions += 1
-
-        # Get title of all contest problems and thier difficulty 
-
-        contest_problems = list(
-            mongodb_client.problems.find(
-                {
-                    "problem_id": {
-                        "$in": [
-                            contest["contest_problems"]["contest_first_problem"],
-                            contest["contest_problems"]["contest_second_problem"],
-                            contest["contest_problems"]["contest_third_problem"],
-                        ]
-                    }
-                },
-                {"_id": 0, "problem_title": 1, "problem_description": 1, "problem_level": 1},
-            )
+        contest_leaderboard, contest_submissions, contest_problems = get_contest_report_data(contest)
+        number_of_passed_submissions = sum(
+            1 for submission in contest_submissions if submission["submission_status"]["status_code"] == 3
         )
+        number_of_failed_submissions = len(contest_submissions) - number_of_passed_submissions
 
-        # Check if the contest has a summary and improvement field if not make a request to Gemini to generate a report
-        if contest.get("contest_summary") is None or contest.get("contest_improvement") is None:
-            while True:
-                contest_summary, contest_improvement = generate_contest_report(contest, contest_submissions, contest_problems, contest_leaderboard)
-                if len(contest_summary) > 200 or len(contest_improvement) > 200:
-                    break
-            mongodb_client.contests.update_one(
-                {"contest_id": contest_id},
-                {
-                    "$set": {
-                        "contest_summary": contest_summary,
-                        "contest_improvement": contest_improvement
-                    }
-                }
-            )
+        # Plagiarism clusters from the offline contest plagiarism job, with names resolved for display
+        plagiarism_report = mongodb_client.contest_plagiarism_reports.find_one({"contest_id": contest_id}, {"_id": 0})
+        if plagiarism_report is not None:
+            problem_titles = {problem["problem_id"]: problem["problem_title"] for problem in contest_problems}
+            for cluster in plagiarism_report["clusters"]:
+                cluster["problem_title"] = problem_titles.get(cluster["problem_id"], "Problem Not Found")
+                for member in cluster["members"]:
+                    profile = (contest_leaderboard.get(member["user_id"]) or {}).get("profile") or {}
+                    member["display_name"] = profile.get("user_profile", {}).get("display_name", member["user_id"])
 
-        contest =  mongodb_client.contests.find_one({"contest_id": contest_id}, {"_id": 0, "contest_id": 1, "contest_title": 1, "contest_start_time": 1, "contest_end_time": 1, "contest_statistics": 1, "contest_problems": 1, "contest_summary": 1, "contest_improvement": 1})
+        # The report is generated (or refreshed when the contest data changed) by the ai-worker
+        enqueue_ai_job("contest_report", contest_id)
 
         # For all users in the leaderboard get if any of the submissions are similar to the other submissions by checking all submissions of the user in the contest and checking if any of them have is_similar set to true
         for user_id in contest_leaderboard:
@@ -1244,7 +3316,7 @@ def contest_results(contest_id):
                         break
 
 
-        return render_template("contest-results.html", contest=contest, contest_leaderboard=contest_leaderboard, contest_submissions=contest_submissions, number_of_passed_submissions=number_of_passed_submissions, number_of_failed_submissions=number_of_failed_submissions, contest_problems=contest_problems, contest_summary=format_ai_text(contest["contest_summary"]), contest_improvement=format_ai_text(contest["contest_improvement"]))
+        return render_template("contest-results.html", contest=contest, contest_leaderboard=contest_leaderboard, contest_submissions=contest_submissions, number_of_passed_submissions=number_of_passed_submissions, number_of_failed_submissions=number_of_failed_submissions, contest_problems=contest_problems, contest_summary=format_ai_text(contest.get("contest_summary") or CONTEST_REPORT_PLACEHOLDER), contest_improvement=format_ai_text(contest.get("contest_improvement") or CONTEST_REPORT_PLACEHOLDER), plagiarism_report=plagiarism_report)
 
 # Maintainance endpoints
 @app.route("/api/v1/health", methods=["GET"])
@@ -1260,20 +3332,25 @@ def external_handler():
 
     code = request.args.get("code")
 
-    oauth_response = requests.post(
-        "https://accounts.om-mishra.com/api/v1/oauth2/user-info",
-        headers={
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-        },
-        json={
-            "client_id": os.getenv("CLIENT_ID"),
-            "client_secret": os.getenv("CLIENT_SECRET"),
-            "code": code,
-        },
-    )
+    try:
+        oauth_response = http_client.post(
+            "oauth",
+            "https://accounts.om-mishra.com/api/v1/oauth2/user-info",
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+            },
+            json={
+                "client_id": os.getenv("CLIENT_ID"),
+                "client_secret": os.getenv("CLIENT_SECRET"),
+                "code": code,
+            },
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"OAuth request failed: {e}")
+        oauth_response = None
 
-    if oauth_response.status_code != 200:
+    if oauth_response is None or oauth_response.status_code != 200:
         return redirect(
             url_for(
                 "index",
@@ -1314,6 +3391,9 @@ def external_handler():
         session["user"] = mongodb_client.users.find_one(
             {"user_account.primary_email": user_data["user_account"]["user_primary_email"]}, {"_id": 0}
         )
+        if update_result.upserted_id is not None:
+            create_user_stats(session["user"]["user_account"]["user_id"])
+            invalidate_context_cache("new_users")
         return redirect(url_for("homepage"))
 
     return (
@@ -1372,14 +3452,19 @@ def update_university_details():
             )
 
         if student_id and student_photo:
-            response = requests.post(
-                "https://api.cdn.om-mishra.com/v1/upload-file",
-                headers={"X-Authorization": "eyJhbG"},
-                files={"file": request.files.get("profilePicture")},
-                data={"object_path": f"users/{session['user']['user_account']['user_id']}/profile_picture/{uuid.uuid4()}.{student_photo.filename.split('.')[-1]}"},
-            )
+            try:
+                response = http_client.post(
+                    "cdn",
+                    "https://api.cdn.om-mishra.com/v1/upload-file",
+                    headers={"X-Authorization": "eyJhbG"},
+                    files={"file": request.files.get("profilePicture")},
+                    data={"object_path": f"users/{session['user']['user_account']['user_id']}/profile_picture/{uuid.uuid4()}.{student_photo.filename.split('.')[-1]}"},
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"Image upload failed: {e}")
+                response = None
 
-            if response.status_code != 200:
+            if response is None or response.status_code != 200:
                 return jsonify({'status': 'error', 'message': 'Failed to upload image!'}), 500
             
             image_url = response.json().get('file_url')
@@ -1396,6 +3481,12 @@ def update_university_details():
             )
 
             session["user"]["user_profile"]["avatar_url"] = image_url
+            mongodb_client.global_leaderboard.update_one(
+                {"user_id": session["user"]["user_account"]["user_id"]},
+                {"$set": {"profile.user_profile.avatar_url": image_url}},
+            )
+            redis_client.hdel(LEADERBOARD_PROFILES_KEY, session["user"]["user_account"]["user_id"])
+            invalidate_context_cache("global_leaderboard", "new_users")
 
             return jsonify(
                 {
@@ -1446,6 +3537,7 @@ def create_announcement_api():
                     "is_active": True,
                 }
             )
+            invalidate_context_cache("announcements")
             return redirect(url_for("create_announcement"))
         return (
             jsonify(
@@ -1474,6 +3566,7 @@ def toogle_visibility():
                 {"announcement_id": announcement_id},
                 {"$set": {"is_active": not announcement["is_active"]}},
             )
+            invalidate_context_cache("announcements")
             return redirect(url_for("announcement", announcement_id=announcement_id))
         return redirect(url_for(request.url))
     return (
@@ -1518,8 +3611,6 @@ def create_problem_api():
                     "problem_id": problem_id,
                     "problem_title": problem_title,
                     "problem_description": problem_description,
-                    "problem_stdin": problem_stdin.strip(),
-                    "problem_stdout": problem_stdout.strip(),
                     "problem_level": problem_level,
                     "problem_tags": [tag.strip() for tag in problem_tags.split(",")],
                     "created_at": datetime.now(),
@@ -1533,6 +3624,10 @@ def create_problem_api():
                     },
                 }
             )
+            # The stdin/stdout pair is the first test case, more can be added through the test cases API
+            replace_problem_test_cases(
+                problem_id, [{"stdin": problem_stdin.strip(), "expected_output": problem_stdout.strip()}]
+            )
             
             return redirect(f"/problems/{problem_id}")
         return (
@@ -1549,13 +3644,13 @@ def create_problem_api():
 
 @app.route("/api/v1/submissions", methods=["POST"])
 def create_submission():
-    is_similar = False
     if session.get("is_authenticated"):
         last_submission = mongodb_client.submissions.find_one(
             {
                 "user_id": session["user"]["user_account"]["user_id"],
                 "created_at": {"$gte": datetime.now() - timedelta(seconds=10)},
-            }
+            },
+            {"_id": 1},
         )
         if last_submission:
             return (
@@ -1570,123 +3665,63 @@ def create_submission():
             )
         problem_id = request.json.get("problem_id")
         code = request.json.get("code")
-        if problem_id and code:
-            problem = mongodb_client.problems.find_one({"problem_id": problem_id})
+        if problem_id and isinstance(code, str) and code:
+            problem = mongodb_client.problems.find_one(
+                {"problem_id": problem_id}, {"_id": 0, "problem_id": 1, "is_part_of_competition": 1, "competition_id": 1}
+            )
             if problem:
-                # Prepare data to send to Judge0 in base64 encoded format
-                judge0_payload = {
-                    "source_code": code,
-                    "stdin": base64.b64encode(
-                        problem.get("problem_stdin", "").encode()
-                    ).decode(),
-                    "expected_output": base64.b64encode(
-                        problem.get("problem_stdout", "").encode()
-                    ).decode(),
-                    "language_id": get_language_id(
-                        request.json.get("language", "python")
-                    ),
-                }
-
-                # Send submission to the Judge0 API
-                judge0_response = requests.post(
-                    "https://judge0-ce.p.rapidapi.com/submissions?base64_encoded=true",
-                    json=judge0_payload,
-                    headers={
-                        "Content-Type": "application/json",
-                        'x-rapidapi-key': random.choice(os.getenv("API_KEY").split(",")),
-                        'x-rapidapi-host': "judge0-ce.p.rapidapi.com",
-                    },
-                )
-
-                # Check if the submission was successful
-                if judge0_response.status_code == 201:
-                    mongodb_client.system_logs.insert_one(
-                        {
-                            "log_id": str(uuid.uuid4()),
-                            "log_type": "info",
-                            "log_message": "Submitted to execution server",
-                            "log_details": judge0_response.json(),
-                            "created_at": datetime.now(),
-                        }
-                    )
-                    submission_id = str(uuid.uuid4())
-                    
-                    # Check if there's similar code in previous submissions
-                    existing_submissions = mongodb_client.submissions.find({
-                        "problem_id": problem_id
-                    })
-                    
-                    for submission in existing_submissions:
-                        existing_code = submission["code"]
-                        if is_code_similar(code, existing_code) and submission["user_id"] != session["user"]["user_account"]["user_id"]:
-                            is_similar = True
-                            break
-                            
-                    
-                    # Proceed with inserting the submission
-                    mongodb_client.submissions.insert_one(
-                        {
-                            "submission_id": submission_id,
-                            "judge0_submission_id": judge0_response.json()["token"],
-                            "problem_id": problem_id,
-                            "user_id": session["user"]["user_account"]["user_id"],
-                            "code": code,
-                            "language": request.json.get("language", "python"),
-                            "submission_status": {
-                                "status_code": 0,
-                                "status": "In Queue",
-                                "time": 0,
-                                "memory": 0,
-                            },
-                            "user_activity": {
-                                "key_strokes": request.json.get("key_strokes", 0),
-                                "focus_events": request.json.get("focus_events", 0),
-                            },
-                            "is_similar": is_similar,
-                            "created_at": datetime.now(),
-                            "updated_at": datetime.now(),
-                            "is_removed": False,
-                        }
-                    )
+                submission_id = str(uuid.uuid4())
 
-                    mongodb_client.problems.update_one(
-                        {"problem_id": problem_id},
-                        {
-                            "$inc": {
-                                "problem_statistics.total_submissions": 1,
-                            }
+                # Proceed with inserting the submission, the judge worker judges it and runs the similarity check
+                created_at = datetime.now()
+                mongodb_client.submissions.insert_one(
+                    {
+                        "submission_id": submission_id,
+                        "judge0_submission_id": None,
+                        "problem_id": problem_id,
+                        "contest_id": problem["competition_id"] if problem.get("is_part_of_competition") else None,
+                        "user_id": session["user"]["user_account"]["user_id"],
+                        # Resubmitting the same code stores no new source
+                        "code_blob": blobs.put(code),
+                        "language": request.json.get("language", "python"),
+                        "submission_status": {
+                            "status_code": 0,
+                            "status": "In Queue",
+                            "time": 0,
+                            "memory": 0,
                         },
-                    )
-
-                    return jsonify(
-                        {
-                            "response_code": 200,
-                            "message": "Submission created",
-                            "submission_id": submission_id,
-                            "submission_result_url": f"/api/v1/submissions/{submission_id}",
-                        }
-                    )
-
-                else:
-                    mongodb_client.system_logs.insert_one(
-                        {
-                            "log_id": str(uuid.uuid4()),
-                            "log_type": "error",
-                            "log_message": "Failed to submit to execution server",
-                            "log_details": judge0_response.json(),
-                            "created_at": datetime.now(),
-                        }
-                    )
-                    return (
-                        jsonify(
-                            {
-                                "response_code": 500,
-                                "message": "Failed to submit to execution server",
-                                "details": judge0_response.json(),
-                            }
-                        ),
-                        500,
-                    )
+                        "user_activity": {
+                            "key_strokes": request.json.get("key_strokes", 0),
+                            "focus_events": request.json.get("focus_events", 0),
+                        },
+                        "is_similar": False,
+                        "judging_state": "queued",
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                        "is_removed": False,
+                    }
+                )
+
+                mongodb_client.problems.update_one(
+                    {"problem_id": problem_id},
+                    {
+                        "$inc": {
+                            "problem_statistics.total_submissions": 1,
+                        }
+                    },
+                )
+                record_daily_submission(created_at)
+                record_user_submission(session["user"]["user_account"]["user_id"])
+                enqueue_submission(submission_id)
+
+                return jsonify(
+                    {
+                        "response_code": 200,
+                        "message": "Submission created",
+                        "submission_id": submission_id,
+                        "submission_result_url": f"/api/v1/submissions/{submission_id}",
+                    }
+                )
 
             return (
                 jsonify(
@@ -1725,94 +3760,22 @@ def create_submission():
 @app.route("/api/v1/submissions/<submission_id>", methods=["GET"])
 def get_submission(submission_id):
     if session.get("is_authenticated"):
+        # Verdicts are written by the judging pipeline, polling only reads the stored status
         submission = mongodb_client.submissions.find_one(
-            {"submission_id": submission_id}
+            {"submission_id": submission_id},
+            {"_id": 0, "user_id": 1, "submission_status": 1, "submission_output": 1},
         )
         if (
             submission
             and submission["user_id"] == session["user"]["user_account"]["user_id"]
         ):
-
-            judge0_response = requests.get(
-                f"https://judge0-ce.p.rapidapi.com/submissions/{submission['judge0_submission_id']}?fields=stdout,stderr,status,time,memory",
-                headers={
-                    'x-rapidapi-key': random.choice(os.getenv("API_KEY").split(",")),
-                    'x-rapidapi-host': "judge0-ce.p.rapidapi.com",
-                },
-            )
-
-
-            if judge0_response.status_code == 200:
-
-                number_of_passed_test_cases = compare_output(
-                    judge0_response.json()["stdout"], submission["problem_id"]
-                )
-
-                submission_status = judge0_response.json()
-                
-
-                submission["submission_status"] = {
-                    "status_code": submission_status["status"]["id"],
-                    "status": submission_status["status"]["description"],
-                    "time": submission_status["time"],
-                    "memory": submission_status["memory"],
-                    "number_of_passed_test_cases": number_of_passed_test_cases,
+            return jsonify(
+                {
+                    "response_code": 200,
+                    "data": format_submission_result(submission),
+                    "identifier": str(uuid.uuid4()),
                 }
-                mongodb_client.submissions.update_one(
-                    {"submission_id": submission_id},
-                    {"$set": {"submission_status": submission["submission_status"]}},
-                )
-                if submission_status["status"]["id"] == 3:
-                    mongodb_client.problems.update_one(
-                        {"problem_id": submission["problem_id"]},
-                        {
-                            "$inc": {
-                                "problem_statistics.total_accepted_submissions": 1,
-                            }
-                        },
-                    )
-                    add_competition_submission(submission_id)
-                    return jsonify(
-                        {
-                            "response_code": 200,
-                            "data": submission_status,
-                            "identifier": str(uuid.uuid4()),
-                        }
-                    )
-                elif submission_status["stdout"] != None:
-                    mongodb_client.problems.update_one(
-                        {"problem_id": submission["problem_id"]},
-                        {
-                            "$inc": {
-                                "problem_statistics.total_rejected_submissions": 1,
-                            }
-                        },
-                    )
-                    submission_status[
-                        "number_of_passed_test_cases"
-                    ] = number_of_passed_test_cases
-                    add_competition_submission(submission_id)
-
-                    return jsonify(
-                        {
-                            "response_code": 200,
-                            "data": submission_status,
-                            "identifier": str(uuid.uuid4()),
-                        }
-                    )
-                else:
-                    add_competition_submission(submission_id)
-
-                    return (
-                        jsonify(
-                            {
-                                "response_code": 200,
-                                "data": submission_status,
-                                "identifier": str(uuid.uuid4()),
-                            }
-                        ),
-                        200,
-                    )
+            )
 
         return (
             jsonify(
@@ -1836,6 +3799,58 @@ def get_submission(submission_id):
     )
 
 
+@app.route("/api/v1/events", methods=["GET"])
+def event_stream():
+    # Pushes verdicts of the user's submissions and, with ?contest_id=, rank changes of that contest
+    if session.get("is_authenticated"):
+        channels = [f"events:user:{session['user']['user_account']['user_id']}"]
+        if request.args.get("contest_id"):
+            channels.append(f"events:contest:{request.args.get('contest_id')}")
+        return Response(
+            events.stream(redis_client.pubsub(ignore_subscribe_messages=True), channels),
+            mimetype="text/event-stream",
+            headers={"X-Accel-Buffering": "no"},
+        )
+    return (
+        jsonify(
+            {
+                "response_code": 401,
+                "message": "Unauthorized",
+                "identifier": str(uuid.uuid4()),
+            }
+        ),
+        401,
+    )
+
+
+@app.route("/api/v1/judge0/callback/<submission_id>", methods=["PUT", "POST"])
+def judge0_callback(submission_id):
+    submission = mongodb_client.submissions.find_one(
+        {"submission_id": submission_id}, {"_id": 0, "callback_secret": 1}
+    )
+    if submission is None or not secrets.compare_digest(
+        submission.get("callback_secret") or "", request.args.get("secret", "")
+    ):
+        return (
+            jsonify(
+                {
+                    "response_code": 404,
+                    "message": "Submission not found",
+                    "identifier": str(uuid.uuid4()),
+                }
+            ),
+            404,
+        )
+
+    case_index = request.args.get("case", type=int)
+    if case_index is None:
+        # Single submissions dispatched before test sets
+        finalize_submission(submission_id, request.get_json(silent=True) or {})
+    else:
+        record_judge0_case_result(submission_id, case_index, request.get_json(silent=True) or {})
+    return jsonify({"response_code": 200, "message": "OK", "identifier": str(uuid.uuid4())})
+
+
 def get_language_id(language):
     # Map your languages to Judge0 language IDs
     language_map = {
@@ -1849,6 +3864,242 @@ def get_language_id(language):
     return language_map.get(language, 34)  # Default to Python
 
 
+@app.route("/api/v1/contests/<contest_id>/leaderboard", methods=["GET"])
+def contest_leaderboard_api(contest_id):
+    if session.get("is_authenticated"):
+        page = max(request.args.get("page", 1, type=int), 1)
+        page_size = min(max(request.args.get("page_size", LEADERBOARD_PAGE_SIZE, type=int), 1), 100)
+        contest_leaderboard, total = get_live_leaderboard_page(contest_id, page, page_size)
+        return jsonify(
+            {
+                "response_code": 200,
+                "data": {
+                    "entries": [
+                        {"rank": (page - 1) * page_size + index + 1, "user_id": user_id, **entry}
+                        for index, (user_id, entry) in enumerate(contest_leaderboard.items())
+                    ],
+                    "page": page,
+                    "page_size": page_size,
+                    "total": total,
+                },
+                "identifier": str(uuid.uuid4()),
+            }
+        )
+    return (
+        jsonify(
+            {
+                "response_code": 401,
+                "message": "Unauthorized",
+                "identifier": str(uuid.uuid4()),
+            }
+        ),
+        401,
+    )
+
+
+def parse_test_cases(data):
+    # Validated test cases from a test cases API request body, or an error message
+    test_cases = data.get("test_cases") if isinstance(data, dict) else None
+    if not isinstance(test_cases, list) or not 0 < len(test_cases) <= MAX_TEST_CASES:
+        return None, f"Between 1 and {MAX_TEST_CASES} test cases are required"
+    parsed = []
+    for index, test_case in enumerate(test_cases):
+        if not isinstance(test_case, dict) or not isinstance(test_case.get("stdin"), str) or not isinstance(test_case.get("expected_output"), str):
+            return None, f"Test case {index + 1} must have stdin and expected_output strings"
+        limits = {limit: test_case[limit] for limit in TEST_CASE_LIMITS if test_case.get(limit) is not None}
+        if any(isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0 for value in limits.values()):
+            return None, f"Limits of test case {index + 1} must be positive numbers"
+        parsed.append({"stdin": test_case["stdin"], "expected_output": test_case["expected_output"], **limits})
+    return parsed, None
+
+
+@app.route("/api/v1/problems/<problem_id>/test-cases", methods=["GET", "PUT"])
+def problem_test_cases_api(problem_id):
+    if session.get("is_authenticated") and session["user"]["user_account"]["role"] == "admin":
+        if request.method == "PUT":
+            test_cases, error = parse_test_cases(request.get_json(silent=True))
+            if error:
+                return (
+                    jsonify(
+                        {
+                            "response_code": 400,
+                            "message": error,
+                            "identifier": str(uuid.uuid4()),
+                        }
+                    ),
+                    400,
+                )
+            checker = None
+            if request.get_json().get("checker") is not None:
+                checker, error = parse_checker(request.get_json()["checker"])
+                if error:
+                    return (
+                        jsonify(
+                            {
+                                "response_code": 400,
+                                "message": error,
+                                "identifier": str(uuid.uuid4()),
+                            }
+                        ),
+                        400,
+                    )
+            if replace_problem_test_cases(problem_id, test_cases, bool(request.get_json().get("fail_fast")), checker) is None:
+                return (
+                    jsonify(
+                        {
+                            "response_code": 404,
+                            "message": "Problem not found",
+                            "identifier": str(uuid.uuid4()),
+                        }
+                    ),
+                    404,
+                )
+
+        test_cases, fail_fast, _ = get_problem_test_cases(problem_id, load_data=False)
+        if test_cases is None:
+            return (
+                jsonify(
+                    {
+                        "response_code": 404,
+                        "message": "Problem not found",
+                        "identifier": str(uuid.uuid4()),
+                    }
+                ),
+                404,
+            )
+        # Sizes only, hidden test data is never sent back
+        checker = (repository.find_problem(problem_id, ["checker"]) or {}).get("checker") or {"mode": "lines"}
+        return jsonify(
+            {
+                "response_code": 200,
+                "data": {
+                    "fail_fast": fail_fast,
+                    "checker": {field: value for field, value in checker.items() if field != "source_code"},
+                    "test_cases": [
+                        {
+                            "stdin_length": test_case_length(test_case, "stdin"),
+                            "expected_output_length": test_case_length(test_case, "expected_output"),
+                            **{limit: test_case.get(limit) for limit in TEST_CASE_LIMITS},
+                        }
+                        for test_case in test_cases
+                    ],
+                },
+                "identifier": str(uuid.uuid4()),
+            }
+        )
+    return (
+        jsonify(
+            {
+                "response_code": 401,
+                "message": "Unauthorized",
+                "identifier": str(uuid.uuid4()),
+            }
+        ),
+        401,
+    )
+
+
+@app.route("/api/v1/admin/<any(users, submissions):listing>", methods=["GET"])
+def admin_listing_api(listing):
+    if session.get("is_authenticated") and session["user"]["user_account"]["role"] == "admin":
+        cursor = None
+        if request.args.get("cursor"):
+            cursor = decode_page_cursor(request.args["cursor"])
+            if cursor is None:
+                return (
+                    jsonify(
+                        {
+                            "response_code": 400,
+                            "message": "Invalid cursor",
+                            "identifier": str(uuid.uuid4()),
+                        }
+                    ),
+                    400,
+                )
+        limit = min(max(request.args.get("limit", ADMIN_PAGE_SIZE, type=int), 1), ADMIN_MAX_PAGE_SIZE)
+        documents, next_cursor = get_admin_listing_page(listing, cursor, limit)
+        return jsonify(
+            {
+                "response_code": 200,
+                "data": {
+                    listing: [flatten_listing_document(listing, document) for document in documents],
+                    "next_cursor": next_cursor,
+                },
+                "identifier": str(uuid.uuid4()),
+            }
+        )
+    return (
+        jsonify(
+            {
+                "response_code": 401,
+                "message": "Unauthorized",
+                "identifier": str(uuid.uuid4()),
+            }
+        ),
+        401,
+    )
+
+
+@app.route("/api/v1/admin/<any(users, submissions):listing>/export", methods=["GET"])
+def admin_export_api(listing):
+    if session.get("is_authenticated") and session["user"]["user_account"]["role"] == "admin":
+        export_format = request.args.get("format", "ndjson")
+        if export_format not in ("ndjson", "csv"):
+            return (
+                jsonify(
+                    {
+                        "response_code": 400,
+                        "message": "Format must be ndjson or csv",
+                        "identifier": str(uuid.uuid4()),
+                    }
+                ),
+                400,
+            )
+        return Response(
+            stream_admin_listing(listing, export_format),
+            mimetype="text/csv" if export_format == "csv" else "application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={listing}.{export_format}"},
+        )
+    return (
+        jsonify(
+            {
+                "response_code": 401,
+                "message": "Unauthorized",
+                "identifier": str(uuid.uuid4()),
+            }
+        ),
+        401,
+    )
+
+
+@app.route("/api/v1/contests/<contest_id>/leaderboard/me", methods=["GET"])
+def contest_leaderboard_rank_api(contest_id):
+    if session.get("is_authenticated"):
+        rank = get_live_leaderboard_rank(contest_id, session["user"]["user_account"]["user_id"])
+        if rank is None:
+            return (
+                jsonify(
+                    {
+                        "response_code": 404,
+                        "message": "You are not on the leaderboard",
+                        "identifier": str(uuid.uuid4()),
+                    }
+                ),
+                404,
+            )
+        return jsonify({"response_code": 200, "data": rank, "identifier": str(uuid.uuid4())})
+    return (
+        jsonify(
+            {
+                "response_code": 401,
+                "message": "Unauthorized",
+                "identifier": str(uuid.uuid4()),
+            }
+        ),
+        401,
+    )
+
+
 @app.route("/api/v1/create-contest", methods=["POST"])
 def create_contest_api():
     if (
@@ -1899,9 +4150,8 @@ def create_contest_api():
                             contest_second_problem: 0,
                             contest_third_problem: 0,
                         },
-                        "contest_participants": [],
-                        "contest_leaderboard": [],
                     },
+                    "storage_version": CONTEST_STORAGE_VERSION,
                 }
             )
             mongodb_client.problems.update_one(
@@ -1934,6 +4184,7 @@ def create_contest_api():
                 },
             )
 
+            invalidate_context_cache("contests")
             return redirect(url_for("create_contest"))
         return (
             jsonify(
@@ -1951,27 +4202,10 @@ def create_contest_api():
 @app.route("/api/v1/contest/register/<contest_id>", methods=["POST"])
 def register_contest(contest_id):
     if session.get("is_authenticated"):
-        contest = mongodb_client.contests.find_one({"contest_id": contest_id})
+        contest = repository.find_contest(contest_id, ["contest_id", "storage_version"])
 
         if contest:
-            if session["user"]["user_account"]["user_id"] not in [
-                participant
-                for participant in contest["contest_statistics"]["contest_participants"]
-            ]:
-                mongodb_client.contests.update_one(
-                    {"contest_id": contest_id},
-                    {
-                        "$push": {
-                            "contest_statistics.contest_participants": session["user"][
-                                "user_account"
-                            ]["user_id"]
-                        },
-                        "$inc": {
-                            "contest_statistics.total_participants": 1,
-                        },
-                    },
-                )
-                return redirect(url_for("contest", contest_id=contest_id))
+            register_contest_participant(contest, session["user"]["user_account"]["user_id"])
             return redirect(url_for("contest", contest_id=contest_id))
         return redirect(url_for("contests"))
     return (
@@ -2026,6 +4260,341 @@ def create_ai_problem():
 
 
 
+# CLI commands
+@app.cli.command("ensure-indexes")
+def ensure_indexes_command():
+    """Create every index of the index manifest."""
+    failed_collections = ensure_indexes()
+    if failed_collections:
+        raise click.ClickException(f"Failed to create indexes on {', '.join(failed_collections)}")
+    click.echo(f"Indexes are up to date on {len(MONGODB_INDEXES)} collections")
+
+
+def winning_plan_stages(explain):
+    # Stage names of every winning plan in an explain() output, aggregations nest one per $cursor stage
+    stages = []
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                stages.extend(plan_stages(value))
+            elif key != "rejectedPlans":
+                stages.extend(winning_plan_stages(value))
+    elif isinstance(explain, list):
+        for value in explain:
+            stages.extend(winning_plan_stages(value))
+    return stages
+
+
+def plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+@app.cli.command("verify-query-plans")
+def verify_query_plans_command():
+    """Explain every hot query and fail if any of them scans a whole collection."""
+    now = datetime.now()
+    hot_queries = {
+        "submissions: rate limit": lambda: mongodb_client.submissions.find(
+            {"user_id": "", "created_at": {"$gte": now - timedelta(seconds=10)}}
+        ).limit(1).explain(),
+        "submissions: user history": lambda: mongodb_client.submissions.find({"user_id": ""}).explain(),
+        "submissions: by id": lambda: mongodb_client.submissions.find({"submission_id": ""}).explain(),
+        "submissions: top submissions": lambda: mongodb_client.command(
+            "aggregate",
+            "submissions",
+            pipeline=[
+                {"$match": {"problem_id": "", "submission_status.status_code": 3, "is_removed": False}},
+                {"$sort": {"submission_status.time": 1}},
+            ],
+            explain=True,
+        ),
+        "submissions: stale running": lambda: mongodb_client.submissions.find(
+            {"judging_state": "running", "judging_started_at": {"$lt": now}}
+        ).explain(),
+        "submissions: stale queued": lambda: mongodb_client.submissions.find(
+            {"judging_state": "queued", "created_at": {"$lt": now}}
+        ).explain(),
+        "user_stats: by user": lambda: mongodb_client.user_stats.find({"user_id": ""}).explain(),
+        "submissions: history page": lambda: mongodb_client.submissions.find(
+            {"user_id": "", "$or": [{"created_at": {"$lt": now}}, {"created_at": now, "_id": {"$lt": ObjectId()}}]}
+        ).sort([("created_at", -1), ("_id", -1)]).limit(SUBMISSION_HISTORY_PAGE_SIZE + 1).explain(),
+        "users: by id": lambda: mongodb_client.users.find({"user_account.user_id": ""}).explain(),
+        "users: by email": lambda: mongodb_client.users.find({"user_account.primary_email": ""}).explain(),
+        "users: admin listing page": lambda: mongodb_client.users.find(
+            {"$or": [{"user_account.created_at": {"$lt": now}}, {"user_account.created_at": now, "_id": {"$lt": ObjectId()}}, {"user_account.created_at": None}]}
+        ).sort([("user_account.created_at", -1), ("_id", -1)]).limit(ADMIN_PAGE_SIZE + 1).explain(),
+        "submissions: admin listing page": lambda: mongodb_client.submissions.find(
+            {"$or": [{"created_at": {"$lt": now}}, {"created_at": now, "_id": {"$lt": ObjectId()}}, {"created_at": None}]}
+        ).sort([("created_at", -1), ("_id", -1)]).limit(ADMIN_PAGE_SIZE + 1).explain(),
+        "users: newest": lambda: mongodb_client.users.find().sort("user_account.created_at", -1).limit(5).explain(),
+        "problems: by id": lambda: mongodb_client.problems.find({"problem_id": ""}).explain(),
+        "problem_test_cases: test set": lambda: mongodb_client.problem_test_cases.find(
+            {"problem_id": "", "test_set_version": 1}
+        ).sort("case_index", ASCENDING).explain(),
+        "contests: by id": lambda: mongodb_client.contests.find({"contest_id": ""}).explain(),
+        "contests: ended and not synced": lambda: mongodb_client.contests.find(
+            {"contest_end_time": {"$lte": now.strftime("%Y-%m-%dT%H:%M")}, "global_leaderboard_synced": {"$ne": True}}
+        ).explain(),
+        "contest_participants: membership": lambda: mongodb_client.contest_participants.find(
+            {"contest_id": "", "user_id": ""}
+        ).explain(),
+        "contest_leaderboard: by contest": lambda: mongodb_client.contest_leaderboard.find({"contest_id": ""}).explain(),
+        "announcements: active": lambda: mongodb_client.announcements.find({"is_active": True}).sort(
+            "created_at", -1
+        ).limit(3).explain(),
+        "global_leaderboard: by score": lambda: mongodb_client.global_leaderboard.find().sort("score", -1).explain(),
+        "submission_daily_counts: by date": lambda: mongodb_client.submission_daily_counts.find(
+            {"date": {"$in": [now.date().isoformat()]}}
+        ).explain(),
+        "submission_fingerprints: lsh candidates": lambda: mongodb_client.submission_fingerprints.find(
+            {"problem_id": "", "lsh_bands": {"$in": ["0:00000000"]}}
+        ).explain(),
+        "contest_plagiarism_reports: by contest": lambda: mongodb_client.contest_plagiarism_reports.find(
+            {"contest_id": ""}
+        ).explain(),
+    }
+
+    collection_scans = []
+    for name, explain in hot_queries.items():
+        stages = winning_plan_stages(explain())
+        click.echo(f"{name}: {' <- '.join(stages) or 'no plan'}")
+        if "COLLSCAN" in stages:
+            collection_scans.append(name)
+    if collection_scans:
+        raise click.ClickException(f"Collection scans in: {', '.join(collection_scans)}")
+    click.echo("All hot queries use an index")
+
+
+@app.cli.command("rebuild-global-leaderboard")
+def rebuild_global_leaderboard_command():
+    """Rebuild the global leaderboard collection from every ended contest."""
+    mongodb_client.global_leaderboard.delete_many({})
+    mongodb_client.contests.update_many({}, {"$unset": {"global_leaderboard_synced": ""}})
+    fold_ended_contests_into_global_leaderboard()
+    invalidate_context_cache("global_leaderboard")
+    print(f"Global leaderboard rebuilt with {mongodb_client.global_leaderboard.count_documents({})} users")
+
+
+@app.cli.command("backfill-user-stats")
+def backfill_user_stats_command():
+    """Recompute every user_stats document from the submissions collection."""
+    updates = []
+    backfilled_users = 0
+    for user_stats in aggregate_user_stats({}):
+        user_id = user_stats.pop("_id")
+        updates.append(
+            UpdateOne({"user_id": user_id}, {"$set": {**user_stats, "updated_at": datetime.now()}}, upsert=True)
+        )
+        if len(updates) == 1000:
+            mongodb_client.user_stats.bulk_write(updates, ordered=False)
+            backfilled_users += len(updates)
+            updates = []
+    if updates:
+        mongodb_client.user_stats.bulk_write(updates, ordered=False)
+        backfilled_users += len(updates)
+    print(f"Backfilled statistics of {backfilled_users} users")
+
+
+@app.cli.command("migrate-contest-storage")
+def migrate_contest_storage_command():
+    """Move embedded contest participants and leaderboards into their own collections."""
+    migrated_contests = 0
+    for contest in mongodb_client.contests.find(
+        {"storage_version": {"$exists": False}}, {"_id": 0, "contest_id": 1}
+    ):
+        if migrate_contest_storage(contest["contest_id"]):
+            migrated_contests += 1
+    print(f"Migrated {migrated_contests} contests")
+
+
+@app.cli.command("backfill-contest-solve-times")
+def backfill_contest_solve_times_command():
+    """Store the solve time of contest leaderboard entries written before times were stored."""
+    filled_problems = 0
+    updates = []
+    for user_data in mongodb_client.contest_leaderboard.find({}, {"_id": 1, "problems": 1}):
+        problems = user_data.get("problems") or {}
+        if fill_contest_solve_times([problems]):
+            updates.append(
+                UpdateOne(
+                    {"_id": user_data["_id"]},
+                    {
+                        "$set": {
+                            f"problems.{problem_id}.time": problem["time"]
+                            for problem_id, problem in problems.items()
+                            if "time" in problem
+                        }
+                    },
+                )
+            )
+        if len(updates) >= 1000:
+            filled_problems += mongodb_client.contest_leaderboard.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        filled_problems += mongodb_client.contest_leaderboard.bulk_write(updates, ordered=False).modified_count
+    print(f"Filled solve times of {filled_problems} leaderboard entries")
+
+
+@app.cli.command("migrate-test-cases")
+def migrate_test_cases_command():
+    """Move problem_stdin/problem_stdout of older problems into problem_test_cases."""
+    migrated_problems = 0
+    for problem in mongodb_client.problems.find(
+        {"test_set_version": {"$exists": False}}, {"_id": 0, "problem_id": 1, "problem_stdin": 1, "problem_stdout": 1}
+    ):
+        replace_problem_test_cases(
+            problem["problem_id"],
+            [{"stdin": problem.get("problem_stdin", ""), "expected_output": problem.get("problem_stdout", "")}],
+        )
+        migrated_problems += 1
+    print(f"Migrated {migrated_problems} problems")
+
+
+@app.cli.command("benchmark-checkers")
+@click.option("--size-mb", type=int, default=100, help="Size of the generated outputs.")
+@click.option("--directory", default=None, help="Where the outputs are written, the system temporary directory by default.")
+def benchmark_checkers_command(size_mb, directory):
+    """Time every checker mode and the comparison used before checkers on generated outputs."""
+    for mode, accepted, seconds, peak_kilobytes in checkers.benchmark(size_mb, directory):
+        print(f"{mode:<12} {'accepted' if accepted else 'rejected':<10} {seconds:8.2f}s {peak_kilobytes / 1024:10.1f} MB peak RSS")
+
+
+@app.cli.command("migrate-blobs")
+@click.option("--batch-size", type=int, default=500, help="Documents updated per bulk write.")
+def migrate_blobs_command(batch_size):
+    """Move inline submission code and test case data into the blob store."""
+    for collection, fields in (("submissions", ("code",)), ("problem_test_cases", TEST_CASE_DATA_FIELDS)):
+        migrated = 0
+        operations = []
+        for document in mongodb_client[collection].find(
+            {fields[0]: {"$exists": True}}, {"_id": 1, **{field: 1 for field in fields}}
+        ).batch_size(batch_size):
+            blob_fields = {}
+            for field in fields:
+                value = document.get(field) or ""
+                blob_fields[f"{field}_blob"] = blobs.put(value)
+                if collection == "problem_test_cases":
+                    blob_fields[f"{field}_length"] = len(value)
+            operations.append(
+                UpdateOne({"_id": document["_id"]}, {"$set": blob_fields, "$unset": {field: "" for field in fields}})
+            )
+            if len(operations) >= batch_size:
+                migrated += mongodb_client[collection].bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            migrated += mongodb_client[collection].bulk_write(operations, ordered=False).modified_count
+        print(f"Migrated {migrated} {collection} documents")
+
+
+@app.cli.command("collect-blobs")
+def collect_blobs_command():
+    """Delete blobs no submission or test case refers to anymore."""
+    referenced = set()
+    for document in mongodb_client.submissions.find({"code_blob": {"$exists": True}}, {"_id": 0, "code_blob": 1}):
+        referenced.add(document["code_blob"])
+    for document in mongodb_client.problem_test_cases.find(
+        {}, {"_id": 0, **{f"{field}_blob": 1 for field in TEST_CASE_DATA_FIELDS}}
+    ):
+        referenced.update(document[f"{field}_blob"] for field in TEST_CASE_DATA_FIELDS if document.get(f"{field}_blob"))
+    print(f"Deleted {blobs.collect_garbage(referenced)} unreferenced blobs")
+
+
+@app.cli.command("backfill-submission-daily-counts")
+@click.option("--days", type=int, default=None, help="Only backfill the last N days.")
+def backfill_submission_daily_counts_command(days):
+    """Recompute the submission_daily_counts rollup from the submissions collection."""
+    since = None
+    if days:
+        # Start at midnight so the oldest day is counted in full
+        since = (datetime.now(tz=kolkata_tz) - timedelta(days=days - 1)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+    daily_counts = aggregate_submission_daily_counts(since)
+    if daily_counts:
+        mongodb_client.submission_daily_counts.bulk_write(
+            [UpdateOne({"date": day}, {"$set": {"count": count}}, upsert=True) for day, count in daily_counts.items()],
+            ordered=False,
+        )
+    invalidate_context_cache("submissions_chart")
+    print(f"Backfilled submission counts for {len(daily_counts)} days")
+
+
+@app.cli.command("judge-worker")
+@click.option("--concurrency", type=int, default=4, help="Number of submissions judged in parallel.")
+def judge_worker_command(concurrency):
+    """Dispatch queued submissions to the execution server."""
+    if LOCAL_EXECUTOR is not None:
+        # Never run submissions without the sandbox
+        try:
+            LOCAL_EXECUTOR.check_isolation()
+        except executors.SandboxUnavailable as e:
+            raise click.ClickException(str(e))
+    print(f"Judge worker started with {concurrency} threads ({JUDGE_EXECUTOR} executor)")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(judge_worker_loop)
+
+
+@app.cli.command("ai-worker")
+@click.option("--concurrency", type=int, default=2, help="Number of Gemini requests in flight.")
+def ai_worker_command(concurrency):
+    """Generate user summaries and contest reports queued by the pages."""
+    print(f"AI worker started with {concurrency} threads")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(ai_worker_loop)
+
+
+@app.cli.command("reconcile-submissions")
+@click.option("--older-than", type=int, default=10, help="Minutes a submission may stay pending.")
+def reconcile_submissions_command(older_than):
+    """Re-queue or finalize submissions stuck in the judging pipeline."""
+    reconciled = reconcile_stale_submissions(timedelta(minutes=older_than))
+    print(f"Reconciled {reconciled} submissions")
+    print(f"Deleted {prune_test_sets(timedelta(minutes=older_than))} test cases of superseded test sets")
+
+
+@app.cli.command("rebuild-similarity-index")
+@click.option("--problem-id", default=None, help="Only index submissions for this problem.")
+def rebuild_similarity_index_command(problem_id):
+    """Fingerprint existing submissions into the similarity index."""
+    query = {"problem_id": problem_id} if problem_id else {}
+    indexed = 0
+    for submission in mongodb_client.submissions.find(
+        query, {"_id": 0, "submission_id": 1, "problem_id": 1, "user_id": 1, "code": 1, "code_blob": 1, "language": 1}
+    ).sort("created_at", 1).batch_size(500):
+        load_submission_code([submission])
+        save_submission_fingerprint(
+            submission, similarity.fingerprint_source(submission["code"], submission.get("language", "python"))
+        )
+        indexed += 1
+    print(f"Indexed {indexed} submissions")
+
+
+@app.cli.command("contest-plagiarism-report")
+@click.argument("contest_id")
+@click.option("--workers", type=int, default=None, help="Processes used for the pairwise comparison.")
+def contest_plagiarism_report_command(contest_id, workers):
+    """Compare all accepted submissions of a contest and store plagiarism clusters."""
+    report = generate_contest_plagiarism_report(contest_id, workers)
+    if report is None:
+        print(f"Contest {contest_id} not found")
+        return
+    print(
+        f"Checked {report['submissions_checked']} submissions, compared {report['compared_pairs']} candidate pairs, "
+        f"found {len(report['clusters'])} clusters"
+    )
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     return jsonify(
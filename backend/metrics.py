@@ -0,0 +1,108 @@
+import math
+
+import redis
+
+# Counters and histograms live in Redis hashes so every Gunicorn worker and judge worker adds to the same series,
+# a scrape reads Redis only and never touches MongoDB
+METRICS_PREFIX = "metrics:"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+JUDGE0_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+# Name -> (type, help text, buckets)
+METRICS = {
+    "astar_http_requests_total": ("counter", "HTTP requests by route, method and status code.", None),
+    "astar_http_request_duration_seconds": ("histogram", "HTTP request latency by route.", DEFAULT_BUCKETS),
+    "astar_judge0_request_duration_seconds": ("histogram", "Judge0 round trip latency by operation.", JUDGE0_BUCKETS),
+    "astar_upstream_request_duration_seconds": (
+        "histogram", "Outbound HTTP latency by upstream and outcome (status class, error or circuit_open).", UPSTREAM_BUCKETS
+    ),
+    "astar_verdicts_total": ("counter", "Finalized submissions by verdict.", None),
+    "astar_cache_requests_total": ("counter", "Cache lookups by cache and result (hit or miss).", None),
+}
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    return ",".join(f'{name}="{escape_label_value(value)}"' for name, value in sorted(labels.items()))
+
+
+def increment(pipeline, name, labels, amount=1):
+    pipeline.hincrbyfloat(f"{METRICS_PREFIX}{name}", format_labels(labels), amount)
+
+
+def observe(pipeline, name, labels, value):
+    # Cumulative buckets as Prometheus expects, each bucket counts the observations less than or equal to its bound
+    key = f"{METRICS_PREFIX}{name}"
+    label_string = format_labels(labels)
+    for bound in METRICS[name][2]:
+        if value <= bound:
+            pipeline.hincrby(key, f"bucket|{bound}|{label_string}", 1)
+    pipeline.hincrby(key, f"bucket|+Inf|{label_string}", 1)
+    pipeline.hincrbyfloat(key, f"sum||{label_string}", value)
+    pipeline.hincrby(key, f"count||{label_string}", 1)
+
+
+def record(redis_client, name, labels, value=1):
+    # Single metric update outside of an existing pipeline, metrics must never break the caller
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        if METRICS[name][0] == "histogram":
+            observe(pipeline, name, labels, value)
+        else:
+            increment(pipeline, name, labels, value)
+        pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to record metric {name}: {e}")
+
+
+def format_value(value):
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render(redis_client, gauges=()):
+    """Prometheus text exposition of every metric, gauges are (name, help, labels, value) tuples computed by the caller."""
+    pipeline = redis_client.pipeline(transaction=False)
+    for name in METRICS:
+        pipeline.hgetall(f"{METRICS_PREFIX}{name}")
+    lines = []
+    for (name, (metric_type, help_text, buckets)), series in zip(METRICS.items(), pipeline.execute()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        series = {field.decode(): value.decode() for field, value in series.items()}
+        if metric_type == "counter":
+            for label_string, value in sorted(series.items()):
+                lines.append(f"{name}{{{label_string}}} {format_value(value)}")
+            continue
+
+        histograms = {}
+        for field, value in series.items():
+            kind, bound, label_string = field.split("|", 2)
+            histograms.setdefault(label_string, {"buckets": {}, "sum": 0, "count": 0})
+            if kind == "bucket":
+                histograms[label_string]["buckets"][float(bound)] = value
+            else:
+                histograms[label_string][kind] = value
+        for label_string, histogram in sorted(histograms.items()):
+            separator = "," if label_string else ""
+            # Buckets no observation reached were never written
+            for bound in (*buckets, math.inf):
+                value = histogram["buckets"].get(float(bound), 0)
+                lines.append(f'{name}_bucket{{{label_string}{separator}le="{format_value(bound)}"}} {format_value(value)}')
+            lines.append(f"{name}_sum{{{label_string}}} {format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{{{label_string}}} {format_value(histogram['count'])}")
+
+    described_gauges = set()
+    for name, help_text, labels, value in gauges:
+        if name not in described_gauges:
+            described_gauges.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{{{format_labels(labels)}}} {format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import bson
+from pymongo import monitoring
+
+# Stats of the request running on the current thread, None outside requests
+_local = threading.local()
+
+
+class RequestStats:
+    __slots__ = ("started_at", "db_commands", "db_time", "db_bytes", "_pending")
+
+    def __init__(self, measure_bytes=False):
+        self.started_at = time.perf_counter()
+        self.db_commands = 0
+        self.db_time = 0.0
+        # pymongo does not report reply sizes, measuring them encodes every reply again. None when not measured
+        self.db_bytes = 0 if measure_bytes else None
+        self._pending = set()
+
+    @property
+    def duration(self):
+        return time.perf_counter() - self.started_at
+
+
+class QueryProfiler(monitoring.CommandListener):
+    # pymongo runs the listener on the thread issuing the command, so commands are attributed to that thread's request
+
+    def started(self, event):
+        stats = getattr(_local, "stats", None)
+        if stats is not None:
+            stats._pending.add(event.request_id)
+
+    def succeeded(self, event):
+        stats = getattr(_local, "stats", None)
+        if stats is None or event.request_id not in stats._pending:
+            return
+        stats._pending.discard(event.request_id)
+        stats.db_commands += 1
+        stats.db_time += event.duration_micros / 1_000_000
+        if stats.db_bytes is not None:
+            stats.db_bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        stats = getattr(_local, "stats", None)
+        if stats is None or event.request_id not in stats._pending:
+            return
+        stats._pending.discard(event.request_id)
+        stats.db_commands += 1
+        stats.db_time += event.duration_micros / 1_000_000
+
+
+query_profiler = QueryProfiler()
+
+
+def start_request(measure_bytes=False):
+    _local.stats = RequestStats(measure_bytes)
+
+
+def finish_request():
+    stats = getattr(_local, "stats", None)
+    _local.stats = None
+    return stats
+
+
+def server_timing(stats):
+    # Server-Timing header value, durations in milliseconds
+    description = f"{stats.db_commands} commands"
+    if stats.db_bytes is not None:
+        description += f", {stats.db_bytes} bytes"
+    return f'db;dur={stats.db_time * 1000:.1f};desc="{description}", total;dur={stats.duration * 1000:.1f}'
@@ -0,0 +1,151 @@
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from flask import g, has_request_context
+
+# Collections read through this module and the field identifying one document
+KEY_FIELDS = {
+    "problems": "problem_id",
+    "contests": "contest_id",
+    "users": "user_account.user_id",
+    "announcements": "announcement_id",
+    "submissions": "submission_id",
+}
+
+_database = None
+
+
+def init_database(database) -> None:
+    global _database
+    _database = database
+
+
+def _identity_map() -> Optional[dict]:
+    # Documents are only cached for the duration of one request, workers and CLI commands always read MongoDB
+    if not has_request_context():
+        return None
+    if "identity_map" not in g:
+        g.identity_map = {}
+    return g.identity_map
+
+
+def count_query(collection: str) -> None:
+    if has_request_context():
+        if "query_counts" not in g:
+            g.query_counts = Counter()
+        g.query_counts[collection] += 1
+
+
+def get_query_counts() -> Counter:
+    return g.get("query_counts") or Counter()
+
+
+def _is_loaded(field: str, loaded_fields: set) -> bool:
+    # A field is loaded when it or one of its parents was projected
+    parts = field.split(".")
+    return any(".".join(parts[:index]) in loaded_fields for index in range(1, len(parts) + 1))
+
+
+def _merge(target: dict, source: dict) -> None:
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _require_fields(fields: Iterable[str]) -> list:
+    fields = list(fields)
+    if not fields:
+        raise ValueError("A projection is required, pass the fields the caller reads")
+    return fields
+
+
+def find_many(collection: str, keys: Iterable[str], fields: Iterable[str]) -> dict[str, dict]:
+    """Documents of a collection keyed by their identifying field, fetching only what the identity map lacks.
+
+    The returned documents are shared within the request and must be treated as read-only.
+    """
+    fields = _require_fields(fields)
+    key_field = KEY_FIELDS[collection]
+    keys = list(dict.fromkeys(keys))
+    identity_map = _identity_map()
+    if identity_map is None:
+        cached = {}
+    else:
+        cached = identity_map.setdefault(collection, {})
+
+    missing_fields = set()
+    missing_keys = []
+    for key in keys:
+        entry = cached.get(key)
+        if entry is None:
+            missing_keys.append(key)
+            missing_fields.update(fields)
+            continue
+        if entry["document"] is None:
+            continue
+        fields_to_load = [field for field in fields if not _is_loaded(field, entry["fields"])]
+        if fields_to_load:
+            missing_keys.append(key)
+            missing_fields.update(fields_to_load)
+
+    if missing_keys:
+        count_query(collection)
+        projection = {"_id": 0, key_field: 1, **{field: 1 for field in missing_fields}}
+        # A field and one of its parents cannot both be projected, keep the parent
+        projection = {
+            field: value for field, value in projection.items()
+            if field == "_id" or not any(_is_loaded(field, {other}) for other in projection if other not in (field, "_id"))
+        }
+        found = {}
+        for document in _database[collection].find({key_field: {"$in": missing_keys}}, projection):
+            key = document
+            for part in key_field.split("."):
+                key = key[part]
+            found[key] = document
+        for key in missing_keys:
+            entry = cached.get(key)
+            document = found.get(key)
+            if entry is None or entry["document"] is None:
+                cached[key] = {"document": document, "fields": set(missing_fields)}
+            elif document is not None:
+                _merge(entry["document"], document)
+                entry["fields"].update(missing_fields)
+
+    return {key: cached[key]["document"] for key in keys if cached.get(key, {}).get("document") is not None}
+
+
+def find_one(collection: str, key: str, fields: Iterable[str]) -> Optional[dict[str, Any]]:
+    return find_many(collection, [key], fields).get(key)
+
+
+def find_problem(problem_id: str, fields: Iterable[str]) -> Optional[dict[str, Any]]:
+    return find_one("problems", problem_id, fields)
+
+
+def find_problems(problem_ids: Iterable[str], fields: Iterable[str]) -> dict[str, dict]:
+    return find_many("problems", problem_ids, fields)
+
+
+def find_contest(contest_id: str, fields: Iterable[str]) -> Optional[dict[str, Any]]:
+    return find_one("contests", contest_id, fields)
+
+
+def find_contests(contest_ids: Iterable[str], fields: Iterable[str]) -> dict[str, dict]:
+    return find_many("contests", contest_ids, fields)
+
+
+def find_user(user_id: str, fields: Iterable[str]) -> Optional[dict[str, Any]]:
+    return find_one("users", user_id, fields)
+
+
+def find_announcement(announcement_id: str, fields: Iterable[str]) -> Optional[dict[str, Any]]:
+    return find_one("announcements", announcement_id, fields)
+
+
+def forget(collection: str, key: str) -> None:
+    # Drop a document from the identity map after the request updated it
+    identity_map = _identity_map()
+    if identity_map is not None:
+        identity_map.get(collection, {}).pop(key, None)
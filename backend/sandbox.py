@@ -0,0 +1,218 @@
+"""Runs one program for the local executor, see executors.LocalExecutor._spawn. Not imported by the app.
+
+Started with `unshare` as process 1 of fresh mount, PID, network, IPC and UTS namespaces. The program sees a
+read-only root holding only the toolchain paths and its own directories, a private /tmp, a few device nodes and
+a fresh /proc, and runs as an unprivileged uid without capabilities under rlimits. Its exit status and resource
+usage are written as JSON to the report file descriptor.
+
+Usage: python3 -I -S sandbox.py <report fd> <JSON config>
+"""
+import ctypes
+import json
+import os
+import platform
+import resource
+import signal
+import sys
+import time
+
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_NOATIME = 0x400
+MS_NODIRATIME = 0x800
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MS_RELATIME = 0x200000
+MNT_DETACH = 0x2
+CLONE_NEWUSER = 0x10000000
+PR_SET_NO_NEW_PRIVS = 38
+SYS_PIVOT_ROOT = {"x86_64": 155, "aarch64": 41}
+# statvfs flags of a mount -> mount flags. In a user namespace these are locked and a remount must keep them
+LOCKED_FLAGS = {
+    os.ST_RDONLY: MS_RDONLY,
+    os.ST_NOSUID: MS_NOSUID,
+    os.ST_NODEV: MS_NODEV,
+    os.ST_NOEXEC: MS_NOEXEC,
+    os.ST_NOATIME: MS_NOATIME,
+    os.ST_NODIRATIME: MS_NODIRATIME,
+    os.ST_RELATIME: MS_RELATIME,
+}
+DEVICES = ("null", "zero", "full", "random", "urandom")
+TMP_SIZE = "64m"
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result, action):
+    if result != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, f"{action}: {os.strerror(error)}")
+
+
+def _encode(value):
+    return value.encode() if value is not None else None
+
+
+def mount(source, target, fstype, flags, data=None):
+    _check(
+        libc.mount(_encode(source), _encode(target), _encode(fstype), ctypes.c_ulong(flags), _encode(data)),
+        f"mount {target}",
+    )
+
+
+def bind(source, target, writable=False, devices=False):
+    if os.path.isdir(source):
+        os.makedirs(target, exist_ok=True)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        open(target, "a").close()
+    mount(source, target, None, MS_BIND | MS_REC)
+    statvfs_flags = os.statvfs(source).f_flag
+    flags = MS_NOSUID | sum(flag for st_flag, flag in LOCKED_FLAGS.items() if statvfs_flags & st_flag)
+    if not devices:
+        flags |= MS_NODEV
+    if not writable:
+        flags |= MS_RDONLY
+    mount(None, target, None, MS_BIND | MS_REMOUNT | flags)
+
+
+def build_root(root, config):
+    # Every mount is private to this namespace, nothing propagates back to the host
+    mount(None, "/", None, MS_REC | MS_PRIVATE)
+    mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV, "mode=755")
+    for path in config["toolchain_paths"]:
+        target = root + path
+        if os.path.islink(path):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.symlink(os.readlink(path), target)
+        elif os.path.exists(path):
+            bind(path, target)
+
+    os.makedirs(f"{root}/tmp", exist_ok=True)
+    mount("tmpfs", f"{root}/tmp", "tmpfs", MS_NOSUID | MS_NODEV, f"mode=1777,size={TMP_SIZE}")
+    for path in config["readonly_paths"]:
+        bind(path, root + path)
+    for path in config["writable_paths"]:
+        bind(path, root + path, writable=True)
+
+    os.makedirs(f"{root}/dev", exist_ok=True)
+    mount("tmpfs", f"{root}/dev", "tmpfs", MS_NOSUID | MS_NOEXEC, "mode=755")
+    for device in DEVICES:
+        bind(f"/dev/{device}", f"{root}/dev/{device}", writable=True, devices=True)
+    for name, target in (("fd", "/proc/self/fd"), ("stdin", "/proc/self/fd/0"), ("stdout", "/proc/self/fd/1"), ("stderr", "/proc/self/fd/2")):
+        os.symlink(target, f"{root}/dev/{name}")
+    # This process is PID 1 of the new PID namespace, the fresh /proc shows only the sandbox's processes
+    os.makedirs(f"{root}/proc", exist_ok=True)
+    mount("proc", f"{root}/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+
+    # pivot_root(".", ".") stacks the old root on the new one, detaching it leaves no path back to the host
+    os.chdir(root)
+    syscall = SYS_PIVOT_ROOT.get(platform.machine())
+    if syscall is None:
+        raise OSError(f"pivot_root is not supported on {platform.machine()}")
+    _check(libc.syscall(syscall, b".", b"."), "pivot_root")
+    _check(libc.umount2(b".", MNT_DETACH), "umount old root")
+    os.chdir("/")
+    mount(None, "/", None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+
+
+def drop_privileges(config):
+    uid, gid = config["uid"], config["gid"]
+    if config["user_namespace"]:
+        # Without root on the host this namespace's root is the worker's uid. A nested user namespace maps it to
+        # the sandbox uid, which has no capabilities once it execs
+        _check(libc.unshare(CLONE_NEWUSER), "unshare user namespace")
+        for name, value in (("setgroups", "deny"), ("uid_map", f"{uid} 0 1"), ("gid_map", f"{gid} 0 1")):
+            with open(f"/proc/self/{name}", "w") as file:
+                file.write(value)
+    else:
+        os.setgroups([])
+        os.setresgid(gid, gid, gid)
+        os.setresuid(uid, uid, uid)
+    # Setuid binaries in the toolchain cannot give privileges back
+    _check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "prctl no_new_privs")
+
+
+def set_limits(config):
+    cpu_time = int(config["cpu_time"])
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_time + 1, cpu_time + 2))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (config["output_limit"], config["output_limit"]))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (256, 256))
+    # Deep recursion is common in solutions, the stack may grow up to the hard limit
+    stack_limit = resource.getrlimit(resource.RLIMIT_STACK)[1]
+    resource.setrlimit(resource.RLIMIT_STACK, (stack_limit, stack_limit))
+    if config["address_space_limit"]:
+        memory = config["memory"] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if config["process_limit"]:
+        resource.setrlimit(resource.RLIMIT_NPROC, (config["process_limit"], config["process_limit"]))
+
+
+def run(config, report_fd):
+    # The program is a child of this process, so its rusage is its own and not the worker's it was forked from
+    error_read, error_write = os.pipe()
+    started_at = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(error_read)
+            os.close(report_fd)
+            os.chdir(config["cwd"])
+            set_limits(config)
+            drop_privileges(config)
+            os.execve(config["command"][0], config["command"], config["env"])
+        except BaseException as e:
+            os.write(error_write, f"{type(e).__name__}: {e}".encode())
+        finally:
+            os._exit(127)
+    os.close(error_write)
+
+    timed_out = False
+
+    def kill_all(*_):
+        nonlocal timed_out
+        timed_out = True
+        # From process 1, -1 is every other process of the namespace
+        os.kill(-1, signal.SIGKILL)
+
+    signal.signal(signal.SIGALRM, kill_all)
+    signal.setitimer(signal.ITIMER_REAL, config["wall_time"])
+    _, wait_status, usage = os.wait4(pid, 0)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    wall_time = time.perf_counter() - started_at
+    error = os.read(error_read, 4096).decode(errors="replace")
+    try:
+        # Processes the program left behind
+        os.kill(-1, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    if error:
+        return {"error": f"Failed to start {config['command'][0]}: {error}"}
+    return {
+        "returncode": os.waitstatus_to_exitcode(wait_status),
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "wall_time": wall_time,
+        "memory": usage.ru_maxrss,
+        "timed_out": timed_out,
+    }
+
+
+def main():
+    report_fd = int(sys.argv[1])
+    config = json.loads(sys.argv[2])
+    try:
+        build_root(config["root"], config)
+        report = run(config, report_fd)
+    except Exception as e:
+        report = {"error": f"Sandbox setup failed: {e}"}
+    with os.fdopen(report_fd, "w") as report_file:
+        json.dump(report, report_file)
+
+
+if __name__ == "__main__":
+    main()
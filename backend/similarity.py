@@ -0,0 +1,171 @@
+import base64
+import binascii
+import difflib
+import random
+import re
+import zlib
+
+# Number of consecutive tokens hashed into one shingle
+SHINGLE_SIZE = 5
+# Winnowing window, one fingerprint is kept from every WINNOW_WINDOW consecutive shingles
+WINNOW_WINDOW = 4
+# MinHash signature length, split into LSH_BANDS bands of LSH_ROWS rows for the bucket index
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+LSH_ROWS = 8
+# Similarity above which two submissions are flagged
+SIMILARITY_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed so every process computes identical signatures
+_random = random.Random(1729)
+_PERMUTATIONS = [
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+# Strings come first so comment markers inside string literals are not treated as comments
+_TOKEN_PATTERN = re.compile(
+    r'(?P<string>"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`)'
+    r"|(?P<block_comment>/\*[\s\S]*?\*/)"
+    r"|(?P<line_comment>//[^\n]*|#[^\n]*)"
+    r"|(?P<identifier>[A-Za-z_]\w*)"
+    r"|(?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)"
+    r"|(?P<operator>[^\s\w])"
+)
+
+# Keywords and common library names are kept, every other identifier is renamed so renaming variables does not help
+_KEEP_IDENTIFIERS = {
+    "and", "as", "assert", "break", "case", "catch", "char", "class", "const", "continue", "def", "default", "del",
+    "do", "double", "elif", "else", "enum", "except", "extends", "false", "False", "finally", "float", "for",
+    "function", "if", "implements", "import", "in", "include", "int", "interface", "is", "lambda", "let", "long",
+    "new", "None", "not", "null", "or", "pass", "private", "public", "raise", "return", "short", "static",
+    "struct", "switch", "this", "throw", "true", "True", "try", "typedef", "unsigned", "var", "void", "while",
+    "with", "yield", "print", "input", "range", "len", "map", "split", "str", "list", "dict", "set",
+    "cin", "cout", "endl", "printf", "scanf", "vector", "string", "console", "log", "System", "Scanner",
+}
+
+
+def decode_source(code):
+    # The editor sends base64 encoded UTF-8 source code
+    try:
+        return base64.b64decode(code, validate=True).decode("utf-8")
+    except (binascii.Error, ValueError):
+        return code
+
+
+def normalize_tokens(source, language="python"):
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(source):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "block_comment":
+            continue
+        if kind == "line_comment":
+            # Python has no // comments (floor division) and # starts a preprocessor directive in C/C++
+            if language == "python" and value.startswith("//"):
+                tokens.extend(["/", "/"])
+                tokens.extend(normalize_tokens(value[2:], language))
+            elif language == "python" or value.startswith("//"):
+                continue
+            else:
+                tokens.append("#")
+                tokens.extend(normalize_tokens(value[1:], language))
+            continue
+        if kind == "string":
+            tokens.append("s")
+        elif kind == "number":
+            tokens.append("n")
+        elif kind == "identifier":
+            tokens.append(value if value in _KEEP_IDENTIFIERS else "v")
+        else:
+            tokens.append(value)
+    return tokens
+
+
+def shingle_hashes(tokens):
+    if len(tokens) < SHINGLE_SIZE:
+        return [zlib.crc32(" ".join(tokens).encode())] if tokens else []
+    return [
+        zlib.crc32(" ".join(tokens[i:i + SHINGLE_SIZE]).encode())
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    ]
+
+
+def winnow(hashes):
+    # Keep the minimum hash of every window, identical code regions always share these fingerprints
+    if len(hashes) <= WINNOW_WINDOW:
+        return sorted(set(hashes))
+    return sorted({min(hashes[i:i + WINNOW_WINDOW]) for i in range(len(hashes) - WINNOW_WINDOW + 1)})
+
+
+def minhash_signature(hashes):
+    if not hashes:
+        return [_MAX_HASH] * MINHASH_PERMUTATIONS
+    unique_hashes = set(hashes)
+    return [min((a * value + b) % _MERSENNE_PRIME for value in unique_hashes) for a, b in _PERMUTATIONS]
+
+
+def lsh_bands(signature):
+    # Submissions sharing any band key are candidate near duplicates
+    return [
+        f"{band}:{zlib.crc32(repr(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]).encode()):08x}"
+        for band in range(LSH_BANDS)
+    ]
+
+
+def estimate_similarity(signature_a, signature_b):
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / MINHASH_PERMUTATIONS
+
+
+def fingerprint_source(code, language="python"):
+    tokens = normalize_tokens(decode_source(code), language)
+    hashes = shingle_hashes(tokens)
+    signature = minhash_signature(hashes)
+    return {
+        "minhash": signature,
+        "lsh_bands": lsh_bands(signature),
+        "fingerprints": winnow(hashes),
+        "token_count": len(tokens),
+    }
+
+
+def candidate_pairs(band_keys):
+    # band_keys maps an identifier to its LSH band keys, identifiers sharing a bucket become candidate pairs
+    buckets = {}
+    for identifier, bands in band_keys.items():
+        for band in bands:
+            buckets.setdefault(band, []).append(identifier)
+    pairs = set()
+    for members in buckets.values():
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                pairs.add(tuple(sorted((members[i], members[j]))))
+    return sorted(pairs)
+
+
+def compare_token_sequences(pair):
+    # Exact similarity of two normalized token sequences, run in a process pool for contest reports
+    identifier_a, tokens_a, identifier_b, tokens_b = pair
+    return identifier_a, identifier_b, difflib.SequenceMatcher(None, tokens_a, tokens_b, autojunk=False).ratio()
+
+
+def cluster_pairs(similar_pairs):
+    # Union-find over similar pairs, every connected group of identifiers becomes one cluster
+    parent = {}
+
+    def find(identifier):
+        parent.setdefault(identifier, identifier)
+        while parent[identifier] != identifier:
+            parent[identifier] = parent[parent[identifier]]
+            identifier = parent[identifier]
+        return identifier
+
+    for identifier_a, identifier_b in similar_pairs:
+        parent[find(identifier_a)] = find(identifier_b)
+
+    clusters = {}
+    for identifier in list(parent):
+        clusters.setdefault(find(identifier), []).append(identifier)
+    return [sorted(members) for members in clusters.values()]
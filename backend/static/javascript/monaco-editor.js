@@ -98,8 +98,8 @@ require(["vs/editor/editor.main"], function () {
         }
         document.getElementById(
           "output"
-        ).innerText = `Submission successful. Polling for results...`;
-        pollSubmission(data.submission_id);
+        ).innerText = `Submission successful. Waiting for results...`;
+        waitForSubmission(data.submission_id);
       })
       .catch((error) => {
         document.getElementById("output").innerText = "Submission failed.";
@@ -108,22 +108,74 @@ require(["vs/editor/editor.main"], function () {
       });
   });
 
+  function showSubmissionResult(result) {
+    document.getElementById(
+      "output"
+    ).innerHTML = `<p> Status: ${result.status.description} | Time: ${result.time}'s | Memory: ${result.memory}'KB</p><p>Stdout: ${result.stdout}</p><p>Stderr: ${result.stderr}</p>`;
+    if (result.test_cases) {
+      // One verdict per test case, the output shown above is the one of the first failed case
+      const testCases = document.createElement("p");
+      testCases.textContent = `Test cases: ${result.number_of_passed_test_cases} passed | ${result.test_cases
+        .map(
+          (testCase, index) =>
+            `#${index + 1} ${testCase.status.description}${testCase.message ? ` (${testCase.message})` : ""}`
+        )
+        .join(", ")}`;
+      document.getElementById("output").appendChild(testCases);
+    }
+    document.getElementById("submit").disabled = true;
+    document.getElementById("submit").innerText = "Submit Again";
+    setTimeout(() => {
+      document.getElementById("submit").disabled = false;
+    }, 10000);
+  }
+
+  // The verdict is pushed over Server-Sent Events, polling is only a fallback
+  function waitForSubmission(submissionId) {
+    if (!window.EventSource) {
+      pollSubmission(submissionId);
+      return;
+    }
+    let finished = false;
+    const events = new EventSource("/api/v1/events");
+
+    function finish(result) {
+      if (finished) return;
+      finished = true;
+      events.close();
+      showSubmissionResult(result);
+    }
+
+    events.addEventListener("open", () => {
+      // The verdict may have been published before the stream connected
+      fetch(`/api/v1/submissions/${submissionId}`)
+        .then((response) => response.json())
+        .then((data) => {
+          if (data.data.status.id > 2) finish(data.data);
+        })
+        .catch(() => {});
+    });
+    events.addEventListener("verdict", (event) => {
+      const result = JSON.parse(event.data);
+      if (result.submission_id === submissionId) finish(result);
+    });
+    events.addEventListener("error", () => {
+      if (finished) return;
+      finished = true;
+      events.close();
+      pollSubmission(submissionId);
+    });
+  }
+
   function pollSubmission(submissionId) {
     const pollInterval = setInterval(() => {
       fetch(`/api/v1/submissions/${submissionId}`)
         .then((response) => response.json())
         .then((data) => {
-          if (data.data.status.id !== 0) {
+          // 0-2 are In Queue / Processing, anything above is a final verdict
+          if (data.data.status.id > 2) {
             clearInterval(pollInterval);
-            document.getElementById("submit").disabled = false;
-            document.getElementById(
-              "output"
-            ).innerHTML = `<p> Status: ${data.data.status.description} | Time: ${data.data.time}'s | Memory: ${data.data.memory}'KB</p><p>Stdout: ${data.data.stdout}</p><p>Stderr: ${data.data.stderr}</p>`;
-            document.getElementById("submit").disabled = true;
-            document.getElementById("submit").innerText = "Submit Again";
-            setTimeout(() => {
-              document.getElementById("submit").disabled = false;
-            }, 10000);
+            showSubmissionResult(data.data);
           }
         })
         .catch(() => {
@@ -0,0 +1,76 @@
+import os
+import shutil
+import sys
+import uuid
+
+import pytest
+
+# The backend modules import each other by name, as when the app runs from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def executor(tmp_path_factory):
+    """A LocalExecutor that runs Python programs in the sandbox, skipped where the sandbox cannot be set up."""
+    import executors
+
+    if shutil.which("python3", path=executors.SANDBOX_PATH) is None:
+        pytest.skip("python3 is not installed")
+    executor = executors.LocalExecutor(cache_dir=str(tmp_path_factory.mktemp("cache")))
+    try:
+        executor.check_isolation()
+    except executors.SandboxUnavailable as e:
+        pytest.skip(str(e))
+    return executor
+
+
+@pytest.fixture(scope="session")
+def test_database():
+    """A fresh database on the MongoDB at TEST_MONGODB_URI (use a throwaway local mongod), dropped afterwards."""
+    uri = os.getenv("TEST_MONGODB_URI")
+    if not uri:
+        pytest.skip("TEST_MONGODB_URI is not set")
+    pymongo = pytest.importorskip("pymongo")
+    client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError as e:
+        pytest.skip(f"MongoDB is unavailable: {e}")
+    name = f"astar_test_{uuid.uuid4().hex[:12]}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def app_main(test_database):
+    """backend/main.py imported with its MongoDB client pointed at test_database."""
+    for module in ("flask", "redis", "google.generativeai"):
+        pytest.importorskip(module)
+    # Set before the import so load_dotenv never picks up a real deployment's .env for these
+    os.environ["MONGODB_URI"] = os.environ["TEST_MONGODB_URI"]
+    os.environ["REDIS_URI"] = os.getenv("TEST_REDIS_URI", "redis://localhost:6379/15")
+    os.environ.setdefault("GEMINI_API_KEY", "test")
+    os.environ.setdefault("SECRET_KEY", "test")
+    import blobs
+    import main
+    import repository
+
+    main.mongodb_client = test_database
+    repository.init_database(test_database)
+    blobs.init_store(test_database)
+    return main
+
+
+@pytest.fixture
+def test_redis(app_main):
+    """app_main's Redis client, on the throwaway database at TEST_REDIS_URI. Flushed before and after each test."""
+    if not os.getenv("TEST_REDIS_URI"):
+        pytest.skip("TEST_REDIS_URI is not set")
+    try:
+        app_main.redis_client.ping()
+    except app_main.redis.exceptions.RedisError as e:
+        pytest.skip(f"Redis is unavailable: {e}")
+    app_main.redis_client.flushdb()
+    yield app_main.redis_client
+    app_main.redis_client.flushdb()
@@ -0,0 +1,153 @@
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+GEMINI_PATH = "/v1beta/models/gemini-2.0-flash:generateContent"
+
+
+def gemini_reply(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+class FakeGemini(http.server.ThreadingHTTPServer):
+    # Local stand-in for the Gemini API (see GEMINI_API_BASE_URL). Each request gets the next scripted
+    # (status, body, delay) reply, the last one repeats
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeGeminiHandler)
+        self.replies = [(200, gemini_reply("A summary."), 0)]
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class FakeGeminiHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.server.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        status, body, delay = self.server.replies[min(len(self.server.requests), len(self.server.replies)) - 1]
+        time.sleep(delay)
+        data = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def gemini():
+    server = FakeGemini()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def http_client():
+    pytest.importorskip("requests")
+    import http_client
+
+    # Every test starts with fresh sessions and closed circuits
+    http_client._sessions.clear()
+    http_client._circuits.clear()
+    yield http_client
+    http_client._sessions.clear()
+    http_client._circuits.clear()
+
+
+def test_gemini_post_is_not_retried(http_client, gemini):
+    # A POST may already have been processed, a server error is returned to the caller as is
+    gemini.replies = [(503, {}, 0)]
+    response = http_client.post("gemini", gemini.url + GEMINI_PATH, json={})
+    assert response.status_code == 503
+    assert len(gemini.requests) == 1
+
+
+def test_gemini_read_timeout(http_client, gemini):
+    import requests
+
+    gemini.replies = [(200, gemini_reply("Too late."), 2)]
+    with pytest.raises(requests.exceptions.Timeout):
+        http_client.post("gemini", gemini.url + GEMINI_PATH, json={}, timeout=(1, 0.5))
+    assert len(gemini.requests) == 1
+
+
+def test_circuit_opens_after_consecutive_failures(http_client, gemini):
+    gemini.replies = [(500, {}, 0)]
+    for _ in range(http_client.CIRCUIT_FAILURE_THRESHOLD):
+        assert http_client.post("gemini", gemini.url + GEMINI_PATH, json={}).status_code == 500
+    with pytest.raises(http_client.UpstreamUnavailable):
+        http_client.post("gemini", gemini.url + GEMINI_PATH, json={})
+    assert len(gemini.requests) == http_client.CIRCUIT_FAILURE_THRESHOLD
+
+
+@pytest.fixture
+def ai_main(app_main, test_database, test_redis, gemini, monkeypatch):
+    monkeypatch.setattr(app_main, "GEMINI_MODEL_URL", gemini.url + GEMINI_PATH)
+    app_main.http_client._circuits.clear()
+    app_main.http_client._sessions.clear()
+    test_database.users.insert_one({"user_account": {"user_id": "u1"}, "user_profile": {"display_name": "Ada"}})
+    yield app_main
+    for collection in ("users", "system_logs"):
+        test_database[collection].delete_many({})
+
+
+def test_user_summary_is_only_generated_for_new_input(ai_main, test_database, gemini):
+    ai_main.generate_user_summary("u1")
+    user = test_database.users.find_one({"user_account.user_id": "u1"})
+    assert user["user_summary"] == "A summary."
+    assert "Ada" in gemini.requests[0]["contents"][0]["parts"][0]["text"]
+
+    # Same submissions, same input hash: Gemini is not called again
+    ai_main.generate_user_summary("u1")
+    assert len(gemini.requests) == 1
+
+
+def test_failed_job_is_retried_with_backoff_then_dropped(ai_main, test_database, test_redis, gemini):
+    gemini.replies = [(500, {}, 0)]
+    test_redis.lpush(ai_main.AI_QUEUE_KEY, json.dumps({"type": "user_summary", "id": "u1", "attempt": 0}))
+    ai_main.run_next_ai_job()
+
+    assert test_redis.llen(ai_main.AI_PROCESSING_KEY) == 0
+    [(job, retry_at)] = test_redis.zrange(ai_main.AI_DELAYED_KEY, 0, -1, withscores=True)
+    assert json.loads(job)["attempt"] == 1
+    assert retry_at >= time.time() + ai_main.AI_RETRY_BASE_DELAY - 1
+
+    # Due jobs go back to the queue, the last attempt is logged and dropped
+    test_redis.zadd(ai_main.AI_DELAYED_KEY, {job: 0})
+    ai_main.promote_due_ai_jobs()
+    assert test_redis.zcard(ai_main.AI_DELAYED_KEY) == 0
+    test_redis.delete(ai_main.AI_QUEUE_KEY)
+    last_attempt = {"type": "user_summary", "id": "u1", "attempt": ai_main.AI_MAX_ATTEMPTS - 1}
+    test_redis.lpush(ai_main.AI_QUEUE_KEY, json.dumps(last_attempt))
+    ai_main.run_next_ai_job()
+    assert test_redis.zcard(ai_main.AI_DELAYED_KEY) == 0
+    assert test_database.system_logs.find_one({"log_message": "AI job user_summary failed"})["log_details"]["attempts"] == ai_main.AI_MAX_ATTEMPTS
+
+
+def test_failing_retry_still_clears_processing_list(ai_main, test_redis, gemini, monkeypatch):
+    # An error outside the job itself (here, scheduling the retry) reaches ai_worker_loop, which logs it and goes on
+    gemini.replies = [(500, {}, 0)]
+
+    def broken_retry(job, error):
+        raise RuntimeError("retry failed")
+
+    monkeypatch.setattr(ai_main, "retry_ai_job", broken_retry)
+    test_redis.lpush(ai_main.AI_QUEUE_KEY, json.dumps({"type": "user_summary", "id": "u1", "attempt": 0}))
+    with pytest.raises(RuntimeError):
+        ai_main.run_next_ai_job()
+    assert test_redis.llen(ai_main.AI_PROCESSING_KEY) == 0
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+import blobs
+
+
+@pytest.fixture
+def store(test_database, monkeypatch):
+    blobs.init_store(test_database)
+    # Every test starts with an empty process cache
+    monkeypatch.setattr(blobs, "_cache", OrderedDict())
+    monkeypatch.setattr(blobs, "_cache_bytes", 0)
+    yield test_database
+    for collection in (f"{blobs.BUCKET}.files", f"{blobs.BUCKET}.chunks"):
+        test_database[collection].delete_many({})
+
+
+def files(store):
+    return store[f"{blobs.BUCKET}.files"]
+
+
+def chunks(store):
+    return store[f"{blobs.BUCKET}.chunks"]
+
+
+def test_put_stores_content_once(store):
+    key = blobs.put("print(1)")
+    files(store).update_one({"_id": key}, {"$set": {"metadata.referenced_at": datetime(2000, 1, 1)}})
+    assert blobs.put(b"print(1)") == key == blobs.blob_id(b"print(1)")
+    assert files(store).count_documents({}) == 1
+    # Deduplicating marks the blob as referenced again
+    assert files(store).find_one({"_id": key})["metadata"]["referenced_at"] > datetime(2000, 1, 1)
+    assert blobs.get_text(key) == "print(1)"
+
+
+def test_get_many_mixes_cached_and_stored_blobs(store, monkeypatch):
+    cached_key, stored_key = blobs.put(b"cached"), blobs.put(b"x" * 5000)
+    monkeypatch.setattr(blobs, "_cache", OrderedDict())
+    blobs.get(cached_key)
+    # Only the cache can still answer for this one
+    chunks(store).delete_many({"files_id": cached_key})
+    files(store).delete_one({"_id": cached_key})
+    assert blobs.get_many([cached_key, stored_key, stored_key]) == {cached_key: b"cached", stored_key: b"x" * 5000}
+    assert blobs.get_many([]) == {}
+
+
+def test_truncated_or_missing_blob_raises(store, monkeypatch):
+    key = blobs.put(b"complete")
+    monkeypatch.setattr(blobs, "_cache", OrderedDict())
+    chunks(store).delete_many({"files_id": key})
+    with pytest.raises(blobs.MissingBlob):
+        blobs.get(key)
+    with pytest.raises(blobs.MissingBlob):
+        blobs.get_many([blobs.blob_id(b"never stored")])
+
+
+def test_put_replaces_an_abandoned_upload(store):
+    blobs.put(b"other")
+    key = blobs.blob_id(b"content")
+    started_at = datetime.now(tz=timezone.utc) - blobs.ABANDONED_UPLOAD_AGE - timedelta(minutes=1)
+    chunks(store).insert_one({"_id": ObjectId.from_datetime(started_at), "files_id": key, "n": 0, "data": b"cont"})
+    assert blobs.put(b"content") == key
+    assert chunks(store).count_documents({"files_id": key}) == 1
+    assert blobs.get(key) == b"content"
+
+
+def test_put_never_returns_a_blob_still_being_uploaded(store, monkeypatch):
+    monkeypatch.setattr(blobs, "UPLOAD_WAIT", 0.3)
+    blobs.put(b"other")
+    key = blobs.blob_id(b"content")
+    chunks(store).insert_one({"files_id": key, "n": 0, "data": b"cont"})
+    with pytest.raises(RuntimeError, match="still being uploaded"):
+        blobs.put(b"content")
+    # The other upload's chunks are left alone
+    assert chunks(store).find_one({"files_id": key})["data"] == b"cont"
+
+
+def test_collect_garbage_keeps_referenced_and_recent_blobs(store):
+    recent, old, referenced = blobs.put(b"recent"), blobs.put(b"old"), blobs.put(b"referenced")
+    files(store).update_many(
+        {"_id": {"$in": [old, referenced]}}, {"$set": {"metadata.referenced_at": datetime.now() - timedelta(hours=2)}}
+    )
+    assert blobs.collect_garbage([referenced]) == 1
+    assert {file["_id"] for file in files(store).find()} == {recent, referenced}
+    assert chunks(store).count_documents({"files_id": old}) == 0
+
+
+def test_inline_fields_are_read_before_blobs(app_main, store):
+    code_blob = blobs.put("print(2)")
+    submissions = [{"code": "print(1)", "code_blob": code_blob}, {"code_blob": code_blob}, {}]
+    assert [submission["code"] for submission in app_main.load_submission_code(submissions)] == ["print(1)", "print(2)", ""]
+
+    stdin_blob, output_blob = blobs.put("1 2"), blobs.put("3")
+    test_cases = app_main.load_test_case_data(
+        [{"stdin": "inline", "expected_output": "inline output"}, {"stdin_blob": stdin_blob, "expected_output_blob": output_blob}]
+    )
+    assert [(test_case["stdin"], test_case["expected_output"]) for test_case in test_cases] == [
+        ("inline", "inline output"),
+        ("1 2", "3"),
+    ]
@@ -0,0 +1,93 @@
+import base64
+
+import pytest
+
+import checkers
+
+CUSTOM_CHECKER = """
+import sys
+exit_code = int(open(sys.argv[2]).read())
+print("checked", open(sys.argv[3]).read().strip())
+sys.exit(exit_code)
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+def test_units_split_across_chunks(monkeypatch, chunk_size):
+    monkeypatch.setattr(checkers, "CHUNK_SIZE", chunk_size)
+    data = b"ab cd\r\n\n  efgh\t i \njk"
+    assert list(checkers.iter_lines(data)) == [b"ab cd", b"", b"  efgh\t i ", b"jk"]
+    assert list(checkers.iter_tokens(data)) == data.split()
+    assert checkers.WhitespaceChecker().check(b"ab cd efgh i\njk\n", data)
+    assert not checkers.WhitespaceChecker().check(b"abcd efgh i jk", data)
+    assert checkers.LineChecker().check(b"ab cd\n\nefgh\t i\njk", data)
+
+
+def test_files_are_read_like_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkers, "CHUNK_SIZE", 4)
+    actual, expected = tmp_path / "actual", tmp_path / "expected"
+    actual.write_bytes(b"1 2\r\n3\r\n")
+    expected.write_bytes(b"1 2\n3\n")
+    assert checkers.ExactChecker().check(str(actual), str(expected))
+    assert not checkers.ExactChecker().check(str(actual), b"1 2\n4\n")
+
+
+def test_line_endings_and_trailing_blank_lines():
+    assert checkers.LineChecker().check(b"1 \r\n2\r\n\r\n\n", b"1\n2\n")
+    assert checkers.LineChecker().check(b"1\n2", b"1\n2\n\n\n")
+    assert checkers.ExactChecker().check(b"1\r\n2\r\n", b"1\n2")
+    assert checkers.ExactChecker().check(b"1\n2\n\n", b"1\n2\n").message == "Extra output after line 2"
+    assert not checkers.ExactChecker().check(b"1 \n2\n", b"1\n2\n")
+
+
+def test_mismatch_messages():
+    assert checkers.LineChecker().check(b"1\n", b"1\n2\n").message == "Output ended early, expected more output at line 2"
+    assert checkers.LineChecker().check(b"1\n2\n3\n", b"1\n2\n").message == "Extra output after line 2"
+    assert checkers.LineChecker().check(b"1\n3\n", b"1\n2\n").message == "Difference at line 2, found '3'"
+    assert checkers.WhitespaceChecker().check(b"1 2", b"1 2 3").message == (
+        "Output ended early, expected more output at token 3"
+    )
+    result = checkers.WhitespaceChecker().check(b"x" * 100, b"y")
+    assert result.message == f"Difference at token 1, found '{'x' * checkers.MESSAGE_PREVIEW}...'"
+
+
+def test_float_tolerance_and_nan():
+    checker = checkers.FloatChecker()
+    assert checker.check(b"1.0000001 2", b"1 2.0")
+    assert checker.check(b"1000000001", b"1000000000")
+    assert not checker.check(b"1.1", b"1")
+    assert checker.check(b"nan NaN", b"nan nan")
+    assert not checker.check(b"nan", b"1")
+    assert not checker.check(b"1", b"nan")
+    assert checker.check(b"yes 0.5", b"yes 0.5000001")
+    assert not checker.check(b"no 0.5", b"yes 0.5")
+    assert not checkers.FloatChecker(abs_tolerance=0, rel_tolerance=0).check(b"1.0000001", b"1")
+
+
+def test_unit_too_long(monkeypatch):
+    monkeypatch.setattr(checkers, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(checkers, "MAX_UNIT_LENGTH", 8)
+    assert checkers.LineChecker().check(b"x" * 20, b"x").message == "A line is longer than 8 bytes"
+    assert checkers.WhitespaceChecker().check(b"x" * 20, b"x").message == "A token is longer than 8 bytes"
+    # Identical outputs are accepted byte for byte without being split
+    assert checkers.LineChecker().check(b"x" * 20, b"x" * 20)
+
+
+@pytest.mark.parametrize("exit_code, accepted", [(0, True), (1, False), (2, False)])
+def test_custom_checker_verdicts(executor, exit_code, accepted):
+    checker = checkers.get_checker(
+        {"mode": "custom", "language_id": 71, "source_code": base64.b64encode(CUSTOM_CHECKER.encode()).decode()}, executor
+    )
+    result = checker.check(b"42\n", str(exit_code).encode(), b"input")
+    assert result.accepted is accepted
+    assert result.message == "checked 42"
+
+
+def test_custom_checker_failure(executor):
+    checker = checkers.get_checker(
+        {"mode": "custom", "language_id": 71, "source_code": base64.b64encode(CUSTOM_CHECKER.encode()).decode()}, executor
+    )
+    with pytest.raises(checkers.CheckerError, match="exit code 3"):
+        checker.check(b"42\n", b"3")
+    with pytest.raises(checkers.CheckerError):
+        checkers.get_checker({"mode": "custom"})
@@ -0,0 +1,181 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def contest(app_main, test_database, monkeypatch):
+    # Redis is not needed to apply verdicts to MongoDB
+    monkeypatch.setattr(app_main, "update_live_leaderboard", lambda *args: None)
+    now = datetime.now(tz=app_main.kolkata_tz)
+    contest = {
+        "contest_id": f"contest-{int(now.timestamp() * 1000000)}",
+        "contest_start_time": (now - timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M"),
+        "contest_end_time": (now - timedelta(minutes=2)).strftime("%Y-%m-%dT%H:%M"),
+        "contest_problems": {"contest_first_problem": "p1", "contest_second_problem": "p2", "contest_third_problem": "p3"},
+        "storage_version": app_main.CONTEST_STORAGE_VERSION,
+    }
+    test_database.contests.insert_one(dict(contest))
+    test_database.contest_participants.insert_one({"contest_id": contest["contest_id"], "user_id": "u1"})
+    yield contest
+    for collection in ("contests", "contest_participants", "contest_leaderboard", "submissions", "global_leaderboard"):
+        test_database[collection].delete_many({})
+
+
+def submission(contest, submission_id, created_at, status_code=3, time="0.5"):
+    return {
+        "submission_id": submission_id,
+        "problem_id": "p1",
+        "user_id": "u1",
+        "contest_id": contest["contest_id"],
+        "created_at": created_at,
+        "submission_status": {"status_code": status_code, "time": time},
+    }
+
+
+def leaderboard_entry(test_database, contest):
+    return test_database.contest_leaderboard.find_one({"contest_id": contest["contest_id"], "user_id": "u1"})
+
+
+def leaderboard_problem(test_database, contest):
+    return leaderboard_entry(test_database, contest)["problems"]["p1"]
+
+
+def test_verdict_after_the_end_counts_for_submission_made_during_the_contest(app_main, test_database, contest):
+    during = datetime.now() - timedelta(minutes=10)
+    assert app_main.add_competition_submission(submission(contest, "s1", during))
+    assert leaderboard_problem(test_database, contest)["submissions_id"] == "s1"
+
+    after = datetime.now()
+    assert not app_main.add_competition_submission(submission(contest, "s2", after, time="0.1"))
+    assert leaderboard_problem(test_database, contest)["submissions_id"] == "s1"
+
+
+def test_untimed_solve_is_kept(app_main, test_database, contest):
+    test_database.contest_leaderboard.insert_one(
+        {
+            "contest_id": contest["contest_id"],
+            "user_id": "u1",
+            "score": 20,
+            "problems": {"p1": {"submissions_id": "legacy", "has_accepted_submission": True, "number_of_incorrect_submissions": 0}},
+        }
+    )
+    during = datetime.now() - timedelta(minutes=10)
+    app_main.add_competition_submission(submission(contest, "s1", during, time="0.9"))
+    assert leaderboard_problem(test_database, contest)["submissions_id"] == "legacy"
+
+
+def test_migration_fills_solve_times(app_main, test_database, contest):
+    legacy_contest_id = f"{contest['contest_id']}-legacy"
+    test_database.submissions.insert_one({"submission_id": "legacy", "submission_status": {"time": "0.5"}})
+    test_database.contests.insert_one(
+        {
+            "contest_id": legacy_contest_id,
+            "contest_statistics": {
+                "contest_participants": ["u1"],
+                "contest_leaderboard": {
+                    "u1": {
+                        "score": 20,
+                        "problems": {"p1": {"submissions_id": "legacy", "has_accepted_submission": True, "number_of_incorrect_submissions": 0}},
+                    }
+                },
+            },
+        }
+    )
+    assert app_main.migrate_contest_storage(legacy_contest_id)
+    problem = test_database.contest_leaderboard.find_one({"contest_id": legacy_contest_id, "user_id": "u1"})["problems"]["p1"]
+    assert problem["time"] == 0.5
+
+    # A slower resubmission keeps the migrated solve, a faster one replaces it
+    contest_problems = contest["contest_problems"]
+    for submission_id, time, expected in (("slow", 0.9, "legacy"), ("fast", 0.2, "fast")):
+        test_database.contest_leaderboard.update_one(
+            {"contest_id": legacy_contest_id, "user_id": "u1"},
+            app_main.contest_leaderboard_update(contest_problems, "p1", submission_id, True, time),
+        )
+        problem = test_database.contest_leaderboard.find_one({"contest_id": legacy_contest_id, "user_id": "u1"})["problems"]["p1"]
+        assert problem["submissions_id"] == expected
+
+
+def test_verdict_judged_after_the_fold_updates_the_global_leaderboard(app_main, test_database, contest):
+    during = datetime.now() - timedelta(minutes=10)
+    app_main.add_competition_submission(submission(contest, "s1", during, status_code=4))
+    app_main.fold_ended_contests_into_global_leaderboard()
+    assert test_database.contests.find_one({"contest_id": contest["contest_id"]})["global_leaderboard_synced"]
+    assert test_database.global_leaderboard.find_one({"user_id": "u1"})["problems_solved"] == 0
+
+    assert app_main.add_competition_submission(submission(contest, "s2", during))
+    entry = test_database.global_leaderboard.find_one({"user_id": "u1"})
+    assert entry["problems_solved"] == 1
+    assert entry["score"] == leaderboard_entry(test_database, contest)["score"]
+
+    # Folding again never replaces the synced contribution with an older one
+    test_database.contests.update_one({"contest_id": contest["contest_id"]}, {"$unset": {"global_leaderboard_synced": ""}})
+    test_database.global_leaderboard.update_one({"user_id": "u1"}, {"$set": {f"contests.{contest['contest_id']}.score": -1}})
+    app_main.fold_ended_contests_into_global_leaderboard()
+    assert test_database.global_leaderboard.find_one({"user_id": "u1"})["score"] == -1
+
+
+def test_global_leaderboard_lists_every_user(app_main, test_database, contest):
+    test_database.global_leaderboard.insert_many(
+        [{"user_id": f"u{index}", "score": index, "problems_solved": 1, "contests": {}} for index in range(25)]
+    )
+    leaderboard = app_main.calculate_global_leaderboard()
+    assert [user_id for user_id, _ in leaderboard] == [f"u{index}" for index in reversed(range(25))]
+
+
+def test_live_leaderboard_breaks_ties_like_mongodb(app_main, test_database, test_redis, contest):
+    def entry(user_id, score, solved, scored_at=None):
+        problems = {f"p{index}": {"has_accepted_submission": index <= solved} for index in (1, 2, 3)}
+        document = {"contest_id": contest["contest_id"], "user_id": user_id, "score": score, "problems": problems}
+        if scored_at:
+            document["scored_at"] = scored_at
+        return document
+
+    test_database.contest_leaderboard.insert_many(
+        [
+            entry("late", 50, 2, datetime(2026, 1, 1, 10, 5)),
+            entry("b-tie", 50, 2, datetime(2026, 1, 1, 10, 0)),
+            entry("a-tie", 50, 2, datetime(2026, 1, 1, 10, 0)),
+            entry("more-solved", 50, 3, datetime(2026, 1, 1, 11, 0)),
+            entry("legacy", 50, 2),
+            entry("top", 80, 1, datetime(2026, 1, 1, 12, 0)),
+        ]
+    )
+    expected = ["top", "more-solved", "legacy", "a-tie", "b-tie", "late"]
+    assert list(app_main.get_contest_leaderboard_entries(contest)) == expected
+    page, total = app_main.get_live_leaderboard_page(contest["contest_id"])
+    assert list(page) == expected and total == len(expected)
+    assert app_main.get_live_leaderboard_rank(contest["contest_id"], "a-tie")["rank"] == 4
+
+
+def test_leaderboard_event_carries_the_rows_that_move_between_pages(app_main, test_database, test_redis, monkeypatch):
+    monkeypatch.setattr(app_main, "LEADERBOARD_PAGE_SIZE", 3)
+    events = []
+    monkeypatch.setattr(app_main, "publish_event", lambda channel, event_type, data: events.append(data))
+    test_redis.hset(
+        app_main.LEADERBOARD_PROFILES_KEY,
+        mapping={f"u{index}": json.dumps({"user_profile": {"display_name": f"User {index}"}}) for index in range(5)},
+    )
+
+    def user_data(score, solved):
+        return {
+            "score": score,
+            "problems": {f"p{index}": {"has_accepted_submission": index <= solved} for index in (1, 2, 3)},
+            "scored_at": datetime(2026, 1, 1, 10, 0),
+        }
+
+    for index in range(5):
+        app_main.update_live_leaderboard("live", f"u{index}", user_data(100 - index, 1))
+    # Ranks 1-5 are u0-u4. u4 moves from rank 5 to rank 1, so u2 moves down from page 1 to the first row of page 2
+    app_main.update_live_leaderboard("live", "u4", user_data(200, 2))
+    event = events[-1]
+    assert (event["rank"], event["previous_rank"], event["total"]) == (1, 5, 5)
+    assert event["profile"]["user_profile"]["display_name"] == "User 4"
+    assert [(entry["rank"], entry["user_id"]) for entry in event["boundary_entries"]] == [
+        (1, "u4"),
+        (3, "u1"),
+        (4, "u2"),
+    ]
+    assert events[0]["previous_rank"] is None
@@ -0,0 +1,54 @@
+import json
+
+import events
+
+
+class FakePubSub:
+    # Stands in for a Redis pub/sub connection, each get_message call advances the clock by the poll interval
+    def __init__(self, clock, messages=None):
+        self.clock = clock
+        self.messages = dict(messages or {})
+        self.channels = None
+        self.closed = False
+
+    def subscribe(self, *channels):
+        self.channels = channels
+
+    def get_message(self, timeout):
+        self.clock.now += timeout
+        data = self.messages.pop(round(self.clock.now), None)
+        return {"type": "message", "data": json.dumps(data)} if data is not None else None
+
+    def close(self):
+        self.closed = True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_stream_sends_events_and_heartbeats_then_asks_to_reconnect():
+    clock = Clock()
+    pubsub = FakePubSub(clock, {5: {"type": "verdict", "data": {"submission_id": "a"}}})
+    frames = list(events.stream(pubsub, ["events:user:1"], duration=40, heartbeat=15, clock=clock))
+
+    assert pubsub.channels == ("events:user:1",)
+    assert frames[0] == f"retry: {events.RECONNECT_DELAY}\n\n"
+    assert frames[1] == 'event: verdict\ndata: {"submission_id": "a"}\n\n'
+    # Heartbeats count from the last frame sent, the stream ends once the duration has passed
+    assert frames[2:] == [": heartbeat\n\n", ": heartbeat\n\n"]
+    assert clock.now == 40
+    assert pubsub.closed
+
+
+def test_stream_closes_pubsub_when_client_leaves():
+    clock = Clock()
+    pubsub = FakePubSub(clock)
+    stream = events.stream(pubsub, ["events:user:1"], clock=clock)
+    next(stream)
+    stream.close()
+    assert pubsub.closed
@@ -0,0 +1,69 @@
+import base64
+import os
+
+import pytest
+
+import executors
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+ESCAPE = f"""
+import os, socket
+try:
+    print("read", open({MAIN_PY!r}).read(200))
+except OSError as e:
+    print("read failed", type(e).__name__)
+try:
+    socket.create_connection(("1.1.1.1", 80), timeout=2)
+    print("connected")
+except OSError as e:
+    print("socket failed", type(e).__name__)
+print("uid", os.getuid())
+print("root", sorted(os.listdir("/")))
+"""
+
+
+def encode(data):
+    return base64.b64encode(data.encode()).decode()
+
+
+def run(executor, source, stdin=""):
+    return executor.run({"language_id": 71, "source_code": encode(source), "stdin": encode(stdin)})
+
+
+def test_program_cannot_read_host_files_or_open_sockets(executor):
+    result = run(executor, ESCAPE)
+    stdout = base64.b64decode(result["stdout"]).decode()
+    assert result["status"] == executors.ACCEPTED
+    assert "read failed FileNotFoundError" in stdout
+    assert "socket failed" in stdout and "connected" not in stdout
+    assert f"uid {executors.SANDBOX_UID}" in stdout
+    root = next(line for line in stdout.splitlines() if line.startswith("root "))
+    assert "'root'" not in root and "'home'" not in root
+
+
+def test_program_cannot_write_outside_its_directory(executor):
+    result = run(executor, "open('/usr/escape', 'w')")
+    assert result["status"] == executors.RUNTIME_ERROR
+    assert b"Read-only file system" in base64.b64decode(result["stderr"])
+
+
+def test_judges_and_enforces_limits(executor):
+    result = executor.run(
+        {"language_id": 71, "source_code": encode("print(sum(map(int, input().split())))"), "stdin": encode("2 3"), "expected_output": encode("5")}
+    )
+    assert result["status"] == executors.ACCEPTED
+    # Memory is the program's own, not the worker's
+    assert result["memory"] < 64 * 1024
+
+    result = executor.execute(executor.compile(71, encode("import time\ntime.sleep(5)")), None, wall_time_limit=1)
+    assert result["status"] == executors.TIME_LIMIT_EXCEEDED
+
+
+def test_refuses_to_run_without_sandbox(monkeypatch, tmp_path):
+    executor = executors.LocalExecutor(cache_dir=str(tmp_path))
+    monkeypatch.setattr(executors, "SANDBOX_SCRIPT", str(tmp_path / "missing.py"))
+    with pytest.raises(executors.SandboxUnavailable):
+        executor.check_isolation()
+    result = executor.run({"language_id": 71, "source_code": encode("print(1)")})
+    assert result["status"] == executors.INTERNAL_ERROR
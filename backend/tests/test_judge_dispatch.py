@@ -0,0 +1,57 @@
+import time
+from datetime import datetime
+
+import pytest
+import requests
+
+
+@pytest.fixture
+def submission_id(app_main, test_database, test_redis, monkeypatch):
+    # Judged through Judge0, whatever JUDGE_EXECUTOR is set to
+    monkeypatch.setattr(app_main, "LOCAL_EXECUTOR", None)
+    monkeypatch.setattr(app_main, "JUDGE0_CALLBACK_URL", None)
+    test_database.problems.insert_one({"problem_id": "p1"})
+    app_main.replace_problem_test_cases("p1", [{"stdin": "1", "expected_output": "1"}])
+    test_database.submissions.insert_one(
+        {
+            "submission_id": "s1",
+            "problem_id": "p1",
+            "user_id": "u1",
+            "code": "print(1)",
+            "language": "python",
+            "judging_state": "queued",
+            "judge0_submission_id": None,
+            "created_at": datetime.now(),
+        }
+    )
+    yield "s1"
+    for collection in ("problems", "problem_test_cases", "submissions", "system_logs"):
+        test_database[collection].delete_many({})
+
+
+def assert_delayed(app_main, test_database, test_redis, submission_id, seconds):
+    assert test_database.submissions.find_one({"submission_id": submission_id})["judging_state"] == "queued"
+    assert test_redis.llen(app_main.JUDGE_QUEUE_KEY) == 0
+    assert test_redis.zscore(app_main.JUDGE_DELAYED_KEY, submission_id) == pytest.approx(time.time() + seconds, abs=5)
+
+
+def test_submission_waits_for_a_key_without_blocking_the_worker(app_main, test_database, test_redis, submission_id, monkeypatch):
+    monkeypatch.setattr(app_main, "JUDGE0_KEYS", {})
+    started_at = time.monotonic()
+    app_main.dispatch_submission(submission_id)
+    assert time.monotonic() - started_at < 1
+    assert_delayed(app_main, test_database, test_redis, submission_id, app_main.judge0_keys.DEFAULT_COOLDOWN)
+
+
+def test_rate_limited_submission_waits_for_the_cooldown(app_main, test_database, test_redis, submission_id, monkeypatch):
+    monkeypatch.setattr(app_main, "JUDGE0_KEYS", {"key": "secret"})
+
+    def rate_limited(upstream, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 429
+        response.headers["retry-after"] = "30"
+        return response
+
+    monkeypatch.setattr(app_main.http_client, "request", rate_limited)
+    app_main.dispatch_submission(submission_id)
+    assert_delayed(app_main, test_database, test_redis, submission_id, 30)
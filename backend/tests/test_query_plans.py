@@ -0,0 +1,26 @@
+import pytest
+
+
+@pytest.fixture
+def cli(app_main, test_database):
+    # Explaining a query on a collection that does not exist yet reports no plan at all, create every index first
+    runner = app_main.app.test_cli_runner()
+    result = runner.invoke(args=["ensure-indexes"])
+    assert result.exit_code == 0, result.output
+    return runner
+
+
+def test_hot_queries_use_an_index(cli):
+    result = cli.invoke(args=["verify-query-plans"])
+    assert result.exit_code == 0, result.output
+    assert "COLLSCAN" not in result.output
+
+
+def test_collection_scan_fails_the_check(app_main, test_database, cli):
+    test_database.contests.drop_index("contest_id_1")
+    try:
+        result = cli.invoke(args=["verify-query-plans"])
+    finally:
+        test_database.contests.create_indexes(app_main.MONGODB_INDEXES["contests"])
+    assert result.exit_code != 0
+    assert "Collection scans in: contests: by id" in result.output
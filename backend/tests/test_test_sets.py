@@ -0,0 +1,46 @@
+import base64
+from datetime import timedelta
+
+import pytest
+
+
+@pytest.fixture
+def problem(app_main, test_database):
+    test_database.problems.insert_one({"problem_id": "p1"})
+    yield "p1"
+    for collection in ("problems", "problem_test_cases", "submissions"):
+        test_database[collection].delete_many({})
+
+
+def accepted(stdout):
+    return {"status": {"id": 3, "description": "Accepted"}, "stdout": base64.b64encode(stdout.encode()).decode()}
+
+
+def test_cases_are_returned_with_their_version(app_main, problem):
+    version = app_main.replace_problem_test_cases(problem, [{"stdin": "1", "expected_output": "1"}])
+    test_cases, fail_fast, test_set_version = app_main.get_problem_test_cases(problem)
+    assert test_set_version == version
+    assert [test_case["expected_output"] for test_case in test_cases] == ["1"]
+    assert app_main.get_problem_test_cases("missing") == (None, False, None)
+
+
+def test_submission_judged_against_a_replaced_set_is_still_accepted(app_main, test_database, problem):
+    old_version = app_main.replace_problem_test_cases(problem, [{"stdin": "1", "expected_output": "old"}])
+    test_database.submissions.insert_one(
+        {"submission_id": "s1", "problem_id": problem, "judging_state": "running", "test_set_version": old_version}
+    )
+    app_main.replace_problem_test_cases(problem, [{"stdin": "1", "expected_output": "new"}])
+
+    results = app_main.check_judge0_results(problem, old_version, [accepted("old")])
+    assert results[0]["status"]["id"] == 3
+
+    # Kept while the submission is running, even once the switch is old enough
+    assert app_main.prune_test_sets(timedelta(0)) == 0
+    assert app_main.get_problem_test_case(problem, old_version, 0) is not None
+
+    test_database.submissions.update_one({"submission_id": "s1"}, {"$set": {"judging_state": "finished"}})
+    # Kept during the grace period after the switch
+    assert app_main.prune_test_sets(timedelta(minutes=10)) == 0
+    assert app_main.prune_test_sets(timedelta(0)) == 1
+    assert app_main.get_problem_test_case(problem, old_version, 0) is None
+    assert app_main.get_problem_test_cases(problem)[0][0]["expected_output"] == "new"
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def user_stats(test_database):
+    yield test_database.user_stats
+    for collection in ("user_stats", "submissions"):
+        test_database[collection].delete_many({})
+
+
+def test_counters_exist_from_sign_up(app_main, test_database, user_stats):
+    app_main.create_user_stats("u1")
+    # Recorded before the first profile view, and never aggregated from the submissions
+    test_database.submissions.insert_one(
+        {"submission_id": "s1", "user_id": "u1", "problem_id": "p1", "created_at": datetime.now()}
+    )
+    app_main.record_user_submission("u1")
+    app_main.record_user_verdict("u1", "p1", True)
+    app_main.create_user_stats("u1")
+    assert app_main.get_user_stats("u1") == {
+        "total_submissions": 1,
+        "total_accepted_submissions": 1,
+        "solved_problem_ids": ["p1"],
+    }
@@ -0,0 +1,96 @@
+import time
+from datetime import datetime
+
+import pytest
+
+import executors
+
+
+class FakeExecutor:
+    """Stands in for LocalExecutor, every case gets the same scripted status."""
+
+    def __init__(self):
+        self.status = executors.ACCEPTED
+        self.calls = 0
+
+    def judge(self, language_id, source_code, test_cases, fail_fast, checker):
+        self.calls += 1
+        return executors.aggregate_results(
+            [{"status": self.status, "stdout": None, "time": "0.1", "memory": 100} for _ in test_cases]
+        )
+
+
+@pytest.fixture
+def fake_executor(app_main, test_database, test_redis, monkeypatch):
+    fake_executor = FakeExecutor()
+    monkeypatch.setattr(app_main, "LOCAL_EXECUTOR", fake_executor)
+    test_database.problems.insert_one({"problem_id": "p1"})
+    app_main.replace_problem_test_cases("p1", [{"stdin": "1", "expected_output": "1"}])
+    yield fake_executor
+    for collection in ("problems", "problem_test_cases", "submissions", "user_stats"):
+        test_database[collection].delete_many({})
+
+
+def judge(app_main, test_database, submission_id, code="print(1)\n"):
+    test_database.submissions.insert_one(
+        {
+            "submission_id": submission_id,
+            "problem_id": "p1",
+            "user_id": "u1",
+            "code": code,
+            "language": "python",
+            "judging_state": "queued",
+            "created_at": datetime.now(),
+        }
+    )
+    app_main.dispatch_submission(submission_id)
+    return test_database.submissions.find_one({"submission_id": submission_id})
+
+
+def test_identical_submission_reuses_the_verdict(app_main, test_database, fake_executor):
+    first = judge(app_main, test_database, "s1")
+    assert first["submission_status"]["status_code"] == 3 and not first["verdict_cached"]
+    # Line endings and trailing whitespace at the end of the file do not change the source
+    second = judge(app_main, test_database, "s2", code="print(1)\r\n\r\n")
+    assert second["submission_status"]["status_code"] == 3 and second["verdict_cached"]
+    assert second["submission_status"]["number_of_passed_test_cases"] == "1/1"
+    assert fake_executor.calls == 1
+
+    judge(app_main, test_database, "s3", code="print( 1)")
+    assert fake_executor.calls == 2
+
+
+@pytest.mark.parametrize("status", [executors.TIME_LIMIT_EXCEEDED, executors.INTERNAL_ERROR])
+def test_unstable_verdicts_are_judged_again(app_main, test_database, fake_executor, status):
+    fake_executor.status = status
+    judge(app_main, test_database, "s1")
+    second = judge(app_main, test_database, "s2")
+    assert second["submission_status"]["status_code"] == status["id"] and not second["verdict_cached"]
+    assert fake_executor.calls == 2
+
+
+def test_replacing_the_test_set_drops_the_problem_entries(app_main, test_database, test_redis, fake_executor):
+    cache_key = judge(app_main, test_database, "s1")["verdict_cache_key"]
+    assert test_redis.exists(cache_key)
+    app_main.replace_problem_test_cases("p1", [{"stdin": "2", "expected_output": "2"}])
+    assert not test_redis.exists(cache_key)
+    assert not test_redis.exists(f"{app_main.VERDICT_CACHE_PREFIX}problem:p1")
+    assert test_redis.zscore(app_main.VERDICT_CACHE_LRU_KEY, cache_key) is None
+    judge(app_main, test_database, "s2")
+    assert fake_executor.calls == 2
+
+
+def test_least_recently_used_entries_are_evicted(app_main, test_redis, monkeypatch):
+    monkeypatch.setattr(app_main, "VERDICT_CACHE_SIZE", 2)
+    result = executors.aggregate_results([{"status": executors.ACCEPTED, "time": "0.1", "memory": 100}])
+    for cache_key in ("verdicts:first", "verdicts:second"):
+        app_main.cache_verdict(cache_key, "p1", result)
+        time.sleep(0.01)
+    # Reading an entry makes it the most recently used
+    assert app_main.get_cached_verdict("verdicts:first") is not None
+    time.sleep(0.01)
+    app_main.cache_verdict("verdicts:third", "p1", result)
+
+    assert test_redis.zcard(app_main.VERDICT_CACHE_LRU_KEY) == 2
+    assert not test_redis.exists("verdicts:second")
+    assert test_redis.exists("verdicts:first") and test_redis.exists("verdicts:third")